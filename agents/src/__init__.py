@@ -4,5 +4,27 @@ Multi-AI-Agent for Online Shopping - Agent Orchestration Layer
 This package contains the LangGraph-based agent orchestration system.
 """
 
+import asyncio
+import sys
+
 __version__ = "0.1.0"
 
+
+def install_uvloop() -> bool:
+    """
+    在 asyncio.run 之前切换到 uvloop 事件循环
+
+    uvloop 随 uvicorn[standard] 安装，仅支持 POSIX；Windows 或未安装时保留默认循环。
+
+    Returns:
+        是否已启用 uvloop
+    """
+    if sys.platform == "win32":
+        return False
+    try:
+        import uvloop
+    except ImportError:
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
+
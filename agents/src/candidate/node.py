@@ -4,19 +4,49 @@ Candidate Agent Node implementation.
 基于 Mission 召回候选商品。
 """
 
-from datetime import UTC
+import asyncio
+import math
 import re
+from datetime import UTC
+from functools import lru_cache
 
 import structlog
 
-from ..graph.state import AgentState
+from ..graph.state import STEP_CANDIDATE_COMPLETE, AgentState
 from ..llm.client import call_llm_and_parse
-from ..llm.prompts import CANDIDATE_RELEVANCE_PROMPT
+from ..llm.prompts import CANDIDATE_RELEVANCE_PROMPT, MAX_TOKENS
 from ..llm.schemas import CandidateRelevanceResult
-from ..tools.catalog import get_offer_card, search_offers
+from ..tools.catalog import get_offer_card, offer_card_batching, search_offers
 
 logger = structlog.get_logger()
 
+# 产品类型同义词表（精确品类的常见叫法）
+_PRODUCT_TYPE_SYNONYMS: dict[str, tuple[str, ...]] = {
+    "charger": ("charging", "power adapter", "usb charger", "wall charger"),
+    "dress": ("gown", "frock"),
+    "blazer": ("suit jacket", "sport coat", "suit blazer"),
+    "phone case": ("case", "phone cover", "protective case"),
+    "sneakers": ("trainers", "running shoes", "athletic shoes"),
+    "headphones": ("headset", "earphones", "over-ear"),
+    "earbuds": ("earphones", "in-ear", "tws"),
+    "backpack": ("rucksack", "daypack"),
+    "hoodie": ("hooded sweatshirt", "pullover hoodie"),
+}
+
+# 核心品类词：标题中出现其他品类词时可判定为不同产品
+_CORE_PRODUCT_WORDS = frozenset({
+    "shoes", "boots", "sneakers", "sandals", "heels", "loafers", "flats",
+    "jacket", "coat", "blazer", "sweater", "hoodie", "shirt", "blouse",
+    "pants", "jeans", "shorts", "skirt", "dress", "gown",
+    "bag", "backpack", "purse", "wallet", "watch", "glasses",
+    "phone", "charger", "headphones", "earbuds", "tablet", "laptop",
+})
+
+# 本地相似度阈值：高于 RELEVANT 直接通过，低于 IRRELEVANT 且标题属于其他品类时直接拒绝，
+# 介于两者之间交给 LLM 判定
+_RELEVANT_SIMILARITY = 0.75
+_IRRELEVANT_SIMILARITY = 0.35
+
 
 async def candidate_node(state: AgentState) -> AgentState:
     """
@@ -145,7 +175,7 @@ async def candidate_node(state: AgentState) -> AgentState:
             return {
                 **state,
                 "candidates": [],
-                "current_step": "candidate_complete",
+                "current_step": STEP_CANDIDATE_COMPLETE,
                 "tool_calls": tool_calls,
                 "error": "No products found matching your requirements",
                 "error_code": "NOT_FOUND",
@@ -171,18 +201,24 @@ async def candidate_node(state: AgentState) -> AgentState:
             )
 
         # 获取每个 offer 的详细信息（限制前 20 个以便生成多个方案）
+        # 并发发起，由 offer_card_batching 合并为一批请求
+        top_offer_ids = unique_offer_ids[:20]
+        with offer_card_batching():
+            arocs = await asyncio.gather(
+                *(get_offer_card(offer_id=offer_id) for offer_id in top_offer_ids),
+                return_exceptions=True,
+            )
+
         candidates = []
-        for idx, offer_id in enumerate(unique_offer_ids[:20]):
-            try:
-                aroc = await get_offer_card(offer_id=offer_id)
-                if aroc.get("ok"):
-                    candidate_data = aroc.get("data", {})
-                    # 添加搜索分数
-                    candidate_data["search_score"] = unique_scores[idx] if idx < len(unique_scores) else 0.5
-                    candidates.append(candidate_data)
-            except Exception as e:
-                logger.warning("candidate_node.get_aroc_failed", offer_id=offer_id, error=str(e))
+        for idx, (offer_id, aroc) in enumerate(zip(top_offer_ids, arocs, strict=True)):
+            if isinstance(aroc, Exception):
+                logger.warning("candidate_node.get_aroc_failed", offer_id=offer_id, error=str(aroc))
                 continue
+            if aroc.get("ok"):
+                candidate_data = aroc.get("data", {})
+                # 添加搜索分数
+                candidate_data["search_score"] = unique_scores[idx] if idx < len(unique_scores) else 0.5
+                candidates.append(candidate_data)
 
         logger.info("candidate_node.fetched_candidates", count=len(candidates))
 
@@ -268,7 +304,7 @@ async def candidate_node(state: AgentState) -> AgentState:
                 return {
                     **state,
                     "candidates": [],
-                    "current_step": "candidate_complete",
+                    "current_step": STEP_CANDIDATE_COMPLETE,
                     "tool_calls": tool_calls,
                     "error": f"No products matching '{primary_display}' found. The search returned related items but none matched your specific request.",
                     "error_code": "NO_EXACT_MATCH",
@@ -295,7 +331,7 @@ async def candidate_node(state: AgentState) -> AgentState:
         return {
             **state,
             "candidates": candidates,
-            "current_step": "candidate_complete",
+            "current_step": STEP_CANDIDATE_COMPLETE,
             "tool_calls": tool_calls,
             "error": None,
         }
@@ -587,35 +623,22 @@ async def _validate_candidate_relevance(
     if primary_type_en:
         search_terms.append(primary_type_en.lower())
         # Add common variations
-        if primary_type_en.lower() == "charger":
-            search_terms.extend(["charging", "power adapter", "usb charger", "wall charger"])
-        elif primary_type_en.lower() == "dress":
-            search_terms.extend(["gown", "frock"])
-        elif primary_type_en.lower() == "blazer":
-            search_terms.extend(["suit jacket", "sport coat", "suit blazer"])
-        elif primary_type_en.lower() == "phone case":
-            search_terms.extend(["case", "phone cover", "protective case"])
+        search_terms.extend(_PRODUCT_TYPE_SYNONYMS.get(primary_type_en.lower(), ()))
     
     # Extract core product type words from multi-word phrases
     # E.g., "casual black leather shoes" -> also add "shoes", "leather shoes"
-    core_product_words = {"shoes", "boots", "sneakers", "sandals", "heels", "loafers", "flats",
-                          "jacket", "coat", "blazer", "sweater", "hoodie", "shirt", "blouse",
-                          "pants", "jeans", "shorts", "skirt", "dress", "gown",
-                          "bag", "backpack", "purse", "wallet", "watch", "glasses",
-                          "phone", "charger", "headphones", "earbuds", "tablet", "laptop"}
-    
     for term in [primary_type, primary_type_en]:
         if term:
             words = term.lower().split()
             # Add individual core product words found in the phrase
             for word in words:
-                if word in core_product_words and word not in search_terms:
+                if word in _CORE_PRODUCT_WORDS and word not in search_terms:
                     search_terms.append(word)
             # Add two-word combinations ending with core product word
             if len(words) >= 2:
                 for i in range(len(words) - 1):
                     two_word = f"{words[i]} {words[i+1]}"
-                    if words[i+1] in core_product_words and two_word not in search_terms:
+                    if words[i+1] in _CORE_PRODUCT_WORDS and two_word not in search_terms:
                         search_terms.append(two_word)
     
     # Remove empty terms
@@ -644,6 +667,11 @@ async def _validate_candidate_relevance(
             if reject_term in title_lower:
                 return False, f"Product is a '{reject_term}', not a '{product_type_key}'"
     
+    # Local similarity check (character trigram cosine) before falling back to LLM
+    local_decision = _local_relevance(search_terms, title_lower)
+    if local_decision is not None:
+        return local_decision
+    
     # For ambiguous cases, use LLM validation
     try:
         result = await call_llm_and_parse(
@@ -657,6 +685,7 @@ async def _validate_candidate_relevance(
             output_schema=CandidateRelevanceResult,
             model_type="fast",  # Use faster model for filtering
             temperature=0.0,
+            max_tokens=MAX_TOKENS["candidate_relevance"],
         )
         
         if result:
@@ -678,3 +707,64 @@ async def _validate_candidate_relevance(
             error=str(e),
         )
         return True, f"Validation error: {str(e)}"
+
+
+@lru_cache(maxsize=4096)
+def _trigram_vector(text: str) -> tuple[dict[str, int], float]:
+    """字符三元组词频向量及其范数（按文本缓存）"""
+    padded = f" {text} "
+    vector: dict[str, int] = {}
+    for i in range(len(padded) - 2):
+        gram = padded[i:i + 3]
+        vector[gram] = vector.get(gram, 0) + 1
+    norm = math.sqrt(sum(v * v for v in vector.values()))
+    return vector, norm
+
+
+def _trigram_cosine(a: str, b: str) -> float:
+    """两段文本的字符三元组余弦相似度"""
+    vec_a, norm_a = _trigram_vector(a)
+    vec_b, norm_b = _trigram_vector(b)
+    if not norm_a or not norm_b:
+        return 0.0
+    if len(vec_a) > len(vec_b):
+        vec_a, vec_b = vec_b, vec_a
+    dot = sum(count * vec_b.get(gram, 0) for gram, count in vec_a.items())
+    return dot / (norm_a * norm_b)
+
+
+def _local_relevance(search_terms: list[str], title_lower: str) -> tuple[bool, str] | None:
+    """
+    本地相似度判定候选相关性
+
+    将每个类型词与标题中等长的词窗口比较，取最高相似度：
+    - 高于 _RELEVANT_SIMILARITY：判定相关
+    - 低于 _IRRELEVANT_SIMILARITY 且标题含其他核心品类词：判定不相关
+    - 其余情况返回 None，交给 LLM
+    """
+    title_words = re.findall(r"[a-z0-9\-]+", title_lower)
+    if not title_words:
+        return None
+
+    best_sim = 0.0
+    best_term = ""
+    for term in search_terms:
+        size = len(term.split())
+        for i in range(max(1, len(title_words) - size + 1)):
+            window = " ".join(title_words[i:i + size])
+            sim = _trigram_cosine(term, window)
+            if sim > best_sim:
+                best_sim, best_term = sim, term
+
+    if best_sim >= _RELEVANT_SIMILARITY:
+        return True, f"Product title is similar to '{best_term}' ({best_sim:.2f})"
+
+    if best_sim < _IRRELEVANT_SIMILARITY:
+        term_words = {w for term in search_terms for w in term.split()}
+        other_types = [
+            w for w in title_words if w in _CORE_PRODUCT_WORDS and w not in term_words
+        ]
+        if other_types:
+            return False, f"Product is a '{other_types[0]}' (similarity {best_sim:.2f})"
+
+    return None
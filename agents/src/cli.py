@@ -10,6 +10,7 @@ import sys
 import structlog
 from langchain_core.messages import HumanMessage
 
+from . import install_uvloop
 from .graph import AgentState, build_agent_graph
 
 logger = structlog.get_logger()
@@ -158,6 +159,7 @@ async def interactive_mode():
 
 def main():
     """主入口"""
+    install_uvloop()
     if len(sys.argv) > 1:
         # 命令行模式
         user_message = " ".join(sys.argv[1:])
@@ -14,9 +14,15 @@ from datetime import UTC, datetime
 import structlog
 
 from ..config import get_settings
-from ..graph.state import AgentState
+from ..graph.state import STEP_COMPLIANCE_COMPLETE, AgentState
 from ..llm.client import call_llm_and_parse
-from ..llm.prompts import COMPLIANCE_PROMPT
+from ..llm.prompts import (
+    COMPLIANCE_FIELDS,
+    COMPLIANCE_PROMPT,
+    COMPLIANCE_PROMPT_SHORT,
+    MAX_TOKENS,
+    project_fields,
+)
 from ..llm.schemas import ComplianceAnalysis
 from ..tools.compliance import (
     check_compliance,
@@ -37,28 +43,15 @@ async def compliance_node(state: AgentState) -> AgentState:
     2. 所需证书和文件验证
     3. 风险评估和替代方案建议
     """
+    invalid = _validate_compliance_input(state)
+    if invalid is not None:
+        return {**state, **invalid}
+
     logger.info("compliance_node.start")
 
     try:
-        mission = state.get("mission")
-        candidates = state.get("candidates", [])
-
-        if not mission:
-            return {
-                **state,
-                "error": "No mission found",
-                "error_code": "INVALID_ARGUMENT",
-                "current_step": "compliance",
-            }
-
-        if not candidates:
-            return {
-                **state,
-                "error": "No candidates to check",
-                "error_code": "INVALID_ARGUMENT",
-                "current_step": "compliance",
-            }
-
+        mission = state["mission"]
+        candidates = state["candidates"]
         destination_country = mission.get("destination_country", "US")
         tool_calls = state.get("tool_calls", [])
         settings = get_settings()
@@ -212,6 +205,7 @@ async def compliance_node(state: AgentState) -> AgentState:
                     blocked=blocked_candidates,
                     warnings=warning_candidates,
                     country_rules=country_rules,
+                    structured=settings.use_structured_output,
                 )
             except Exception as e:
                 logger.warning("compliance_node.llm_analysis_failed", error=str(e))
@@ -247,7 +241,7 @@ async def compliance_node(state: AgentState) -> AgentState:
                 "llm_analysis": llm_analysis.model_dump() if llm_analysis else None,
             },
             "tool_calls": tool_calls,
-            "current_step": "compliance_complete",
+            "current_step": STEP_COMPLIANCE_COMPLETE,
             "error": None,
         }
 
@@ -261,6 +255,21 @@ async def compliance_node(state: AgentState) -> AgentState:
         }
 
 
+def _validate_compliance_input(state: AgentState) -> dict | None:
+    """入参检查：缺少 mission 或候选时返回错误字段，否则返回 None"""
+    if not state.get("mission"):
+        error = "No mission found"
+    elif not state.get("candidates"):
+        error = "No candidates to check"
+    else:
+        return None
+    return {
+        "error": error,
+        "error_code": "INVALID_ARGUMENT",
+        "current_step": "compliance",
+    }
+
+
 def _assess_risk_level(
     allowed: bool,
     issues: list,
@@ -315,28 +324,13 @@ async def _llm_compliance_analysis(
     blocked: list,
     warnings: list,
     country_rules: list,
+    structured: bool = False,
 ) -> ComplianceAnalysis | None:
-    """使用 LLM 进行深度合规分析"""
+    """使用 LLM 进行深度合规分析（structured=True 时使用精简 prompt）"""
     try:
-        # 简化数据用于 LLM
-        blocked_summary = [
-            {
-                "offer_id": b.get("offer_id"),
-                "issues": b.get("issues", []),
-                "risk_level": b.get("risk_level"),
-            }
-            for b in blocked
-        ]
-
-        warning_summary = [
-            {
-                "offer_id": w.get("offer_id"),
-                "warnings": w.get("warnings", []),
-                "required_docs": w.get("required_docs", []),
-                "risk_level": w.get("risk_level"),
-            }
-            for w in warnings
-        ]
+        # 简化数据用于 LLM（只保留 prompt 用到的字段）
+        blocked_summary = [project_fields(b, COMPLIANCE_FIELDS) for b in blocked]
+        warning_summary = [project_fields(w, COMPLIANCE_FIELDS) for w in warnings]
 
         rules_summary = [
             {
@@ -348,7 +342,10 @@ async def _llm_compliance_analysis(
         ]
 
         messages = [
-            {"role": "system", "content": COMPLIANCE_PROMPT},
+            {
+                "role": "system",
+                "content": COMPLIANCE_PROMPT_SHORT if structured else COMPLIANCE_PROMPT,
+            },
             {
                 "role": "user",
                 "content": f"""
@@ -373,6 +370,8 @@ Please analyze the compliance issues and provide alternatives.
             output_schema=ComplianceAnalysis,
             model_type="planner",
             temperature=0.1,
+            max_tokens=MAX_TOKENS["compliance"],
+            structured=structured,
         )
 
         return result
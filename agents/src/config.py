@@ -28,6 +28,12 @@ class Settings(BaseSettings):
         alias="TOOL_GATEWAY_URL",
     )
 
+    # Redis（目录类工具结果的读穿缓存），为空则不启用
+    redis_url: str = Field(default="", alias="REDIS_URL")
+
+    # 工具调用优先协商 msgpack 响应（需安装可选依赖 msgpack：pip install ".[binary]"）
+    mcp_binary: bool = Field(default=False, alias="MCP_BINARY")
+
     # LLM Configuration
     # 支持 OpenAI 和 Poe API（Poe 兼容 OpenAI 格式）
     openai_api_key: str = Field(default="", alias="OPENAI_API_KEY")
@@ -47,8 +53,19 @@ class Settings(BaseSettings):
     token_budget_total: int = Field(default=50000, alias="TOKEN_BUDGET_TOTAL")
     max_tokens_per_session: int = Field(default=100000, alias="MAX_TOKENS_PER_SESSION")
 
+    # LLM Response Cache（进程内，仅 temperature == 0 的调用，相同输入直接复用解析结果）
+    llm_cache_enabled: bool = Field(default=True, alias="LLM_CACHE_ENABLED")
+    llm_cache_ttl_seconds: int = Field(default=86400, alias="LLM_CACHE_TTL_SECONDS")
+    llm_cache_max_entries: int = Field(default=4096, alias="LLM_CACHE_MAX_ENTRIES")
+
+    # 使用 response_format=json_schema 结构化输出（需要模型/网关支持，Poe 不支持）
+    # 开启后 Compliance / Payment 使用不带示例 JSON 的精简 prompt
+    use_structured_output: bool = Field(default=False, alias="USE_STRUCTURED_OUTPUT")
+
     # Server Configuration
     server_port: int = Field(default=8000, alias="PORT")
+    # 并发连接上限（超过后返回 503），None 表示不限制
+    server_max_concurrency: int | None = Field(default=None, alias="SERVER_MAX_CONCURRENCY")
     
     # Session Configuration
     session_timeout_minutes: int = Field(default=30, alias="SESSION_TIMEOUT_MINUTES")
@@ -57,6 +74,15 @@ class Settings(BaseSettings):
     max_retries: int = Field(default=3, alias="MAX_RETRIES")
     request_timeout: int = Field(default=30, alias="REQUEST_TIMEOUT")
 
+    # Verifier 对下游工具（价格/合规/运输）的最大并发请求数（进程内共享）
+    verifier_concurrency: int = Field(default=5, alias="VERIFIER_CONCURRENCY")
+    # 超预算的候选也执行合规 / 运输检查（前端需要完整拒绝原因时开启）
+    verify_all_checks_for_audit: bool = Field(default=False, alias="VERIFY_ALL_CHECKS_FOR_AUDIT")
+    # 交给 LLM 综合排序的候选数（按价格取前 K 个）
+    verifier_llm_topk: int = Field(default=5, alias="VERIFIER_LLM_TOPK")
+    # 核验通过的候选少于该数量时跳过 LLM 排序，直接按价格排序
+    verifier_llm_min_candidates: int = Field(default=3, alias="VERIFIER_LLM_MIN_CANDIDATES")
+
     # RAG Configuration
     rag_enabled: bool = Field(default=True, alias="RAG_ENABLED")
     rag_top_k: int = Field(default=10, alias="RAG_TOP_K")
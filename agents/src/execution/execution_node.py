@@ -8,7 +8,7 @@ from datetime import UTC
 
 import structlog
 
-from ..graph.state import AgentState
+from ..graph.state import STEP_EXECUTION_COMPLETE, AgentState
 from ..tools.checkout import add_to_cart, compute_total, create_cart, create_draft_order
 from ..tools.evidence import create_evidence_snapshot
 
@@ -215,7 +215,7 @@ async def execution_node(state: AgentState) -> AgentState:
             "execution_result": execution_result,
             "draft_order_id": draft_order_id,
             "tool_calls": tool_calls,
-            "current_step": "execution_complete",
+            "current_step": STEP_EXECUTION_COMPLETE,
             "error": None,
         }
 
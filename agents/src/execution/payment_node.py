@@ -13,9 +13,9 @@ from datetime import UTC, datetime
 import structlog
 
 from ..config import get_settings
-from ..graph.state import AgentState
+from ..graph.state import STEP_PAYMENT_COMPLETE, STEP_PAYMENT_READY, AgentState
 from ..llm.client import call_llm_and_parse
-from ..llm.prompts import PAYMENT_PROMPT
+from ..llm.prompts import PAYMENT_PROMPT, PAYMENT_PROMPT_SHORT
 from ..llm.schemas import PaymentResult
 from ..tools.checkout import get_draft_order_summary
 
@@ -144,6 +144,7 @@ async def payment_node(state: AgentState) -> AgentState:
                     amount=amount,
                     currency=currency,
                     payment_methods=payment_methods,
+                    structured=settings.use_structured_output,
                 )
             except Exception as e:
                 logger.warning("payment_node.llm_guidance_failed", error=str(e))
@@ -173,7 +174,7 @@ async def payment_node(state: AgentState) -> AgentState:
             "payment_ready": payment_ready,
             "payment_intent_id": payment_intent.get("id"),
             "tool_calls": tool_calls,
-            "current_step": "payment_ready",
+            "current_step": STEP_PAYMENT_READY,
             "needs_user_input": True,  # 需要用户选择支付方式并确认
             "error": None,
         }
@@ -250,7 +251,7 @@ async def confirm_payment_node(state: AgentState) -> AgentState:
             "payment_result": payment_result,
             "order_id": payment_result.get("order_id"),
             "tool_calls": tool_calls,
-            "current_step": "payment_complete",
+            "current_step": STEP_PAYMENT_COMPLETE,
             "error": None,
         }
 
@@ -336,13 +337,17 @@ async def _llm_payment_guidance(
     amount: float,
     currency: str,
     payment_methods: list,
+    structured: bool = False,
 ) -> str | None:
-    """使用 LLM 生成支付指引"""
+    """使用 LLM 生成支付指引（structured=True 时使用精简 prompt）"""
     try:
         methods_str = ", ".join([m.get("display_name") for m in payment_methods])
 
         messages = [
-            {"role": "system", "content": PAYMENT_PROMPT},
+            {
+                "role": "system",
+                "content": PAYMENT_PROMPT_SHORT if structured else PAYMENT_PROMPT,
+            },
             {
                 "role": "user",
                 "content": f"""
@@ -360,6 +365,7 @@ Keep it concise and helpful.
             output_schema=PaymentResult,
             model_type="planner",
             temperature=0.3,
+            structured=structured,
         )
 
         if result:
@@ -7,11 +7,12 @@ Plan Agent Node implementation.
 from datetime import datetime, UTC
 
 import structlog
+from pydantic import TypeAdapter
 
 from ..config import get_settings
-from ..graph.state import AgentState
+from ..graph.state import STEP_PLAN_COMPLETE, AgentState
 from ..llm.client import call_llm_and_parse
-from ..llm.prompts import AI_RECOMMENDATION_PROMPT, PLAN_PROMPT
+from ..llm.prompts import AI_RECOMMENDATION_PROMPT, MAX_TOKENS, PLAN_PROMPT
 from ..llm.schemas import (
     AIRecommendationReason,
     DeliveryEstimate,
@@ -20,9 +21,13 @@ from ..llm.schemas import (
     PurchasePlan,
     TotalBreakdown,
 )
+from .score import rank_by_weighted_score
 
 logger = structlog.get_logger()
 
+# 方案列表序列化器（模块级构建一次，避免每次逐个 model_dump）
+_PLAN_ADAPTER = TypeAdapter(list[PurchasePlan])
+
 
 async def plan_node(state: AgentState) -> AgentState:
     """
@@ -76,30 +81,10 @@ async def plan_node(state: AgentState) -> AgentState:
         by_speed = sorted(verified_candidates, key=get_fastest_days)
 
         # 综合评分（加权）
-        weights = mission.get("objective_weights", {"price": 0.4, "speed": 0.3, "risk": 0.3})
-
-        def compute_score(candidate):
-            # 防御性处理：checks/warnings 可能为 None
-            checks = candidate.get("checks") or {}
-            pricing = checks.get("pricing") or {}
-            shipping = checks.get("shipping") or {}
-
-            # 归一化分数（简化版）
-            price = pricing.get("total_price", 100)
-            days = shipping.get("fastest_days", 14)
-            warnings_count = len(candidate.get("warnings") or [])
-
-            price_score = max(0, 1 - price / 500)  # 假设 $500 是最大值
-            speed_score = max(0, 1 - days / 30)  # 假设 30 天是最大值
-            risk_score = max(0, 1 - warnings_count / 5)  # 假设 5 个警告是最大值
-
-            return (
-                weights.get("price", 0.4) * price_score +
-                weights.get("speed", 0.3) * speed_score +
-                weights.get("risk", 0.3) * risk_score
-            )
-
-        by_score = sorted(verified_candidates, key=compute_score, reverse=True)
+        by_score = rank_by_weighted_score(
+            verified_candidates,
+            mission.get("objective_weights"),
+        )
 
         # 生成多个 Plan，确保使用不同的产品
         used_offer_ids = set()
@@ -232,10 +217,10 @@ async def plan_node(state: AgentState) -> AgentState:
 
         return {
             **state,
-            "plans": [p.model_dump() for p in plans],
+            "plans": _PLAN_ADAPTER.dump_python(plans),
             "recommended_plan": recommendation,
             "recommendation_reason": recommendation_reason,
-            "current_step": "plan_complete",
+            "current_step": STEP_PLAN_COMPLETE,
             "error": None,
         }
 
@@ -257,7 +242,11 @@ def _create_plan(
     destination_country: str,
     mission: dict | None = None,
 ) -> PurchasePlan:
-    """创建购买方案"""
+    """
+    创建购买方案
+
+    数据全部来自已核验的候选，使用 model_construct 跳过字段校验。
+    """
     offer_id = candidate.get("offer_id", "")
     sku_id = candidate.get("sku_id", "")
     candidate_info = candidate.get("candidate") or {}
@@ -289,11 +278,11 @@ def _create_plan(
     # 提取产品亮点（基于产品信息）
     product_highlights = _extract_product_highlights(candidate_info, plan_type, mission)
 
-    return PurchasePlan(
+    return PurchasePlan.model_construct(
         plan_name=plan_name,
         plan_type=plan_type,
         items=[
-            PlanItem(
+            PlanItem.model_construct(
                 offer_id=offer_id,
                 sku_id=sku_id or f"{offer_id}_default",
                 quantity=quantity,
@@ -303,13 +292,13 @@ def _create_plan(
         ],
         shipping_option_id="ship_standard",
         shipping_option_name="Standard Shipping",
-        total=TotalBreakdown(
+        total=TotalBreakdown.model_construct(
             subtotal=round(total_price, 2),
             shipping_cost=round(shipping_cost, 2),
             tax_estimate=round(tax_estimate, 2),
             total_landed_cost=round(total_landed, 2),
         ),
-        delivery=DeliveryEstimate(
+        delivery=DeliveryEstimate.model_construct(
             min_days=fastest_days,
             max_days=fastest_days + 7,
         ),
@@ -428,6 +417,7 @@ Generate a personalized recommendation reason for this product in the user's lan
                 output_schema=AIRecommendationReason,
                 model_type="planner",
                 temperature=0.3,
+                max_tokens=MAX_TOKENS["ai_reco"],
             )
             
             if result:
@@ -512,6 +502,7 @@ async def _llm_optimize_plans(mission: dict, candidates: list, plans: list) -> P
             output_schema=PlanRecommendation,
             model_type="planner",
             temperature=0.1,
+            max_tokens=MAX_TOKENS["plan"],
         )
         return result
 
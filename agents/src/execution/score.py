@@ -0,0 +1,67 @@
+"""
+候选综合评分
+
+按 ObjectiveWeights（price / speed / risk）对核验后的候选加权打分。
+先把候选列表拆成三列（价格、送达天数、警告数），再对列做一次向量式计算，
+避免在排序 key 里重复解析嵌套的 checks 结构。
+"""
+
+# 归一化上限（简化版）
+MAX_PRICE = 500.0  # 假设 $500 是最大值
+MAX_DAYS = 30.0  # 假设 30 天是最大值
+MAX_WARNINGS = 5.0  # 假设 5 个警告是最大值
+
+DEFAULT_WEIGHTS = {"price": 0.4, "speed": 0.3, "risk": 0.3}
+
+
+def extract_columns(candidates: list[dict]) -> tuple[list[float], list[float], list[float]]:
+    """
+    将候选列表转换为 (价格, 送达天数, 警告数) 三列
+
+    防御性处理：checks/warnings 可能为 None，缺失值按中位假设填充。
+    """
+    prices = []
+    days = []
+    warnings = []
+    for candidate in candidates:
+        checks = candidate.get("checks") or {}
+        pricing = checks.get("pricing") or {}
+        shipping = checks.get("shipping") or {}
+        prices.append(pricing.get("total_price", 100))
+        days.append(shipping.get("fastest_days", 14))
+        warnings.append(len(candidate.get("warnings") or []))
+    return prices, days, warnings
+
+
+def weighted_score(
+    prices: list[float],
+    days: list[float],
+    warnings: list[float],
+    w_price: float,
+    w_speed: float,
+    w_risk: float,
+) -> list[float]:
+    """对三列归一化后加权求和，返回每个候选的综合得分"""
+    return [
+        w_price * max(0, 1 - p / MAX_PRICE)
+        + w_speed * max(0, 1 - d / MAX_DAYS)
+        + w_risk * max(0, 1 - w / MAX_WARNINGS)
+        for p, d, w in zip(prices, days, warnings, strict=True)
+    ]
+
+
+def rank_by_weighted_score(candidates: list[dict], weights: dict | None = None) -> list[dict]:
+    """
+    按综合得分从高到低排序候选
+
+    同分时保持原有顺序（与 sorted(..., reverse=True) 一致）。
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    scores = weighted_score(
+        *extract_columns(candidates),
+        w_price=weights.get("price", 0.4),
+        w_speed=weights.get("speed", 0.3),
+        w_risk=weights.get("risk", 0.3),
+    )
+    order = sorted(range(len(candidates)), key=scores.__getitem__, reverse=True)
+    return [candidates[i] for i in order]
@@ -10,7 +10,13 @@ from ..compliance import compliance_node
 from ..execution import confirm_payment_node, execution_node, payment_node, plan_node
 from ..intent import intent_node
 from ..verifier import verifier_node
-from .state import AgentState
+from .state import (
+    STEP_AWAITING_CLARIFICATION,
+    STEP_NO_RESULTS,
+    STEP_NO_VALID_CANDIDATES,
+    STEP_WAITING_USER,
+    AgentState,
+)
 
 
 def should_continue_to_candidate(state: AgentState) -> str:
@@ -18,7 +24,7 @@ def should_continue_to_candidate(state: AgentState) -> str:
     if state.get("error"):
         return "error_handler"
     # 如果正在等待用户澄清，结束流程
-    if state.get("current_step") == "awaiting_clarification":
+    if state.get("current_step") == STEP_AWAITING_CLARIFICATION:
         return "wait_user"
     if state.get("mission") is None:
         return "wait_user"  # 没有 mission 也等待用户
@@ -75,7 +81,7 @@ def no_results_node(state: AgentState) -> AgentState:
     """无结果处理节点"""
     return {
         **state,
-        "current_step": "no_results",
+        "current_step": STEP_NO_RESULTS,
         "needs_user_input": True,
     }
 
@@ -84,7 +90,7 @@ def no_valid_candidates_node(state: AgentState) -> AgentState:
     """无有效候选处理节点"""
     return {
         **state,
-        "current_step": "no_valid_candidates",
+        "current_step": STEP_NO_VALID_CANDIDATES,
         "needs_user_input": True,
     }
 
@@ -93,7 +99,7 @@ def wait_user_node(state: AgentState) -> AgentState:
     """等待用户输入节点"""
     return {
         **state,
-        "current_step": "waiting_user",
+        "current_step": STEP_WAITING_USER,
         "needs_user_input": True,
     }
 
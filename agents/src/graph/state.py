@@ -2,10 +2,29 @@
 Agent State Definition for LangGraph.
 """
 
+import sys
 from typing import Annotated, TypedDict
 
 from langgraph.graph.message import add_messages
 
+# ========================================
+# current_step 取值
+# ========================================
+# 节点写入与响应分发共用同一个 intern 后的对象，字典查找时可直接命中指针比较
+STEP_START = sys.intern("start")
+STEP_AWAITING_CLARIFICATION = sys.intern("awaiting_clarification")
+STEP_NO_RESULTS = sys.intern("no_results")
+STEP_NO_VALID_CANDIDATES = sys.intern("no_valid_candidates")
+STEP_WAITING_USER = sys.intern("waiting_user")
+STEP_INTENT_COMPLETE = sys.intern("intent_complete")
+STEP_CANDIDATE_COMPLETE = sys.intern("candidate_complete")
+STEP_VERIFIER_COMPLETE = sys.intern("verifier_complete")
+STEP_COMPLIANCE_COMPLETE = sys.intern("compliance_complete")
+STEP_PLAN_COMPLETE = sys.intern("plan_complete")
+STEP_EXECUTION_COMPLETE = sys.intern("execution_complete")
+STEP_PAYMENT_READY = sys.intern("payment_ready")
+STEP_PAYMENT_COMPLETE = sys.intern("payment_complete")
+
 
 class IntentReasoning(TypedDict):
     """
@@ -28,6 +47,8 @@ class AgentState(TypedDict):
     # 消息历史
     # ========================================
     messages: Annotated[list, add_messages]
+    # 最后一条 AI 消息内容（追加 AIMessage 时同步写入，响应时无需反向扫描 messages）
+    last_ai_message: str | None
 
     # ========================================
     # 任务相关
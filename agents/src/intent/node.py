@@ -5,19 +5,96 @@ Intent Agent Node implementation.
 依赖 LLM 进行精准的意图分析，不支持 mock 模式。
 """
 
+import re
 from typing import Any
 
 import structlog
 from langchain_core.messages import AIMessage, HumanMessage
 
 from ..config import get_settings
-from ..graph.state import AgentState, IntentReasoning
+from ..graph.state import (
+    STEP_AWAITING_CLARIFICATION,
+    STEP_INTENT_COMPLETE,
+    AgentState,
+    IntentReasoning,
+)
 from ..llm.client import call_llm_and_parse
-from ..llm.prompts import INTENT_PREPROCESS_PROMPT, INTENT_PROMPT
+from ..llm.prompts import INTENT_PREPROCESS_PROMPT, INTENT_PROMPT, MAX_TOKENS
 from ..llm.schemas import IntentPreprocessResult, MissionParseResult
 
 logger = structlog.get_logger()
 
+# ==============================================
+# 本地语言检测（预编译正则，替代预处理阶段的 LLM 往返）
+# ==============================================
+_SCRIPT_PATTERNS: dict[str, re.Pattern[str]] = {
+    "ja": re.compile(r"[\u3040-\u30ff]"),  # 平假名 / 片假名
+    "ko": re.compile(r"[\uac00-\ud7af\u1100-\u11ff]"),
+    "zh": re.compile(r"[\u4e00-\u9fff]"),
+    "ru": re.compile(r"[\u0400-\u04ff]"),
+    "ar": re.compile(r"[\u0600-\u06ff]"),
+    "th": re.compile(r"[\u0e00-\u0e7f]"),
+}
+_LATIN_PATTERN = re.compile(r"[a-zA-Z\u00c0-\u024f]")
+_LATIN_WORD_PATTERN = re.compile(r"[a-z\u00e0-\u024f]+")
+_LATIN_STOPWORDS: dict[str, frozenset[str]] = {
+    "en": frozenset({
+        "i", "a", "an", "the", "and", "for", "with", "to", "of", "my", "me",
+        "need", "want", "under", "buy", "ship", "looking", "please", "is",
+    }),
+    "es": frozenset({
+        "el", "los", "las", "para", "con", "una", "y", "que", "quiero",
+        "necesito", "por", "mi", "comprar", "menos",
+    }),
+    "fr": frozenset({
+        "le", "les", "des", "pour", "avec", "une", "et", "je", "veux",
+        "du", "mon", "ma", "acheter", "moins",
+    }),
+    "de": frozenset({
+        "der", "die", "das", "und", "für", "mit", "ein", "eine", "ich",
+        "möchte", "brauche", "nach", "unter", "kaufen",
+    }),
+}
+_FAST_LANG_MIN_LETTERS = 4
+_FAST_LANG_CONFIDENCE = 0.9
+
+
+def detect_language_fast(text: str) -> str | None:
+    """
+    本地快速语言检测
+
+    按 Unicode 区段统计字符占比；拉丁字母文本再用常见停用词区分 en/es/fr/de。
+    文本过短、混合文字或置信度低于 0.9 时返回 None，由 LLM 预处理兜底。
+    """
+    if not text:
+        return None
+
+    counts = {lang: len(pattern.findall(text)) for lang, pattern in _SCRIPT_PATTERNS.items()}
+    # 日文混用假名与汉字，出现假名时汉字计入日文
+    if counts["ja"]:
+        counts["ja"] += counts["zh"]
+        counts["zh"] = 0
+    latin = len(_LATIN_PATTERN.findall(text))
+    total = sum(counts.values()) + latin
+    if total < _FAST_LANG_MIN_LETTERS:
+        return None
+
+    lang, top = max(counts.items(), key=lambda kv: kv[1])
+    if top / total >= _FAST_LANG_CONFIDENCE:
+        return lang
+    if latin / total < _FAST_LANG_CONFIDENCE:
+        return None
+
+    words = _LATIN_WORD_PATTERN.findall(text.lower())
+    hits = {
+        lang: sum(1 for w in words if w in stopwords)
+        for lang, stopwords in _LATIN_STOPWORDS.items()
+    }
+    lang, best = max(hits.items(), key=lambda kv: kv[1])
+    if best >= 2 and best >= _FAST_LANG_CONFIDENCE * sum(hits.values()):
+        return lang
+    return None
+
 
 async def intent_node(state: AgentState) -> AgentState:
     """
@@ -43,9 +120,9 @@ async def intent_node(state: AgentState) -> AgentState:
             return {
                 **state,
                 "intent_reasoning": intent_reasoning,
-                "current_step": "intent_complete",
+                "current_step": STEP_INTENT_COMPLETE,
             }
-        return {**state, "current_step": "intent_complete"}
+        return {**state, "current_step": STEP_INTENT_COMPLETE}
 
     try:
         messages = state.get("messages", [])
@@ -96,7 +173,7 @@ async def intent_node(state: AgentState) -> AgentState:
             **state,
             "mission": mission_dict,
             "intent_reasoning": intent_reasoning,
-            "current_step": "intent_complete",
+            "current_step": STEP_INTENT_COMPLETE,
             "token_used": state.get("token_used", 0) + 500,
             "needs_clarification": False,
             "error": None,
@@ -138,7 +215,8 @@ def _clarification_response(
     return {
         **state,
         "messages": [*messages, AIMessage(content=clarification_msg)],
-        "current_step": "awaiting_clarification",
+        "last_ai_message": clarification_msg,
+        "current_step": STEP_AWAITING_CLARIFICATION,
         "needs_clarification": True,
         "error": None,
     }
@@ -162,40 +240,48 @@ async def _llm_parse_intent(
     preprocess_info = ""
     
     # 阶段一：预处理（快速，可失败）
-    try:
-        preprocess_result = await call_llm_and_parse(
-            messages=[
-                {"role": "system", "content": INTENT_PREPROCESS_PROMPT},
-                {"role": "user", "content": user_message},
-            ],
-            output_schema=IntentPreprocessResult,
-            model_type="planner",
-            temperature=0.1,
-        )
+    # 本地能高置信度识别语言时跳过预处理 LLM 调用，翻译与澄清判断交给主解析
+    fast_language = detect_language_fast(user_message)
+    if fast_language:
+        logger.debug("intent_node.preprocess_fast_path", language=fast_language)
+        preprocess_info = f"\nPreprocessed info:\n- Language: {fast_language}"
+        preprocess_info_dict = {"detected_language": fast_language}
+    else:
+        try:
+            preprocess_result = await call_llm_and_parse(
+                messages=[
+                    {"role": "system", "content": INTENT_PREPROCESS_PROMPT},
+                    {"role": "user", "content": user_message},
+                ],
+                output_schema=IntentPreprocessResult,
+                model_type="planner",
+                temperature=0.0,
+                max_tokens=MAX_TOKENS["intent_preproc"],
+            )
         
-        if preprocess_result:
-            if preprocess_result.needs_clarification:
-                return MissionParseResult(
-                    needs_clarification=True,
-                    clarification_questions=preprocess_result.clarification_questions,
-                    detected_language=preprocess_result.detected_language or "zh",
-                ), preprocess_info_dict
+            if preprocess_result:
+                if preprocess_result.needs_clarification:
+                    return MissionParseResult(
+                        needs_clarification=True,
+                        clarification_questions=preprocess_result.clarification_questions,
+                        detected_language=preprocess_result.detected_language or "zh",
+                    ), preprocess_info_dict
             
-            preprocess_info = (
-                f"\nPreprocessed info:\n"
-                f"- Language: {preprocess_result.detected_language}\n"
-                f"- Keywords: {preprocess_result.normalized_query}\n"
-                f"- English: {preprocess_result.translated_query_en}"
-            )
+                preprocess_info = (
+                    f"\nPreprocessed info:\n"
+                    f"- Language: {preprocess_result.detected_language}\n"
+                    f"- Keywords: {preprocess_result.normalized_query}\n"
+                    f"- English: {preprocess_result.translated_query_en}"
+                )
             
-            preprocess_info_dict = {
-                "detected_language": preprocess_result.detected_language,
-                "normalized_query": preprocess_result.normalized_query,
-                "translated_query_en": preprocess_result.translated_query_en,
-            }
+                preprocess_info_dict = {
+                    "detected_language": preprocess_result.detected_language,
+                    "normalized_query": preprocess_result.normalized_query,
+                    "translated_query_en": preprocess_result.translated_query_en,
+                }
             
-    except Exception as e:
-        logger.debug("intent_node.preprocess_skipped", error=str(e))
+        except Exception as e:
+            logger.debug("intent_node.preprocess_skipped", error=str(e))
 
     # 阶段二：主解析
     prompt_messages = [
@@ -214,7 +300,8 @@ async def _llm_parse_intent(
         messages=prompt_messages,
         output_schema=MissionParseResult,
         model_type="planner",
-        temperature=0.1,
+        # 结构化抽取用确定性解码：同一输入得到同一 mission，也能命中 LLM 响应缓存
+        temperature=0.0,
     )
     
     return result, preprocess_info_dict
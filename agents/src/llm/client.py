@@ -4,7 +4,11 @@ LLM 客户端封装
 提供统一的 LLM 调用接口，支持结构化输出。
 """
 
+import hashlib
+import json
 import re
+import time
+from collections import OrderedDict
 from typing import TypeVar
 
 import structlog
@@ -17,6 +21,13 @@ logger = structlog.get_logger()
 
 T = TypeVar("T", bound=BaseModel)
 
+# 进程内 LLM 响应缓存：(schema, model, temperature, max_tokens, 输入哈希) -> (写入时间, JSON)
+_response_cache: OrderedDict[tuple, tuple[float, str]] = OrderedDict()
+_cache_stats: dict[str, int] = {"hits": 0, "misses": 0}
+
+_CODE_BLOCK_PATTERN = re.compile(r"```(?:json)?\s*([\s\S]*?)```")
+_JSON_PATTERN = re.compile(r"(\{[\s\S]*\}|\[[\s\S]*\])")
+
 
 def clean_json_response(text: str) -> str:
     """
@@ -31,25 +42,33 @@ def clean_json_response(text: str) -> str:
     Returns:
         清理后的 JSON 字符串
     """
+    stripped = text.strip()
+
+    # 大多数响应本身就是纯 JSON，直接交给 model_validate_json，无需正则扫描
+    if stripped[:1] in ("{", "[") and stripped[-1:] in ("}", "]"):
+        return stripped
+
     # 移除 markdown 代码块标记
     # 匹配 ```json ... ``` 或 ``` ... ```
-    code_block_pattern = r"```(?:json)?\s*([\s\S]*?)```"
-    match = re.search(code_block_pattern, text)
+    match = _CODE_BLOCK_PATTERN.search(stripped)
     if match:
         return match.group(1).strip()
 
     # 如果没有代码块，尝试找到 JSON 对象/数组
     # 匹配 {...} 或 [...]
-    json_pattern = r"(\{[\s\S]*\}|\[[\s\S]*\])"
-    match = re.search(json_pattern, text)
+    match = _JSON_PATTERN.search(stripped)
     if match:
         return match.group(1).strip()
 
     # 返回原始文本
-    return text.strip()
+    return stripped
 
 
-def get_llm(model_type: str = "planner", temperature: float = 0.1) -> ChatOpenAI:
+def get_llm(
+    model_type: str = "planner",
+    temperature: float = 0.1,
+    max_tokens: int | None = None,
+) -> ChatOpenAI:
     """
     获取 LLM 实例
 
@@ -58,17 +77,13 @@ def get_llm(model_type: str = "planner", temperature: float = 0.1) -> ChatOpenAI
     Args:
         model_type: "planner"（轻量）或 "verifier"（重量）
         temperature: 温度参数
+        max_tokens: 输出 token 上限（None 表示不限制）
 
     Returns:
         ChatOpenAI 实例
     """
     settings = get_settings()
-
-    model = (
-        settings.openai_model_planner
-        if model_type == "planner"
-        else settings.openai_model_verifier
-    )
+    model = _resolve_model(model_type)
 
     # 支持自定义 base_url（用于 Poe API 等兼容服务）
     base_url = settings.openai_base_url
@@ -80,6 +95,7 @@ def get_llm(model_type: str = "planner", temperature: float = 0.1) -> ChatOpenAI
         model=model,
         base_url=base_url or "default",
         model_type=model_type,
+        max_tokens=max_tokens,
     )
 
     return ChatOpenAI(
@@ -87,11 +103,22 @@ def get_llm(model_type: str = "planner", temperature: float = 0.1) -> ChatOpenAI
         api_key=settings.openai_api_key,
         base_url=base_url,
         temperature=temperature,
+        max_tokens=max_tokens,
         request_timeout=30,
         max_retries=2,
     )
 
 
+def _resolve_model(model_type: str) -> str:
+    """根据 model_type 返回配置的模型名"""
+    settings = get_settings()
+    return (
+        settings.openai_model_planner
+        if model_type == "planner"
+        else settings.openai_model_verifier
+    )
+
+
 def get_llm_with_structured_output(
     output_schema: type[T],
     model_type: str = "planner",
@@ -164,11 +191,14 @@ async def call_llm_and_parse(
     model_type: str = "planner",
     temperature: float = 0.0,
     max_retries: int = 2,
+    max_tokens: int | None = None,
+    structured: bool = False,
 ) -> T | None:
     """
     调用 LLM 并解析为结构化输出
 
-    兼容不支持 function calling 的 API（如 Poe）
+    默认从文本中提取 JSON 解析，兼容不支持 function calling 的 API（如 Poe）；
+    structured=True 时使用 response_format=json_schema，由模型直接返回 schema 对象。
 
     Args:
         messages: 消息列表
@@ -176,25 +206,75 @@ async def call_llm_and_parse(
         model_type: "planner" 或 "verifier"
         temperature: 温度参数
         max_retries: 最大重试次数
+        max_tokens: 输出 token 上限，见 prompts.MAX_TOKENS
+        structured: 是否使用 json_schema 结构化输出（见 USE_STRUCTURED_OUTPUT）
 
     Returns:
         解析后的 Pydantic 模型实例，失败返回 None
     """
-    llm = get_llm(model_type=model_type, temperature=temperature)
+    settings = get_settings()
+    cache_key = None
+    # 只缓存确定性调用（temperature == 0），采样输出不应原样重放
+    if settings.llm_cache_enabled and temperature == 0:
+        cache_key = _cache_key(
+            output_schema.__name__,
+            _resolve_model(model_type),
+            temperature,
+            max_tokens,
+            messages,
+        )
+        cached = _cache_get(cache_key, settings.llm_cache_ttl_seconds)
+        if cached is not None:
+            try:
+                result = output_schema.model_validate_json(cached)
+                _cache_stats["hits"] += 1
+                logger.info(
+                    "llm.cache_hit",
+                    schema=output_schema.__name__,
+                    **_cache_stats,
+                )
+                return result
+            except Exception:
+                # schema 变更导致旧条目失效，丢弃后走正常调用
+                _response_cache.pop(cache_key, None)
+        _cache_stats["misses"] += 1
+
+    llm = get_llm(model_type=model_type, temperature=temperature, max_tokens=max_tokens)
+    if structured:
+        llm = llm.with_structured_output(output_schema, method="json_schema")
 
     for attempt in range(max_retries):
         try:
             response = await llm.ainvoke(messages)
-            content = response.content if hasattr(response, "content") else str(response)
 
-            # 清理并解析 JSON
-            cleaned = clean_json_response(content)
-            result = output_schema.model_validate_json(cleaned)
+            if structured:
+                result = (
+                    response
+                    if isinstance(response, output_schema)
+                    else output_schema.model_validate(response)
+                )
+                cleaned = result.model_dump_json()
+            else:
+                content = response.content if hasattr(response, "content") else str(response)
+
+                # 清理并解析 JSON
+                cleaned = clean_json_response(content)
+                result = output_schema.model_validate_json(cleaned)
+
+            token_count = 0
+            if hasattr(response, "usage_metadata") and response.usage_metadata:
+                token_count = response.usage_metadata.get("total_tokens", 0)
+
+            if cache_key is not None:
+                _cache_put(cache_key, cleaned, settings.llm_cache_max_entries)
 
             logger.info(
                 "llm.parse_success",
                 schema=output_schema.__name__,
                 attempt=attempt + 1,
+                tokens=token_count,
+                cache_hits=_cache_stats["hits"],
+                cache_misses=_cache_stats["misses"],
             )
             return result
 
@@ -211,3 +291,63 @@ async def call_llm_and_parse(
 
     return None
 
+
+# ==============================================
+# Response Cache
+# ==============================================
+
+def _message_fingerprint(message) -> tuple[str, str]:
+    """把 dict 或 LangChain 消息对象归一为 (role, content)"""
+    if isinstance(message, dict):
+        return str(message.get("role", "")), str(message.get("content", ""))
+    role = getattr(message, "type", type(message).__name__)
+    return str(role), str(getattr(message, "content", message))
+
+
+def _cache_key(
+    schema_name: str,
+    model: str,
+    temperature: float,
+    max_tokens: int | None,
+    messages: list,
+) -> tuple:
+    """构建缓存键：输入消息取 sha256，避免长 prompt 常驻内存"""
+    payload = json.dumps(
+        [_message_fingerprint(m) for m in messages],
+        ensure_ascii=False,
+    )
+    input_hash = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return (schema_name, model, temperature, max_tokens, input_hash)
+
+
+def _cache_get(key: tuple, ttl_seconds: int) -> str | None:
+    """读取未过期的缓存条目"""
+    entry = _response_cache.get(key)
+    if entry is None:
+        return None
+    stored_at, payload = entry
+    if time.monotonic() - stored_at > ttl_seconds:
+        del _response_cache[key]
+        return None
+    _response_cache.move_to_end(key)
+    return payload
+
+
+def _cache_put(key: tuple, payload: str, max_entries: int) -> None:
+    """写入缓存，超过容量时淘汰最久未使用的条目"""
+    _response_cache[key] = (time.monotonic(), payload)
+    _response_cache.move_to_end(key)
+    while len(_response_cache) > max_entries:
+        _response_cache.popitem(last=False)
+
+
+def get_llm_cache_stats() -> dict[str, int]:
+    """返回缓存命中统计"""
+    return {**_cache_stats, "size": len(_response_cache)}
+
+
+def clear_llm_cache() -> None:
+    """清空响应缓存（测试或配置变更时使用）"""
+    _response_cache.clear()
+    _cache_stats["hits"] = 0
+    _cache_stats["misses"] = 0
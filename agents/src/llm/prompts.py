@@ -4,6 +4,7 @@ Agent Prompts
 各个 Agent 节点的 System Prompt 定义。
 """
 
+
 # ==============================================
 # Intent Agent Prompt - 精简版，依赖 LLM 理解能力
 # ==============================================
@@ -569,6 +570,14 @@ Return ONLY a JSON object (no markdown, no explanation):
 IMPORTANT: Return ONLY the JSON object, no other text.
 """
 
+# ==============================================
+# Short Prompts (Structured Output)
+# ==============================================
+# 启用 json_schema 结构化输出时，输出格式由 schema 约束，
+# 示例 JSON 只是多余的输入 token，直接去掉 "## Output Format" 段。
+COMPLIANCE_PROMPT_SHORT = COMPLIANCE_PROMPT.split("## Output Format")[0].rstrip() + "\n"
+PAYMENT_PROMPT_SHORT = PAYMENT_PROMPT.split("## Output Format")[0].rstrip() + "\n"
+
 # ==============================================
 # RAG Context Prompt
 # ==============================================
@@ -590,16 +599,51 @@ Use this information to provide accurate, well-cited responses.
 """
 
 # ==============================================
-# Helper Functions
+# Output Token Caps
 # ==============================================
+# 各 Agent 的输出 token 上限，按对应 schema 的字段规模估算，
+# 防止自由文本字段（reason / main_reason 等）失控生成。
+# 例如 VerificationResult 约 80 * N + 200 tokens（N 为排名数）。
+MAX_TOKENS: dict[str, int] = {
+    "verifier": 1500,
+    "plan": 400,
+    "compliance": 800,
+    "ai_reco": 350,
+    "intent_preproc": 200,
+    "candidate_relevance": 120,
+}
 
-def get_mission_extraction_prompt(user_message: str) -> list[dict]:
-    """构建 Mission 提取的消息列表"""
-    return [
-        {"role": "system", "content": INTENT_PROMPT},
-        {"role": "user", "content": user_message},
-    ]
 
+# ==============================================
+# Prompt Field Whitelists
+# ==============================================
+# 只把 prompt 中实际引用的字段送给 LLM，其余字段（variants、媒体、描述等）
+# 只会增加输入 token。值为 None 表示保留整个字段，dict 表示继续按子字段投影。
+COMPLIANCE_FIELDS: dict[str, dict | None] = {
+    "offer_id": None,
+    "risk_level": None,
+    "issues": None,
+    "warnings": None,
+    "required_docs": None,
+}
+
+
+def project_fields(obj: dict, spec: dict[str, dict | None]) -> dict:
+    """按白名单投影 dict，缺失的字段直接跳过"""
+    projected = {}
+    for key, sub_spec in spec.items():
+        if key not in obj:
+            continue
+        value = obj[key]
+        if sub_spec is not None and isinstance(value, dict):
+            value = project_fields(value, sub_spec)
+        projected[key] = value
+    return projected
+
+
+# ==============================================
+# Helper Functions
+# ==============================================
 
 def get_verification_prompt(mission: dict, candidates: list, tool_results: dict) -> list[dict]:
     """构建核验的消息列表"""
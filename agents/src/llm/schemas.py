@@ -4,17 +4,30 @@ LLM 输出 Schema 定义
 用于 LLM 的结构化输出。
 """
 
-from typing import Literal
+from collections.abc import Callable
+from typing import Annotated, Any, Literal, get_args
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, BeforeValidator, Field
+
+
+def _coerce_to(literal: Any, fallback: str) -> Callable[[Any], Any]:
+    """LLM 输出的取值不在枚举内时回退为 fallback，避免单个字段拖垮整次解析"""
+    allowed = frozenset(get_args(literal))
+
+    def coerce(value: Any) -> Any:
+        if isinstance(value, str):
+            value = value.strip().lower()
+        return value if value in allowed else fallback
+
+    return coerce
 
 
 # ==============================================
 # Intent Agent Output Schema
 # ==============================================
 
-# 用户意图类型
-IntentType = Literal[
+# 用户意图类型（未知取值回退为 search）
+_IntentLiteral = Literal[
     "search",           # 搜索商品
     "compare",          # 比较商品
     "purchase",         # 直接购买
@@ -25,25 +38,33 @@ IntentType = Literal[
     "return_refund",    # 退换货
     "other",            # 其他
 ]
+IntentType = Annotated[_IntentLiteral, BeforeValidator(_coerce_to(_IntentLiteral, "search"))]
+
+# 约束操作符（未知取值如 lte / gte 回退为 eq）
+_ConstraintOperatorLiteral = Literal["eq", "ne", "in", "not_in", "gt", "lt"]
+ConstraintOperator = Annotated[
+    _ConstraintOperatorLiteral,
+    BeforeValidator(_coerce_to(_ConstraintOperatorLiteral, "eq")),
+]
+
+# 共享字段（Annotated 别名），避免重复描述膨胀生成的 JSON Schema
+NeedsClarification = Annotated[bool, Field(description="是否需要澄清")]
+ClarificationQuestions = Annotated[
+    list[str], Field(default_factory=list, description="澄清问题（1-3 个）")
+]
 
 
 class SubTask(BaseModel):
     """拆解出的子任务"""
     task_id: str = Field(description="子任务 ID，如 task_1, task_2")
-    intent_type: str = Field(
-        default="search",
-        description="意图类型: search, compare, purchase, inquiry, recommendation, cart_operation, order_status, return_refund, other"
-    )
+    intent_type: IntentType = Field(default="search", description="意图类型")
     description: str = Field(description="子任务描述（用户原语言）")
     description_en: str = Field(default="", description="子任务描述（英文）")
     product_type: str = Field(default="", description="产品类型（用户原语言）")
     product_type_en: str = Field(default="", description="产品类型（英文）")
     priority: int = Field(default=1, ge=1, le=10, description="优先级 1-10，数字越小越优先")
     depends_on: list[str] = Field(default_factory=list, description="依赖的前置任务 ID")
-    extracted_attributes: dict = Field(
-        default_factory=dict,
-        description="提取的属性: color, size, brand, price_range, material 等"
-    )
+    extracted_attributes: dict = Field(default_factory=dict, description="属性，如 color / size / brand")
 
 
 class IntentPreprocessResult(BaseModel):
@@ -52,8 +73,8 @@ class IntentPreprocessResult(BaseModel):
     normalized_query: str = Field(default="", description="归一化后的查询，保持用户原始语言")
     translated_query_en: str | None = Field(default=None, description="英文翻译，便于下游参考")
     issues: list[str] = Field(default_factory=list, description="发现的问题或警告")
-    needs_clarification: bool = Field(default=False, description="是否需要澄清")
-    clarification_questions: list[str] = Field(default_factory=list, description="澄清问题（1-3 个）")
+    needs_clarification: NeedsClarification = False
+    clarification_questions: ClarificationQuestions
     # 新增：意图类型识别
     primary_intent: str = Field(
         default="search",
@@ -64,9 +85,9 @@ class IntentPreprocessResult(BaseModel):
 
 class HardConstraint(BaseModel):
     """硬性约束"""
-    type: str = Field(description="约束类型: category, brand, voltage, certification, material, compatibility")
+    type: str = Field(description="约束类型，如 category / brand / material")
     value: str = Field(description="约束值")
-    operator: str = Field(default="eq", description="操作符: eq, ne, in, not_in, gt, lt")
+    operator: ConstraintOperator = Field(default="eq", description="操作符")
 
 
 class SoftPreference(BaseModel):
@@ -86,12 +107,12 @@ class ObjectiveWeights(BaseModel):
 class PurchaseContext(BaseModel):
     """购买上下文 - 用于 AI 推荐理由生成"""
     occasion: str | None = Field(default=None, description="购买场景: gift, self_use, business, event")
-    recipient: str | None = Field(default=None, description="收礼人: girlfriend, boyfriend, parent, friend, colleague")
+    recipient: str | None = Field(default=None, description="收礼人，如 girlfriend / parent / friend")
     recipient_gender: str | None = Field(default=None, description="收礼人性别: male, female, unknown")
-    recipient_age_range: str | None = Field(default=None, description="年龄段: child, teen, young_adult, adult, senior")
-    style_preference: str | None = Field(default=None, description="风格偏好: casual, formal, sporty, elegant, cute")
+    recipient_age_range: str | None = Field(default=None, description="年龄段，如 child / teen / adult / senior")
+    style_preference: str | None = Field(default=None, description="风格偏好，如 casual / formal / elegant")
     urgency: str | None = Field(default=None, description="紧急程度: urgent, normal, flexible")
-    budget_sensitivity: str | None = Field(default=None, description="预算敏感度: budget_conscious, moderate, premium")
+    budget_sensitivity: str | None = Field(default=None, description="预算敏感度: budget_conscious / premium")
     special_requirements: list[str] = Field(default_factory=list, description="特殊要求")
 
 
@@ -113,10 +134,7 @@ class ExtractedAttributes(BaseModel):
 class MissionParseResult(BaseModel):
     """Intent Agent 解析结果"""
     # === 意图识别 ===
-    primary_intent: str = Field(
-        default="search",
-        description="主要意图类型: search, compare, purchase, inquiry, recommendation, cart_operation"
-    )
+    primary_intent: IntentType = Field(default="search", description="主要意图类型")
     has_multiple_tasks: bool = Field(default=False, description="是否包含多个任务")
     sub_tasks: list[SubTask] = Field(default_factory=list, description="拆解出的子任务列表")
     
@@ -134,18 +152,9 @@ class MissionParseResult(BaseModel):
     
     # === 搜索关键词 ===
     search_query: str = Field(default="", description="搜索关键词（用户原始语言）")
-    search_query_en: str = Field(
-        default="",
-        description="English translation of search query for product search (e.g., 'black jacket', 'wireless charger')"
-    )
-    primary_product_type: str = Field(
-        default="",
-        description="Primary product type in user's language (e.g., '充电器', 'charger', '西装外套')"
-    )
-    primary_product_type_en: str = Field(
-        default="",
-        description="English translation of primary product type for matching (e.g., 'charger', 'blazer', 'dress')"
-    )
+    search_query_en: str = Field(default="", description="English search query, e.g. 'black jacket'")
+    primary_product_type: str = Field(default="", description="产品类型（用户原语言）")
+    primary_product_type_en: str = Field(default="", description="English product type, e.g. 'charger'")
     
     # === 提取的属性 ===
     extracted_attributes: ExtractedAttributes = Field(
@@ -158,8 +167,8 @@ class MissionParseResult(BaseModel):
     detected_language: str = Field(default="en", description="用户语言")
     
     # === 澄清 ===
-    needs_clarification: bool = Field(default=False, description="是否需要澄清")
-    clarification_questions: list[str] = Field(default_factory=list, description="澄清问题")
+    needs_clarification: NeedsClarification = False
+    clarification_questions: ClarificationQuestions
     clarification_reason: str = Field(default="", description="需要澄清的原因")
 
 
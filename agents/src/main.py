@@ -7,6 +7,7 @@ import asyncio
 import structlog
 from langchain_core.messages import HumanMessage
 
+from . import install_uvloop
 from .config import get_settings
 from .graph import AgentState, build_agent_graph
 
@@ -129,5 +130,6 @@ async def main():
 
 
 if __name__ == "__main__":
+    install_uvloop()
     asyncio.run(main())
 
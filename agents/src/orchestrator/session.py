@@ -9,19 +9,50 @@ Session Manager - 会话管理
 """
 
 import asyncio
-import hashlib
-import json
-from datetime import UTC, datetime, timedelta
+import heapq
+import itertools
+import secrets
+import time
+from collections.abc import Callable
+from datetime import UTC, datetime
+from functools import cache
 from typing import Any
 
+import orjson
 import structlog
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
 
 from ..config import get_settings
 from ..graph.builder import get_agent_graph
-from ..graph.state import AgentState
+from ..graph.state import (
+    STEP_CANDIDATE_COMPLETE,
+    STEP_EXECUTION_COMPLETE,
+    STEP_INTENT_COMPLETE,
+    STEP_PAYMENT_COMPLETE,
+    STEP_PAYMENT_READY,
+    STEP_PLAN_COMPLETE,
+    STEP_START,
+    STEP_VERIFIER_COMPLETE,
+    AgentState,
+)
 
 logger = structlog.get_logger()
 
+# 秒级 UTC 时间字符串缓存：(epoch 秒, 格式化结果)
+_iso_cache: tuple[int, str] = (0, "")
+
+# 会话表分片数（必须是 2 的幂，按 hash(session_id) & (N-1) 取分片）
+_SESSION_SHARDS = 16
+
+
+def utc_iso_now() -> str:
+    """当前 UTC 时间（秒级，如 2025-01-01T00:00:00Z），同一秒内复用已格式化的字符串"""
+    global _iso_cache
+    now = int(time.time())
+    if now != _iso_cache[0]:
+        _iso_cache = (now, datetime.fromtimestamp(now, UTC).strftime("%Y-%m-%dT%H:%M:%SZ"))
+    return _iso_cache[1]
+
 
 class SessionManager:
     """
@@ -36,7 +67,12 @@ class SessionManager:
 
     def __init__(self):
         self.settings = get_settings()
-        self._sessions: dict[str, Session] = {}
+        # 创建会话时用到的配置项预先取出，避免每次走 BaseSettings 属性访问
+        self._default_budget: int = self.settings.max_tokens_per_session
+        self._shards: list[dict[str, Session]] = [{} for _ in range(_SESSION_SHARDS)]
+        # 过期索引：(过期时间戳, session_id) 小顶堆，惰性删除
+        # 会话每次 touch 都会压入新条目，弹出时与会话当前 expiry_ts 比对过滤旧条目
+        self._expiry_heap: list[tuple[float, str]] = []
         self._cleanup_task: asyncio.Task | None = None
 
     async def start(self):
@@ -65,16 +101,18 @@ class SessionManager:
         if session_id is None:
             session_id = self._generate_session_id(user_id)
 
-        if session_id in self._sessions:
-            return self._sessions[session_id]
+        shard = self._shard(session_id)
+        if session_id in shard:
+            return shard[session_id]
 
         session = Session(
             session_id=session_id,
             user_id=user_id,
-            token_budget=token_budget or self.settings.max_tokens_per_session,
+            token_budget=token_budget or self._default_budget,
         )
+        session.attach_expiry_index(self._expiry_heap)
 
-        self._sessions[session_id] = session
+        shard[session_id] = session
         logger.info(
             "session.created",
             session_id=session_id,
@@ -86,26 +124,30 @@ class SessionManager:
 
     def get_session(self, session_id: str) -> "Session | None":
         """获取会话"""
-        session = self._sessions.get(session_id)
+        shard = self._shard(session_id)
+        session = shard.get(session_id)
         if session and session.is_expired:
-            self._sessions.pop(session_id, None)
+            shard.pop(session_id, None)
             return None
         return session
 
     def delete_session(self, session_id: str) -> bool:
         """删除会话"""
-        if session_id in self._sessions:
-            del self._sessions[session_id]
+        shard = self._shard(session_id)
+        if session_id in shard:
+            del shard[session_id]
             logger.info("session.deleted", session_id=session_id)
             return True
         return False
 
     def list_sessions(self, user_id: str | None = None) -> list["Session"]:
-        """列出会话"""
-        sessions = list(self._sessions.values())
-        if user_id:
-            sessions = [s for s in sessions if s.user_id == user_id]
-        return [s for s in sessions if not s.is_expired]
+        """列出会话（单次遍历同时过滤用户和过期）"""
+        now = time.monotonic()
+        return [
+            s
+            for s in itertools.chain.from_iterable(shard.values() for shard in self._shards)
+            if (not user_id or s.user_id == user_id) and s.expiry_ts >= now
+        ]
 
     async def _cleanup_loop(self):
         """定期清理过期会话"""
@@ -119,21 +161,29 @@ class SessionManager:
                 logger.error("session_cleanup.error", error=str(e))
 
     def _cleanup_expired_sessions(self):
-        """清理过期会话"""
-        expired = [
-            sid for sid, session in self._sessions.items()
-            if session.is_expired
-        ]
-        for sid in expired:
-            del self._sessions[sid]
+        """清理过期会话（只弹出堆顶已到期的条目）"""
+        now = time.monotonic()
+        heap = self._expiry_heap
+        expired = 0
+        while heap and heap[0][0] <= now:
+            expiry_ts, sid = heapq.heappop(heap)
+            shard = self._shard(sid)
+            session = shard.get(sid)
+            # 会话已删除或之后被 touch 过，该条目已失效
+            if session is None or session.expiry_ts != expiry_ts:
+                continue
+            del shard[sid]
+            expired += 1
         if expired:
-            logger.info("sessions.cleaned", count=len(expired))
+            logger.info("sessions.cleaned", count=expired)
+
+    def _shard(self, session_id: str) -> dict[str, "Session"]:
+        """返回 session_id 所在的分片"""
+        return self._shards[hash(session_id) & (_SESSION_SHARDS - 1)]
 
     def _generate_session_id(self, user_id: str) -> str:
-        """生成会话 ID"""
-        timestamp = datetime.now(UTC).isoformat()
-        content = f"{user_id}:{timestamp}"
-        return f"sess_{hashlib.sha256(content.encode()).hexdigest()[:16]}"
+        """生成会话 ID（不透明句柄，无需与 user_id 关联）"""
+        return f"sess_{secrets.token_hex(8)}"
 
 
 class Session:
@@ -157,9 +207,19 @@ class Session:
         self.timeout_minutes = timeout_minutes
 
         self.created_at = datetime.now(UTC)
-        self.last_activity = datetime.now(UTC)
+        self.last_activity_ts = time.time()
+        # API 返回用的时间字符串，只在写入时格式化一次
+        self.created_at_iso = utc_iso_now()
+        self.last_activity_iso = self.created_at_iso
+        self.expiry_ts = time.monotonic() + timeout_minutes * 60
+        self._expiry_heap: list[tuple[float, str]] | None = None
         self.state: AgentState | None = None
-        self.message_history: list[dict] = []
+        # 与 state["current_step"] 同步，写 state 时更新，列表接口直接读属性
+        self.current_step: str | None = None
+        # 消息历史按列存储（角色 / 内容 / 时间戳），避免每条消息一个小 dict
+        self._roles: list[str] = []
+        self._contents: list[str] = []
+        self._ts: list[float] = []
         self.tool_call_history: list[dict] = []
 
         self._graph = None
@@ -168,8 +228,20 @@ class Session:
     @property
     def is_expired(self) -> bool:
         """检查会话是否过期"""
-        timeout = timedelta(minutes=self.timeout_minutes)
-        return datetime.now(UTC) - self.last_activity > timeout
+        return time.monotonic() > self.expiry_ts
+
+    @property
+    def last_activity(self) -> datetime:
+        """最后活动时间（只在 API / 持久化边界转换为 datetime）"""
+        return datetime.fromtimestamp(self.last_activity_ts, UTC)
+
+    @property
+    def message_history(self) -> list[dict]:
+        """消息历史（按需组装为 dict 列表）"""
+        return [
+            {"role": role, "content": content, "timestamp": ts}
+            for role, content, ts in zip(self._roles, self._contents, self._ts, strict=True)
+        ]
 
     @property
     def token_remaining(self) -> int:
@@ -181,14 +253,27 @@ class Session:
         """Token 使用百分比"""
         return min(100.0, (self.token_used / self.token_budget) * 100)
 
+    def attach_expiry_index(self, heap: list[tuple[float, str]]):
+        """关联 SessionManager 的过期索引，并登记当前过期时间"""
+        self._expiry_heap = heap
+        heapq.heappush(heap, (self.expiry_ts, self.session_id))
+
     def touch(self):
         """更新最后活动时间"""
-        self.last_activity = datetime.now(UTC)
+        self.last_activity_ts = time.time()
+        self.last_activity_iso = utc_iso_now()
+        self.expiry_ts = time.monotonic() + self.timeout_minutes * 60
+        if self._expiry_heap is not None:
+            heapq.heappush(self._expiry_heap, (self.expiry_ts, self.session_id))
 
     def add_tokens(self, count: int):
         """增加 Token 使用量"""
         self.token_used += count
 
+    def set_tokens(self, used: int):
+        """设置 Token 使用量（Graph 结果中的 token_used 已是累计值）"""
+        self.token_used = used
+
     def can_afford_tokens(self, estimated: int) -> bool:
         """检查是否有足够的 Token 预算"""
         return self.token_remaining >= estimated
@@ -211,7 +296,7 @@ class Session:
         self.touch()
 
         # 检查 Token 预算
-        estimated_tokens = len(message.split()) * 2 + 500  # 粗略估算
+        estimated_tokens = (len(message) >> 2) + 500  # 粗略估算：约 4 字符 / token
         if not self.can_afford_tokens(estimated_tokens):
             return {
                 "success": False,
@@ -226,8 +311,6 @@ class Session:
             self._graph = get_agent_graph()
 
         # 构建输入状态
-        from langchain_core.messages import HumanMessage
-
         input_state = self._build_input_state(message, context)
 
         try:
@@ -237,22 +320,15 @@ class Session:
 
             # 更新会话状态
             self.state = result
+            self.current_step = result.get("current_step")
             self.token_used += result.get("token_used", 0) - (input_state.get("token_used", 0))
 
             # 记录消息
-            self.message_history.append({
-                "role": "user",
-                "content": message,
-                "timestamp": datetime.now(UTC).isoformat(),
-            })
+            self._append_message("user", message)
 
             # 提取响应
             response = self._extract_response(result)
-            self.message_history.append({
-                "role": "assistant",
-                "content": response.get("message", ""),
-                "timestamp": datetime.now(UTC).isoformat(),
-            })
+            self._append_message("assistant", response.get("message", ""))
 
             return {
                 "success": True,
@@ -275,22 +351,23 @@ class Session:
                 "error_code": "INTERNAL_ERROR",
             }
 
+    def _append_message(self, role: str, content: str):
+        """追加一条消息记录"""
+        self._roles.append(role)
+        self._contents.append(content)
+        self._ts.append(time.time())
+
     def _build_input_state(
         self,
         message: str,
         context: dict | None = None,
     ) -> AgentState:
         """构建输入状态"""
-        from langchain_core.messages import HumanMessage
-
-        # 如果有现有状态，基于它构建
+        # 如果有现有状态，浅复制后追加消息（不原地修改 self.state，Graph 失败时会话保持原样）
         if self.state:
-            messages = list(self.state.get("messages", []))
-            messages.append(HumanMessage(content=message))
-
             state = {
                 **self.state,
-                "messages": messages,
+                "messages": [*self.state.get("messages", []), HumanMessage(content=message)],
             }
 
             # 合并上下文（用户确认等）
@@ -319,7 +396,7 @@ class Session:
             "tool_call_records": [],
             "token_budget": self.token_budget,
             "token_used": self.token_used,
-            "current_step": "start",
+            "current_step": STEP_START,
             "needs_user_input": False,
             "user_confirmation": context.get("user_confirmation") if context else None,
             "error": None,
@@ -329,83 +406,12 @@ class Session:
 
     def _extract_response(self, state: AgentState) -> dict:
         """从状态中提取响应"""
-        current_step = state.get("current_step", "")
-
-        # 根据当前步骤构建响应
         if state.get("error"):
-            return {
-                "type": "error",
-                "message": state.get("error"),
-                "error_code": state.get("error_code"),
-                "recoverable": state.get("recoverable", False),
-            }
-
-        if current_step == "intent_complete":
-            mission = state.get("mission", {})
-            return {
-                "type": "mission_parsed",
-                "message": f"I understand you're looking for products to ship to {mission.get('destination_country')}. Let me search for the best options.",
-                "mission": mission,
-            }
-
-        if current_step == "candidate_complete":
-            candidates = state.get("candidates", [])
-            return {
-                "type": "candidates_found",
-                "message": f"I found {len(candidates)} potential products. Let me verify the details.",
-                "count": len(candidates),
-            }
+            return _build_error_response(state)
 
-        if current_step == "verifier_complete":
-            verified = state.get("verified_candidates", [])
-            return {
-                "type": "verification_complete",
-                "message": f"I've verified {len(verified)} products that meet your requirements.",
-                "count": len(verified),
-            }
-
-        if current_step == "plan_complete":
-            plans = state.get("plans", [])
-            return {
-                "type": "plans_ready",
-                "message": f"I've prepared {len(plans)} purchase options for you.",
-                "plans": plans,
-                "recommended": state.get("recommended_plan"),
-            }
-
-        if current_step == "execution_complete":
-            result = state.get("execution_result", {})
-            return {
-                "type": "draft_order_created",
-                "message": result.get("summary", "Draft order created successfully."),
-                "draft_order_id": result.get("draft_order_id"),
-                "payable_amount": result.get("payable_amount"),
-            }
-
-        if current_step == "payment_ready":
-            payment = state.get("payment_ready", {})
-            return {
-                "type": "payment_ready",
-                "message": payment.get("summary", "Ready for payment."),
-                "payment_intent": payment.get("payment_intent"),
-                "payment_methods": payment.get("payment_methods"),
-            }
-
-        if current_step == "payment_complete":
-            result = state.get("payment_result", {})
-            return {
-                "type": "order_complete",
-                "message": f"Payment successful! Your order ID is {result.get('order_id')}.",
-                "order_id": result.get("order_id"),
-                "receipt_url": result.get("receipt_url"),
-            }
-
-        # 默认响应
-        return {
-            "type": "processing",
-            "message": "Processing your request...",
-            "current_step": current_step,
-        }
+        # 根据当前步骤构建响应
+        builder = _RESPONSE_BUILDERS.get(state.get("current_step", ""))
+        return builder(state) if builder else _build_default_response(state)
 
     def get_summary(self) -> dict:
         """获取会话摘要"""
@@ -415,15 +421,32 @@ class Session:
             "created_at": self.created_at.isoformat(),
             "last_activity": self.last_activity.isoformat(),
             "is_expired": self.is_expired,
-            "current_step": self.state.get("current_step") if self.state else None,
+            "current_step": self.current_step,
             "token_used": self.token_used,
             "token_budget": self.token_budget,
             "token_remaining": self.token_remaining,
-            "message_count": len(self.message_history),
+            "message_count": len(self._roles),
         }
 
+    def to_json(self) -> bytes:
+        """序列化会话为 JSON bytes（用于持久化，单次 orjson 编码）"""
+        return orjson.dumps(
+            self._persisted_fields(),
+            default=_default,
+            option=orjson.OPT_NON_STR_KEYS,
+        )
+
+    @classmethod
+    def from_json(cls, raw: bytes | str) -> "Session":
+        """从 JSON bytes 反序列化会话"""
+        return cls.from_dict(orjson.loads(raw))
+
     def to_dict(self) -> dict:
-        """序列化会话（用于持久化）"""
+        """序列化会话（JSON 兼容的 dict）"""
+        return orjson.loads(self.to_json())
+
+    def _persisted_fields(self) -> dict:
+        """需要持久化的字段（state 预先编码为 Fragment，直接拼入输出）"""
         return {
             "session_id": self.session_id,
             "user_id": self.user_id,
@@ -432,8 +455,12 @@ class Session:
             "timeout_minutes": self.timeout_minutes,
             "created_at": self.created_at.isoformat(),
             "last_activity": self.last_activity.isoformat(),
-            "message_history": self.message_history,
-            "state": _serialize_state(self.state) if self.state else None,
+            "message_history": {
+                "roles": self._roles,
+                "contents": self._contents,
+                "ts": self._ts,
+            },
+            "state": orjson.Fragment(_serialize_state(self.state)) if self.state else None,
         }
 
     @classmethod
@@ -447,62 +474,186 @@ class Session:
         )
         session.token_used = data.get("token_used", 0)
         session.created_at = datetime.fromisoformat(data["created_at"])
-        session.last_activity = datetime.fromisoformat(data["last_activity"])
-        session.message_history = data.get("message_history", [])
+        session.last_activity_ts = datetime.fromisoformat(data["last_activity"]).timestamp()
+        session.created_at_iso = session.created_at.strftime("%Y-%m-%dT%H:%M:%SZ")
+        session.last_activity_iso = session.last_activity.strftime("%Y-%m-%dT%H:%M:%SZ")
+        # 单调时钟不可持久化，按距上次活动的间隔换算
+        idle_seconds = time.time() - session.last_activity_ts
+        session.expiry_ts = time.monotonic() - idle_seconds + session.timeout_minutes * 60
+        history = data.get("message_history") or {}
+        if isinstance(history, list):
+            # 兼容旧格式：[{"role", "content", "timestamp"}, ...]
+            history = {
+                "roles": [m.get("role", "") for m in history],
+                "contents": [m.get("content", "") for m in history],
+                "ts": [m.get("timestamp") for m in history],
+            }
+        session._roles = list(history.get("roles", []))
+        session._contents = list(history.get("contents", []))
+        session._ts = list(history.get("ts", []))
 
         if data.get("state"):
             session.state = _deserialize_state(data["state"])
+            session.current_step = session.state.get("current_step")
 
         return session
 
 
-def _serialize_state(state: AgentState) -> dict:
-    """序列化 Agent 状态"""
-    result = {}
-    for key, value in state.items():
-        if key == "messages":
-            # 序列化消息
-            result[key] = [
-                {"type": type(m).__name__, "content": m.content}
-                for m in value
-            ]
-        elif hasattr(value, "model_dump"):
-            result[key] = value.model_dump()
-        elif isinstance(value, (dict, list, str, int, float, bool, type(None))):
-            result[key] = value
-        else:
-            result[key] = str(value)
-    return result
-
-
-def _deserialize_state(data: dict) -> AgentState:
+# ==============================================
+# Response Builders
+# ==============================================
+
+def _build_error_response(state: AgentState) -> dict:
+    """错误响应"""
+    return {
+        "type": "error",
+        "message": state.get("error"),
+        "error_code": state.get("error_code"),
+        "recoverable": state.get("recoverable", False),
+    }
+
+
+def _build_intent_response(state: AgentState) -> dict:
+    """意图解析完成"""
+    mission = state.get("mission", {})
+    return {
+        "type": "mission_parsed",
+        "message": f"I understand you're looking for products to ship to {mission.get('destination_country')}. Let me search for the best options.",
+        "mission": mission,
+    }
+
+
+def _build_candidate_response(state: AgentState) -> dict:
+    """候选召回完成"""
+    candidates = state.get("candidates", [])
+    return {
+        "type": "candidates_found",
+        "message": f"I found {len(candidates)} potential products. Let me verify the details.",
+        "count": len(candidates),
+    }
+
+
+def _build_verifier_response(state: AgentState) -> dict:
+    """核验完成"""
+    verified = state.get("verified_candidates", [])
+    return {
+        "type": "verification_complete",
+        "message": f"I've verified {len(verified)} products that meet your requirements.",
+        "count": len(verified),
+    }
+
+
+def _build_plan_response(state: AgentState) -> dict:
+    """方案生成完成"""
+    plans = state.get("plans", [])
+    return {
+        "type": "plans_ready",
+        "message": f"I've prepared {len(plans)} purchase options for you.",
+        "plans": plans,
+        "recommended": state.get("recommended_plan"),
+    }
+
+
+def _build_execution_response(state: AgentState) -> dict:
+    """草稿订单已创建"""
+    result = state.get("execution_result", {})
+    return {
+        "type": "draft_order_created",
+        "message": result.get("summary", "Draft order created successfully."),
+        "draft_order_id": result.get("draft_order_id"),
+        "payable_amount": result.get("payable_amount"),
+    }
+
+
+def _build_payment_ready_response(state: AgentState) -> dict:
+    """等待支付"""
+    payment = state.get("payment_ready", {})
+    return {
+        "type": "payment_ready",
+        "message": payment.get("summary", "Ready for payment."),
+        "payment_intent": payment.get("payment_intent"),
+        "payment_methods": payment.get("payment_methods"),
+    }
+
+
+def _build_payment_complete_response(state: AgentState) -> dict:
+    """支付完成"""
+    result = state.get("payment_result", {})
+    return {
+        "type": "order_complete",
+        "message": f"Payment successful! Your order ID is {result.get('order_id')}.",
+        "order_id": result.get("order_id"),
+        "receipt_url": result.get("receipt_url"),
+    }
+
+
+def _build_default_response(state: AgentState) -> dict:
+    """默认响应（未知步骤）"""
+    return {
+        "type": "processing",
+        "message": "Processing your request...",
+        "current_step": state.get("current_step", ""),
+    }
+
+
+# current_step -> 响应构建函数
+_RESPONSE_BUILDERS: dict[str, Callable[[AgentState], dict]] = {
+    STEP_INTENT_COMPLETE: _build_intent_response,
+    STEP_CANDIDATE_COMPLETE: _build_candidate_response,
+    STEP_VERIFIER_COMPLETE: _build_verifier_response,
+    STEP_PLAN_COMPLETE: _build_plan_response,
+    STEP_EXECUTION_COMPLETE: _build_execution_response,
+    STEP_PAYMENT_READY: _build_payment_ready_response,
+    STEP_PAYMENT_COMPLETE: _build_payment_complete_response,
+}
+
+
+def _default(obj: Any) -> Any:
+    """orjson 无法原生编码的对象（消息、Pydantic 模型等）"""
+    if isinstance(obj, BaseMessage):
+        return {"__msg__": type(obj).__name__, "c": obj.content}
+    if hasattr(obj, "__pydantic_serializer__"):
+        return obj.__pydantic_serializer__.to_python(obj, mode="json")
+    return str(obj)
+
+
+def _serialize_state(state: AgentState) -> bytes:
+    """序列化 Agent 状态（dict/list/标量由 orjson 原生处理，其余走 _default）"""
+    return orjson.dumps(state, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+# 消息类型名 -> 消息类
+_MESSAGE_TYPES: dict[str, type[BaseMessage]] = {
+    "HumanMessage": HumanMessage,
+    "AIMessage": AIMessage,
+    "SystemMessage": SystemMessage,
+}
+
+
+def _deserialize_message(m: dict) -> BaseMessage | None:
+    """反序列化单条消息（兼容旧格式 {"type", "content"}）"""
+    if "__msg__" in m:
+        message_cls = _MESSAGE_TYPES.get(m["__msg__"])
+        return message_cls(content=m["c"]) if message_cls else None
+    message_cls = _MESSAGE_TYPES.get(m.get("type"))
+    return message_cls(content=m["content"]) if message_cls else None
+
+
+def _deserialize_state(data: bytes | str | dict) -> AgentState:
     """反序列化 Agent 状态"""
-    from langchain_core.messages import AIMessage, HumanMessage
-
-    state = {}
-    for key, value in data.items():
-        if key == "messages":
-            messages = []
-            for m in value:
-                if m["type"] == "HumanMessage":
-                    messages.append(HumanMessage(content=m["content"]))
-                elif m["type"] == "AIMessage":
-                    messages.append(AIMessage(content=m["content"]))
-            state[key] = messages
-        else:
-            state[key] = value
-    return state
-
+    if not isinstance(data, dict):
+        data = orjson.loads(data)
 
-# 全局会话管理器实例
-_session_manager: SessionManager | None = None
+    state = dict(data)
+    if "messages" in state:
+        messages = (_deserialize_message(m) for m in state["messages"])
+        state["messages"] = [m for m in messages if m is not None]
+    return state
 
 
+@cache
 def get_session_manager() -> SessionManager:
-    """获取会话管理器实例"""
-    global _session_manager
-    if _session_manager is None:
-        _session_manager = SessionManager()
-    return _session_manager
+    """获取会话管理器实例（全局单例）"""
+    return SessionManager()
 
 
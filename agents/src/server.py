@@ -7,21 +7,37 @@ Agent HTTP Server
 - /api/v1/sessions - 会话管理
 """
 
+import asyncio
+import contextlib
+import time
 import uuid
+from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
-from datetime import datetime, UTC
+from typing import Annotated, Any
 
+import orjson
 import structlog
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from langchain_core.messages import HumanMessage
-from pydantic import BaseModel, Field
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from langchain_core.messages import AIMessage, HumanMessage
+from pydantic import BaseModel, Field, SkipValidation, TypeAdapter, ValidationError
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES, GZipMiddleware
 
 from .config import get_settings
 from .graph import AgentState, build_agent_graph
-from .orchestrator import SessionManager, get_session_manager
+from .graph.state import (
+    STEP_AWAITING_CLARIFICATION,
+    STEP_NO_RESULTS,
+    STEP_NO_VALID_CANDIDATES,
+    STEP_START,
+    STEP_WAITING_USER,
+)
+from .orchestrator import Session, SessionManager, get_session_manager
+from .orchestrator.session import utc_iso_now
+from .tools.base import close_http_client
 from .guided_chat import (
     GuidedChatRequest,
     GuidedChatResponse,
@@ -31,7 +47,6 @@ from .guided_chat import (
     process_guided_chat,
     reset_session,
     get_session_info,
-    StreamChunk,
     translate_mission_to_english,
 )
 
@@ -56,18 +71,31 @@ structlog.configure(
 
 logger = structlog.get_logger()
 
+_dumps = orjson.dumps
+
+
+class OrjsonResponse(JSONResponse):
+    """
+    orjson 编码的 JSON 响应
+
+    只用于直接返回 dict 的端点；带 response_model 的端点保持默认响应类，
+    新版 FastAPI 会经 pydantic-core 直接序列化为 bytes，设置自定义响应类反而会关闭该路径。
+    """
+
+    def render(self, content: Any) -> bytes:
+        return _dumps(content)
+
 # 全局变量
 settings = get_settings()
-session_manager: SessionManager | None = None
-agent_graph = None
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
-    global session_manager, agent_graph
+    global _start_monotonic
     
     logger.info("server.starting", port=settings.server_port)
+    _start_monotonic = time.monotonic()
     
     # 初始化会话管理器
     session_manager = get_session_manager()
@@ -75,6 +103,10 @@ async def lifespan(app: FastAPI):
     
     # 预构建 Agent Graph
     agent_graph = build_agent_graph()
+
+    # 挂到 app.state，由 require_ready 依赖统一取用
+    app.state.session_manager = session_manager
+    app.state.agent_graph = agent_graph
     
     logger.info("server.started")
     
@@ -82,8 +114,10 @@ async def lifespan(app: FastAPI):
     
     # 清理
     logger.info("server.stopping")
-    if session_manager:
-        await session_manager.stop()
+    app.state.agent_graph = None
+    app.state.session_manager = None
+    await session_manager.stop()
+    await close_http_client()
 
 
 # 创建 FastAPI 应用
@@ -104,6 +138,41 @@ app.add_middleware(
 )
 
 
+# 流式响应不压缩：GZip 会缓冲分块，导致 SSE token / NDJSON 行无法即时送达
+# （Starlette 默认已排除 text/event-stream，这里补上 NDJSON）
+# GZip 在 CORS 之后添加（位于更外层），压缩 /chat 等大 JSON 响应
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=1024,
+    exclude_content_types=(*DEFAULT_EXCLUDED_CONTENT_TYPES, "application/x-ndjson"),
+)
+
+
+# ========================================
+# 依赖
+# ========================================
+
+def require_session_manager(request: Request) -> SessionManager:
+    """启动完成前返回 503，避免每个端点各自判空"""
+    session_manager = getattr(request.app.state, "session_manager", None)
+    if session_manager is None:
+        raise HTTPException(status_code=503, detail="Server not ready")
+    return session_manager
+
+
+def require_ready(request: Request) -> tuple[SessionManager, Any]:
+    """同时需要会话管理器和 Agent Graph 的端点使用"""
+    session_manager = require_session_manager(request)
+    agent_graph = getattr(request.app.state, "agent_graph", None)
+    if agent_graph is None:
+        raise HTTPException(status_code=503, detail="Server not ready")
+    return session_manager, agent_graph
+
+
+SessionManagerDep = Annotated[SessionManager, Depends(require_session_manager)]
+ReadyDep = Annotated[tuple[SessionManager, Any], Depends(require_ready)]
+
+
 # ========================================
 # 请求/响应模型
 # ========================================
@@ -116,6 +185,31 @@ class ChatRequest(BaseModel):
     mission: dict | None = Field(None, description="已提取的 Mission（可选，若提供则跳过 Intent Agent）")
 
 
+# 直接从原始请求体校验 ChatRequest（pydantic-core 一次完成 JSON 解析和校验）
+_CHAT_REQ_ADAPTER = TypeAdapter(ChatRequest)
+
+# 请求体不再由 FastAPI 解析，需手动声明 OpenAPI schema
+_CHAT_REQUEST_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": ChatRequest.model_json_schema()}},
+    },
+}
+
+
+async def _parse_chat_request(http_request: Request) -> ChatRequest:
+    """解析 ChatRequest，校验失败时保持 FastAPI 默认的 422 响应格式"""
+    try:
+        return _CHAT_REQ_ADAPTER.validate_json(await http_request.body())
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)]
+        ) from e
+
+
+ChatRequestBody = Annotated[ChatRequest, Depends(_parse_chat_request)]
+
+
 class IntentReasoningModel(BaseModel):
     """
     Intent Agent 思维链（简化版）
@@ -143,19 +237,25 @@ def _extract_thinking_text(intent_reasoning_data) -> str:
     return ""
 
 
+# Agent 状态中的大块数据（候选/方案/订单）由服务端生成，跳过逐层校验，
+# 避免构建响应和 FastAPI 校验 response_model 时把每个 dict 再复制一遍
+AgentPayload = Annotated[dict, SkipValidation]
+AgentPayloadList = Annotated[list[dict], SkipValidation]
+
+
 class ChatResponse(BaseModel):
     """聊天响应"""
     session_id: str
     current_step: str
     message: str | None = None
-    mission: dict | None = None
+    mission: AgentPayload | None = None
     intent_reasoning: IntentReasoningModel | None = None  # Intent Agent 推理过程
-    candidates: list[dict] = []
-    verified_candidates: list[dict] = []
-    plans: list[dict] = []
-    selected_plan: dict | None = None
+    candidates: AgentPayloadList = []
+    verified_candidates: AgentPayloadList = []
+    plans: AgentPayloadList = []
+    selected_plan: AgentPayload | None = None
     draft_order_id: str | None = None
-    draft_order: dict | None = None
+    draft_order: AgentPayload | None = None
     evidence_snapshot_id: str | None = None
     needs_user_input: bool = False
     error: str | None = None
@@ -182,8 +282,40 @@ class SessionResponse(BaseModel):
     current_step: str | None = None
 
 
-# 启动时间
-_start_time = datetime.now(UTC)
+# 启动时间（单调时钟，lifespan 启动时重置）
+_start_monotonic = time.monotonic()
+
+
+# Agent 初始状态中与请求无关的字段（只放不可变值，列表在每次请求时新建）
+_INITIAL_STATE_TEMPLATE: dict = {
+    "intent_reasoning": None,  # Intent Agent 推理过程
+    "selected_plan": None,
+    "cart_id": None,
+    "draft_order_id": None,
+    "draft_order": None,
+    "evidence_snapshot_id": None,
+    "current_step": STEP_START,
+    "needs_user_input": False,
+    "needs_clarification": False,  # Intent Agent 请求澄清
+    "user_confirmation": None,
+    "error": None,
+    "error_code": None,
+    "recoverable": True,
+}
+
+
+def _build_initial_state(message: str, mission: dict | None, session: Session) -> AgentState:
+    """构建 Agent 初始状态（模板一次性 C 层合并 + 请求相关字段）"""
+    return _INITIAL_STATE_TEMPLATE | {
+        "messages": [HumanMessage(content=message)],
+        "mission": mission,  # 可能为 None 或已提取并翻译的 mission
+        "candidates": [],
+        "verified_candidates": [],
+        "plans": [],
+        "tool_call_records": [],
+        "token_budget": session.token_budget,
+        "token_used": session.token_used,
+    }
 
 
 # ========================================
@@ -195,13 +327,13 @@ async def health_check():
     """健康检查端点"""
     return HealthResponse(
         status="ok",
-        timestamp=datetime.now(UTC).isoformat() + "Z",
+        timestamp=utc_iso_now(),
         version="0.4.0",
-        uptime_seconds=(datetime.now(UTC) - _start_time).total_seconds(),
+        uptime_seconds=time.monotonic() - _start_monotonic,
     )
 
 
-@app.get("/")
+@app.get("/", response_class=OrjsonResponse)
 async def root():
     """根路径"""
     return {
@@ -212,8 +344,8 @@ async def root():
     }
 
 
-@app.post("/api/v1/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+@app.post("/api/v1/chat", response_model=ChatResponse, openapi_extra=_CHAT_REQUEST_OPENAPI)
+async def chat(request: ChatRequestBody, deps: ReadyDep):
     """
     运行 Agent 处理用户请求
     
@@ -222,10 +354,7 @@ async def chat(request: ChatRequest):
     2. 运行 Agent Graph
     3. 返回结果
     """
-    global session_manager, agent_graph
-    
-    if not session_manager or not agent_graph:
-        raise HTTPException(status_code=503, detail="Server not ready")
+    session_manager, agent_graph = deps
     
     logger.info("chat.request", message=request.message[:50], session_id=request.session_id)
     
@@ -256,29 +385,7 @@ async def chat(request: ChatRequest):
                 search_query_en=mission_to_use.get("search_query_en", "")[:50] if mission_to_use else "",
             )
         
-        initial_state: AgentState = {
-            "messages": [HumanMessage(content=request.message)],
-            "mission": mission_to_use,  # 可能为 None 或已提取并翻译的 mission
-            "intent_reasoning": None,  # Intent Agent 推理过程
-            "candidates": [],
-            "verified_candidates": [],
-            "plans": [],
-            "selected_plan": None,
-            "cart_id": None,
-            "draft_order_id": None,
-            "draft_order": None,
-            "evidence_snapshot_id": None,
-            "tool_call_records": [],
-            "token_budget": session.token_budget,
-            "token_used": session.token_used,
-            "current_step": "start",
-            "needs_user_input": False,
-            "needs_clarification": False,  # Intent Agent 请求澄清
-            "user_confirmation": None,
-            "error": None,
-            "error_code": None,
-            "recoverable": True,
-        }
+        initial_state = _build_initial_state(request.message, mission_to_use, session)
         
         # 运行 Agent
         config = {
@@ -288,7 +395,8 @@ async def chat(request: ChatRequest):
         result = await agent_graph.ainvoke(initial_state, config)
         
         # 更新会话
-        session.add_tokens(result.get("token_used", 0) - session.token_used)
+        session.set_tokens(result.get("token_used", session.token_used))
+        _invalidate_session_response(session.session_id)
         
         logger.info(
             "chat.complete",
@@ -312,7 +420,8 @@ async def chat(request: ChatRequest):
                 thinking=thinking_text,
             )
         
-        return ChatResponse(
+        # 响应数据全部由服务端生成，model_construct 跳过校验
+        return ChatResponse.model_construct(
             session_id=session.session_id,
             current_step=result.get("current_step", "unknown"),
             message=_extract_message(result),
@@ -346,21 +455,15 @@ class StreamEventModel(BaseModel):
     timestamp: int | None = None
 
 
-@app.post("/api/v1/chat/stream")
-async def chat_stream(request: ChatRequest):
+@app.post("/api/v1/chat/stream", openapi_extra=_CHAT_REQUEST_OPENAPI)
+async def chat_stream(request: ChatRequestBody, deps: ReadyDep):
     """
     流式运行 Agent 处理用户请求
     
     在每个 Agent 完成时立即返回事件，特别是 Intent Agent 的思维链。
     使用 Server-Sent Events (SSE) 格式。
     """
-    import json
-    import time
-    
-    global session_manager, agent_graph
-    
-    if not session_manager or not agent_graph:
-        raise HTTPException(status_code=503, detail="Server not ready")
+    session_manager, agent_graph = deps
     
     logger.info("chat_stream.request", message=request.message[:50], session_id=request.session_id)
     
@@ -375,7 +478,7 @@ async def chat_stream(request: ChatRequest):
                         data={"error_message": "Session not found", "error_code": "SESSION_NOT_FOUND"},
                         timestamp=int(time.time() * 1000),
                     )
-                    yield f"data: {json.dumps(error_event.model_dump())}\n\n"
+                    yield f"data: {_dumps(error_event.model_dump()).decode()}\n\n"
                     return
             else:
                 session = session_manager.create_session(
@@ -390,29 +493,7 @@ async def chat_stream(request: ChatRequest):
             if mission_to_use:
                 mission_to_use = await translate_mission_to_english(mission_to_use)
             
-            initial_state: AgentState = {
-                "messages": [HumanMessage(content=request.message)],
-                "mission": mission_to_use,
-                "intent_reasoning": None,
-                "candidates": [],
-                "verified_candidates": [],
-                "plans": [],
-                "selected_plan": None,
-                "cart_id": None,
-                "draft_order_id": None,
-                "draft_order": None,
-                "evidence_snapshot_id": None,
-                "tool_call_records": [],
-                "token_budget": session.token_budget,
-                "token_used": session.token_used,
-                "current_step": "start",
-                "needs_user_input": False,
-                "needs_clarification": False,
-                "user_confirmation": None,
-                "error": None,
-                "error_code": None,
-                "recoverable": True,
-            }
+            initial_state = _build_initial_state(request.message, mission_to_use, session)
             
             config = {
                 "configurable": {"thread_id": session.session_id},
@@ -421,7 +502,6 @@ async def chat_stream(request: ChatRequest):
             
             # 使用 astream_events 来获取实时事件
             # 同时收集最终结果（避免重复调用 ainvoke）
-            import asyncio
             intent_reasoning_sent = False
             final_result = None
             # 跟踪已发送的 tool_call_ids，用于去重（因为后续节点可能带上之前的 tool_calls）
@@ -447,7 +527,7 @@ async def chat_stream(request: ChatRequest):
                             agent=agent_id,
                             timestamp=int(time.time() * 1000),
                         )
-                        yield f"data: {json.dumps(start_event.model_dump())}\n\n"
+                        yield f"data: {_dumps(start_event.model_dump()).decode()}\n\n"
                         await asyncio.sleep(0)
                 
                 # 检测 Agent 节点完成
@@ -472,7 +552,7 @@ async def chat_stream(request: ChatRequest):
                                     data={"thinking": thinking_text},
                                     timestamp=int(time.time() * 1000),
                                 )
-                                yield f"data: {json.dumps(reasoning_event.model_dump())}\n\n"
+                                yield f"data: {_dumps(reasoning_event.model_dump()).decode()}\n\n"
                                 await asyncio.sleep(0)
                                 intent_reasoning_sent = True
                     
@@ -511,11 +591,11 @@ async def chat_stream(request: ChatRequest):
                                     data={
                                         "tool_id": tool_id,
                                         "tool_name": tool_name,
-                                        "tool_input": json.dumps(request_data, ensure_ascii=False),
+                                        "tool_input": _dumps(request_data).decode(),
                                     },
                                     timestamp=int(time.time() * 1000),
                                 )
-                                yield f"data: {json.dumps(tool_call_event.model_dump())}\n\n"
+                                yield f"data: {_dumps(tool_call_event.model_dump()).decode()}\n\n"
                                 await asyncio.sleep(0)
                                 
                                 # 发送 tool_result 事件
@@ -525,13 +605,13 @@ async def chat_stream(request: ChatRequest):
                                     agent=agent_id,
                                     data={
                                         "tool_id": tool_id,
-                                        "tool_output": json.dumps(response_summary, ensure_ascii=False),
+                                        "tool_output": _dumps(response_summary).decode(),
                                         "tool_status": "success" if response_summary.get("ok", True) else "error",
                                         "tool_duration": 0,  # 目前不追踪耗时
                                     },
                                     timestamp=int(time.time() * 1000),
                                 )
-                                yield f"data: {json.dumps(tool_result_event.model_dump())}\n\n"
+                                yield f"data: {_dumps(tool_result_event.model_dump()).decode()}\n\n"
                                 await asyncio.sleep(0)
                         
                         complete_event = StreamEventModel(
@@ -540,7 +620,7 @@ async def chat_stream(request: ChatRequest):
                             data={"agent_tokens": output.get("token_used", 0)},
                             timestamp=int(time.time() * 1000),
                         )
-                        yield f"data: {json.dumps(complete_event.model_dump())}\n\n"
+                        yield f"data: {_dumps(complete_event.model_dump()).decode()}\n\n"
                         await asyncio.sleep(0)
                     
                     # 捕获整个 Graph 完成时的最终结果
@@ -554,7 +634,8 @@ async def chat_stream(request: ChatRequest):
             result = final_result
             
             # 更新会话
-            session.add_tokens(result.get("token_used", 0) - session.token_used)
+            session.set_tokens(result.get("token_used", session.token_used))
+            _invalidate_session_response(session.session_id)
             
             # 构建最终响应
             intent_reasoning_data = result.get("intent_reasoning")
@@ -565,7 +646,7 @@ async def chat_stream(request: ChatRequest):
                     thinking=final_thinking_text,
                 )
             
-            final_response = ChatResponse(
+            final_response = ChatResponse.model_construct(
                 session_id=session.session_id,
                 current_step=result.get("current_step", "unknown"),
                 message=_extract_message(result),
@@ -593,7 +674,7 @@ async def chat_stream(request: ChatRequest):
                 },
                 timestamp=int(time.time() * 1000),
             )
-            yield f"data: {json.dumps(done_event.model_dump())}\n\n"
+            yield f"data: {_dumps(done_event.model_dump()).decode()}\n\n"
             
             logger.info(
                 "chat_stream.complete",
@@ -608,10 +689,10 @@ async def chat_stream(request: ChatRequest):
                 data={"error_message": str(e), "error_code": "INTERNAL_ERROR"},
                 timestamp=int(time.time() * 1000),
             )
-            yield f"data: {json.dumps(error_event.model_dump())}\n\n"
+            yield f"data: {_dumps(error_event.model_dump()).decode()}\n\n"
     
     return StreamingResponse(
-        event_generator(),
+        _with_keepalive(event_generator()),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -621,37 +702,55 @@ async def chat_stream(request: ChatRequest):
     )
 
 
+# 会话详情微缓存：session_id -> (写入时间, 已编码的 JSON)
+# 前端轮询进度时 500ms 内的重复请求直接返回缓存字节
+_SESSION_RESPONSE_TTL = 0.5
+_SESSION_RESPONSE_CACHE_MAX = 10000
+_session_response_cache: dict[str, tuple[float, bytes]] = {}
+
+
+def _session_payload(s: Session) -> dict:
+    """会话信息（字段与 SessionResponse 一致）"""
+    return {
+        "session_id": s.session_id,
+        "user_id": s.user_id,
+        "created_at": s.created_at_iso,
+        "last_active": s.last_activity_iso,
+        "token_used": s.token_used,
+        "token_budget": s.token_budget,
+        "current_step": s.current_step,
+    }
+
+
+def _invalidate_session_response(session_id: str):
+    """会话变更或删除后丢弃微缓存"""
+    _session_response_cache.pop(session_id, None)
+
+
 @app.get("/api/v1/sessions/{session_id}", response_model=SessionResponse)
-async def get_session_endpoint(session_id: str):
+async def get_session_endpoint(session_id: str, session_manager: SessionManagerDep):
     """获取会话信息"""
-    global session_manager
-    
-    if not session_manager:
-        raise HTTPException(status_code=503, detail="Server not ready")
-    
+    now = time.monotonic()
+    entry = _session_response_cache.get(session_id)
+    if entry and now - entry[0] < _SESSION_RESPONSE_TTL:
+        return Response(entry[1], media_type="application/json")
+
     session = session_manager.get_session(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    
-    return SessionResponse(
-        session_id=session.session_id,
-        user_id=session.user_id,
-        created_at=session.created_at.isoformat() + "Z",
-        last_active=session.last_activity.isoformat() + "Z",
-        token_used=session.token_used,
-        token_budget=session.token_budget,
-        current_step=session.state.get("current_step") if session.state else None,
-    )
+
+    payload = _dumps(_session_payload(session))
+    if session_id not in _session_response_cache and len(_session_response_cache) >= _SESSION_RESPONSE_CACHE_MAX:
+        # 按插入顺序淘汰最早的条目
+        del _session_response_cache[next(iter(_session_response_cache))]
+    _session_response_cache[session_id] = (now, payload)
+    return Response(payload, media_type="application/json")
 
 
-@app.delete("/api/v1/sessions/{session_id}")
-async def delete_session_endpoint(session_id: str):
+@app.delete("/api/v1/sessions/{session_id}", response_class=OrjsonResponse)
+async def delete_session_endpoint(session_id: str, session_manager: SessionManagerDep):
     """删除会话"""
-    global session_manager
-    
-    if not session_manager:
-        raise HTTPException(status_code=503, detail="Server not ready")
-    
+    _invalidate_session_response(session_id)
     success = session_manager.delete_session(session_id)
     if not success:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -660,23 +759,21 @@ async def delete_session_endpoint(session_id: str):
 
 
 @app.post("/api/v1/sessions", response_model=SessionResponse)
-async def create_session_endpoint(user_id: str = "anonymous"):
+async def create_session_endpoint(
+    session_manager: SessionManagerDep,
+    user_id: str = "anonymous",
+):
     """创建新会话"""
-    global session_manager
-    
-    if not session_manager:
-        raise HTTPException(status_code=503, detail="Server not ready")
-    
     session = session_manager.create_session(
         user_id=user_id,
         token_budget=settings.token_budget_total,
     )
     
-    return SessionResponse(
+    return SessionResponse.model_construct(
         session_id=session.session_id,
         user_id=session.user_id,
-        created_at=session.created_at.isoformat() + "Z",
-        last_active=session.last_activity.isoformat() + "Z",
+        created_at=session.created_at_iso,
+        last_active=session.last_activity_iso,
         token_used=session.token_used,
         token_budget=session.token_budget,
         current_step=None,
@@ -684,29 +781,77 @@ async def create_session_endpoint(user_id: str = "anonymous"):
 
 
 @app.get("/api/v1/sessions", response_model=list[SessionResponse])
-async def list_sessions(user_id: str | None = None):
-    """列出会话"""
-    global session_manager
-    
-    if not session_manager:
-        raise HTTPException(status_code=503, detail="Server not ready")
-    
+async def list_sessions(
+    session_manager: SessionManagerDep,
+    user_id: str | None = None,
+    stream: bool = False,
+):
+    """
+    列出会话
+
+    stream=true 时以 NDJSON 逐行返回，会话数很多时内存占用恒定。
+    """
     sessions = session_manager.list_sessions(user_id=user_id)
+
+    if stream:
+        return StreamingResponse(
+            _ndjson_sessions(sessions),
+            media_type="application/x-ndjson",
+        )
     
     return [
-        SessionResponse(
+        SessionResponse.model_construct(
             session_id=s.session_id,
             user_id=s.user_id,
-            created_at=s.created_at.isoformat() + "Z",
-            last_active=s.last_activity.isoformat() + "Z",
+            created_at=s.created_at_iso,
+            last_active=s.last_activity_iso,
             token_used=s.token_used,
             token_budget=s.token_budget,
-            current_step=s.state.get("current_step") if s.state else None,
+            current_step=s.current_step,
         )
         for s in sessions
     ]
 
 
+async def _ndjson_sessions(sessions: list[Session]) -> AsyncIterator[bytes]:
+    """逐个会话编码为 NDJSON 行（字段与 SessionResponse 一致）"""
+    for s in sessions:
+        yield _dumps(_session_payload(s)) + b"\n"
+
+
+# SSE 保活：空闲超过该间隔时发送注释行，避免 nginx/CDN 的空闲超时断开连接
+_SSE_PING = ": ping\n\n"
+_SSE_PING_INTERVAL = 15.0
+
+
+async def _with_keepalive(
+    events: AsyncIterator[str],
+    interval: float = _SSE_PING_INTERVAL,
+) -> AsyncIterator[str]:
+    """包装 SSE 生成器，在 LLM 思考等空闲期间插入 ping 注释"""
+    iterator = events.__aiter__()
+    pending = asyncio.ensure_future(iterator.__anext__())
+    try:
+        while True:
+            # 用 asyncio.wait 而不是 wait_for：超时不能取消正在等待的事件
+            done, _ = await asyncio.wait({pending}, timeout=interval)
+            if not done:
+                yield _SSE_PING
+                continue
+            try:
+                item = pending.result()
+            except StopAsyncIteration:
+                return
+            yield item
+            pending = asyncio.ensure_future(iterator.__anext__())
+    finally:
+        # 客户端断开时取消上游生成器，尽快释放会话
+        if not pending.done():
+            pending.cancel()
+            with contextlib.suppress(asyncio.CancelledError, StopAsyncIteration):
+                await pending
+
+
 # ========================================
 # Guided Chat Endpoints
 # ========================================
@@ -743,6 +888,10 @@ async def guided_chat(request: GuidedChatRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# guided-chat 错误事件（与 StreamChunk(type="error").model_dump() 字段一致）
+_ERROR_SSE_TEMPLATE = 'data: {{"type":"error","content":{msg},"data":null}}\n\n'
+
+
 @app.post("/api/v1/guided-chat/stream")
 async def guided_chat_stream(request: GuidedChatRequest):
     """
@@ -750,24 +899,20 @@ async def guided_chat_stream(request: GuidedChatRequest):
     
     Returns Server-Sent Events (SSE) for real-time response streaming.
     """
-    import json
-    
     async def event_generator():
         session = get_or_create_session(request.session_id)
         
         try:
             async for chunk in stream_guided_chat(session, request.message, request.images):
-                # Format as SSE
-                data = chunk.model_dump()
-                yield f"data: {json.dumps(data)}\n\n"
+                # Format as SSE（直接由 pydantic-core 编码，不经过中间 dict）
+                yield f"data: {chunk.model_dump_json()}\n\n"
                 
         except Exception as e:
             logger.error("guided_chat_stream.error", error=str(e))
-            error_chunk = StreamChunk(type="error", content=str(e))
-            yield f"data: {json.dumps(error_chunk.model_dump())}\n\n"
+            yield _ERROR_SSE_TEMPLATE.format(msg=_dumps(str(e)).decode())
     
     return StreamingResponse(
-        event_generator(),
+        _with_keepalive(event_generator()),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -777,7 +922,7 @@ async def guided_chat_stream(request: GuidedChatRequest):
     )
 
 
-@app.get("/api/v1/guided-chat/sessions/{session_id}")
+@app.get("/api/v1/guided-chat/sessions/{session_id}", response_class=OrjsonResponse)
 async def get_guided_chat_session(session_id: str):
     """Get guided chat session info"""
     session = get_session_info(session_id)
@@ -805,7 +950,7 @@ async def get_guided_chat_session(session_id: str):
     }
 
 
-@app.delete("/api/v1/guided-chat/sessions/{session_id}")
+@app.delete("/api/v1/guided-chat/sessions/{session_id}", response_class=OrjsonResponse)
 async def delete_guided_chat_session(session_id: str):
     """Reset/delete a guided chat session"""
     success = reset_session(session_id)
@@ -815,41 +960,45 @@ async def delete_guided_chat_session(session_id: str):
     return {"status": "deleted", "session_id": session_id}
 
 
+# 需要用户输入但没有 AI 消息时，按当前步骤返回的默认消息
+_DEFAULT_STEP_MSG: dict[str, str] = {
+    STEP_NO_RESULTS: "I couldn't find any products matching your request. Could you try a different search term or be more specific about what you're looking for?",
+    STEP_NO_VALID_CANDIDATES: "I found some products but none of them meet all your requirements. Would you like to adjust your criteria (budget, shipping destination, etc.)?",
+    STEP_WAITING_USER: "I need some additional information to proceed. Could you please clarify your requirements?",
+    STEP_AWAITING_CLARIFICATION: "I need some clarification about your request. Could you please provide more details?",
+}
+_WAITING_WITH_PLANS = "I've found several options for you. Please select a plan to proceed with your purchase."
+_GENERIC_MSG = "I need your input to continue. Please provide the requested information."
+
+
 def _extract_message(result: dict) -> str | None:
     """从结果中提取最后一条 AI 消息，或生成默认消息"""
+    content = result.get("last_ai_message")
+    if content is not None:
+        return content
+
+    # 兼容未写入 last_ai_message 的状态：反向扫描消息历史
     messages = result.get("messages", [])
-    for msg in reversed(messages):
-        if hasattr(msg, "content") and hasattr(msg, "type") and msg.type == "ai":
-            return msg.content
-    
+    content = next(
+        (m.content for m in reversed(messages) if isinstance(m, AIMessage)),
+        None,
+    )
+    if content is not None:
+        return content
+
     # 如果没有 AI 消息但需要用户输入，根据当前步骤生成默认消息
     if result.get("needs_user_input"):
         current_step = result.get("current_step", "")
-        
-        if current_step == "no_results":
-            return "I couldn't find any products matching your request. Could you try a different search term or be more specific about what you're looking for?"
-        
-        if current_step == "no_valid_candidates":
-            return "I found some products but none of them meet all your requirements. Would you like to adjust your criteria (budget, shipping destination, etc.)?"
-        
-        if current_step == "waiting_user":
-            # 检查是否有 plans 需要用户选择
-            if result.get("plans"):
-                return "I've found several options for you. Please select a plan to proceed with your purchase."
-            return "I need some additional information to proceed. Could you please clarify your requirements?"
-        
-        if current_step == "awaiting_clarification":
-            return "I need some clarification about your request. Could you please provide more details?"
-        
-        # 默认消息
-        return "I need your input to continue. Please provide the requested information."
-    
+        # 等待用户选择方案
+        if current_step == STEP_WAITING_USER and result.get("plans"):
+            return _WAITING_WITH_PLANS
+        return _DEFAULT_STEP_MSG.get(current_step, _GENERIC_MSG)
+
     return None
 
 
 def main():
     """启动服务器"""
-    settings = get_settings()
     logger.info("server.main", host="0.0.0.0", port=settings.server_port)
     
     uvicorn.run(
@@ -858,6 +1007,14 @@ def main():
         port=settings.server_port,
         reload=settings.debug,
         log_level="info",
+        # uvicorn[standard] 已安装 uvloop + httptools，"auto" 会优先选用它们
+        loop="auto",
+        http="auto",
+        # 请求日志已由 structlog 在各端点记录
+        access_log=False,
+        limit_concurrency=settings.server_max_concurrency,
+        # 大于常见 LB/代理的 60s 空闲超时，配合 SSE ping 保持长连接
+        timeout_keep_alive=75,
     )
 
 
@@ -13,6 +13,7 @@ from .catalog import (
     get_kg_relations,
     get_merchant,
     get_offer_card,
+    get_offer_cards_batch,
     search_offers,
 )
 from .checkout import add_to_cart, compute_total, create_cart, create_draft_order, get_draft_order_summary
@@ -32,6 +33,7 @@ __all__ = [
     # Catalog (Enhanced with KG)
     "search_offers",
     "get_offer_card",
+    "get_offer_cards_batch",
     "get_brand",
     "get_merchant",
     "get_category_tree",
@@ -2,31 +2,201 @@
 Base tool utilities.
 """
 
+import asyncio
+import functools
 import hashlib
+import importlib.util
+import inspect
 import os
+import time
 import uuid
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
 from datetime import datetime
 from typing import Any
 
 import httpx
+import orjson
 import structlog
 
 from ..config import get_settings
 
+try:
+    import msgpack
+except ImportError:  # 可选依赖：pip install ".[binary]"
+    msgpack = None
+
 logger = structlog.get_logger()
 
+# 请求体 / 响应 / 缓存统一用 orjson 编解码（返回 bytes，直接交给 httpx 和 Redis）
+_dumps = orjson.dumps
+_loads = orjson.loads
+_HASH_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+_JSON_HEADERS = {"content-type": "application/json"}
+# MCP_BINARY 开启时优先请求 msgpack 响应，服务端不支持时仍返回 JSON
+_BINARY_HEADERS = {**_JSON_HEADERS, "accept": "application/msgpack, application/json;q=0.9"}
+_MSGPACK_CONTENT_TYPE = "application/msgpack"
+
 # HTTP client 单例
 _http_client: httpx.AsyncClient | None = None
 
+# 并发扇出（gather / batch loader）共享连接池，避免每次调用重新握手
+_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+# HTTP/2 需要 h2（httpx[http2]），仅在 https 上通过 ALPN 协商，http 网关仍走 HTTP/1.1 keep-alive
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
 
 async def get_http_client() -> httpx.AsyncClient:
-    """获取 HTTP client 单例"""
+    """获取 HTTP client 单例（首次调用时在当前事件循环中创建）"""
     global _http_client
     if _http_client is None:
-        _http_client = httpx.AsyncClient(timeout=30.0)
+        _http_client = httpx.AsyncClient(
+            http2=_HTTP2_AVAILABLE,
+            limits=_HTTP_LIMITS,
+            timeout=float(get_settings().request_timeout),
+        )
     return _http_client
 
 
+async def close_http_client() -> None:
+    """关闭 HTTP client 并释放连接池（服务关闭时调用）"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+# ============================================================
+# Redis 缓存（读多写少、按 ID 查询的工具结果）
+# ============================================================
+
+_redis_client = None
+_redis_disabled = False
+
+
+async def get_redis_client():
+    """获取 Redis client 单例；未配置 REDIS_URL 或未安装 redis 时返回 None"""
+    global _redis_client, _redis_disabled
+    if _redis_client is None and not _redis_disabled:
+        settings = get_settings()
+        if not settings.redis_url:
+            _redis_disabled = True
+            return None
+        try:
+            from redis import asyncio as redis_asyncio
+        except ImportError:
+            logger.warning("tool.cache.redis_not_installed")
+            _redis_disabled = True
+            return None
+        # 缓存只是加速层，Redis 不可用时要快速失败回源
+        _redis_client = redis_asyncio.from_url(
+            settings.redis_url,
+            socket_timeout=0.5,
+            socket_connect_timeout=0.5,
+        )
+    return _redis_client
+
+
+async def cache_get(key: str) -> dict[str, Any] | None:
+    """读取缓存的工具响应，未命中或 Redis 出错时返回 None"""
+    client = await get_redis_client()
+    if client is None:
+        return None
+    try:
+        raw = await client.get(key)
+    except Exception as e:
+        logger.warning("tool.cache.get_failed", key=key, error=str(e))
+        return None
+    return _loads(raw) if raw else None
+
+
+async def cache_set(key: str, value: dict[str, Any], ttl_seconds: int) -> None:
+    """写入工具响应缓存（失败只记录日志）"""
+    client = await get_redis_client()
+    if client is None:
+        return
+    try:
+        await client.setex(key, ttl_seconds, _dumps(value))
+    except Exception as e:
+        logger.warning("tool.cache.set_failed", key=key, error=str(e))
+
+
+# ============================================================
+# 请求合并（singleflight）：同一 key 的并发回源只执行一次
+# ============================================================
+
+_inflight: dict[Hashable, asyncio.Future] = {}
+
+
+async def singleflight(
+    inflight: dict[Hashable, asyncio.Future],
+    key: Hashable,
+    fetch: Callable[[], Awaitable[dict[str, Any]]],
+) -> dict[str, Any]:
+    """
+    key 已有进行中的请求时等待其结果，否则执行 fetch 并把结果分享给并发的重复调用方
+
+    首个调用方被取消时，等待中的调用方也会收到 CancelledError；
+    等待方被取消只影响它自己（shield 保护共享 future），不影响首个调用方和其他等待方。
+    """
+    future = inflight.get(key)
+    if future is not None:
+        return await asyncio.shield(future)
+
+    future = asyncio.get_running_loop().create_future()
+    inflight[key] = future
+    try:
+        result = await fetch()
+    except BaseException as e:
+        if not future.done():
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # 没有等待者时避免 "exception was never retrieved" 警告
+                future.exception()
+        raise
+    else:
+        if not future.done():
+            future.set_result(result)
+        return result
+    finally:
+        del inflight[key]
+
+
+async def cached_call_tool(
+    cache_key: str,
+    ttl_seconds: int,
+    mcp_server: str,
+    tool_name: str,
+    params: dict[str, Any],
+    user_id: str | None = None,
+) -> dict[str, Any]:
+    """
+    带读穿缓存的 call_tool
+
+    只缓存成功响应；仅用于与 user_id 无关的只读查询。
+    未命中时同一 cache_key 的并发请求合并为一次 RPC。
+    """
+    cached = await cache_get(cache_key)
+    if cached is not None:
+        logger.debug("tool.cache.hit", tool=tool_name, key=cache_key)
+        return cached
+
+    async def fetch() -> dict[str, Any]:
+        result = await call_tool(
+            mcp_server=mcp_server,
+            tool_name=tool_name,
+            params=params,
+            user_id=user_id,
+        )
+        if result.get("ok"):
+            await cache_set(cache_key, result, ttl_seconds)
+        return result
+
+    return await singleflight(_inflight, cache_key, fetch)
+
+
 def create_request_envelope(
     actor_type: str = "agent",
     actor_id: str | None = None,
@@ -70,9 +240,15 @@ def create_request_envelope(
 
 def hash_response(response: dict) -> str:
     """计算响应 hash（用于 Evidence）"""
-    import json
-    content = json.dumps(response, sort_keys=True)
-    return f"sha256:{hashlib.sha256(content.encode()).hexdigest()[:16]}"
+    content = _dumps(response, option=_HASH_OPTIONS)
+    return f"sha256:{hashlib.sha256(content).hexdigest()[:16]}"
+
+
+def _decode_response(response: httpx.Response) -> dict[str, Any]:
+    """按响应 content-type 解码（msgpack 或 JSON）"""
+    if msgpack is not None and response.headers.get("content-type", "").startswith(_MSGPACK_CONTENT_TYPE):
+        return msgpack.unpackb(response.content, raw=False)
+    return _loads(response.content)
 
 
 async def call_tool(
@@ -121,7 +297,12 @@ async def call_tool(
     )
 
     try:
-        response = await client.post(url, json=request_body)
+        binary = settings.mcp_binary and msgpack is not None
+        response = await client.post(
+            url,
+            content=_dumps(request_body),
+            headers=_BINARY_HEADERS if binary else _JSON_HEADERS,
+        )
         
         # Log response for debugging if error
         if response.status_code >= 400:
@@ -134,7 +315,7 @@ async def call_tool(
             )
         
         response.raise_for_status()
-        result = response.json()
+        result = _decode_response(response)
 
         # 添加 evidence 信息
         if "evidence" not in result:
@@ -208,3 +389,95 @@ def mock_response(
         },
     }
 
+
+# ============================================================
+# 进程内 TTL 缓存（规则版本、风险标签等几乎不变的查询）
+# ============================================================
+
+def _freeze(value: Any) -> Any:
+    """把参数递归转换为可哈希的缓存键（嵌套的 list / dict 同样处理）"""
+    if isinstance(value, list | tuple):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, set | frozenset):
+        return tuple(sorted(value))
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def async_ttl_cache(
+    maxsize: int = 256,
+    ttl: float = 300.0,
+    ignore: tuple[str, ...] = ("user_id",),
+    error_ttl: float = 0.0,
+) -> Callable[[Callable[..., Awaitable[dict[str, Any]]]], Callable[..., Awaitable[dict[str, Any]]]]:
+    """
+    异步工具函数的进程内 LRU + TTL 缓存
+
+    - 成功响应缓存 ttl 秒；失败响应默认不缓存，error_ttl > 0 时短暂缓存（避免每次调用都重试失败的查询）
+    - MOCK_MODE 下不缓存
+    - ignore 中的参数不参与缓存键（被装饰的查询结果与用户无关）
+    - 未命中时相同缓存键的并发调用合并为一次回源
+    - 返回的是共享对象，调用方不得修改
+    """
+    def decorator(
+        func: Callable[..., Awaitable[dict[str, Any]]],
+    ) -> Callable[..., Awaitable[dict[str, Any]]]:
+        signature = inspect.signature(func)
+        cache: OrderedDict[tuple, tuple[float, dict[str, Any]]] = OrderedDict()
+        inflight: dict[Hashable, asyncio.Future] = {}
+
+        def make_key(args: tuple, kwargs: dict[str, Any]) -> tuple:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return tuple(
+                _freeze(value) for name, value in bound.arguments.items() if name not in ignore
+            )
+
+        def lookup(key: tuple) -> dict[str, Any] | None:
+            entry = cache.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                cache.move_to_end(key)
+                return entry[1]
+            return None
+
+        def store(key: tuple, result: dict[str, Any]) -> None:
+            expires_in = ttl if result.get("ok") else error_ttl
+            if expires_in > 0:
+                cache[key] = (time.monotonic() + expires_in, result)
+                cache.move_to_end(key)
+                if len(cache) > maxsize:
+                    cache.popitem(last=False)
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> dict[str, Any]:
+            if MOCK_MODE:
+                return await func(*args, **kwargs)
+
+            key = make_key(args, kwargs)
+            cached = lookup(key)
+            if cached is not None:
+                return cached
+
+            async def fetch() -> dict[str, Any]:
+                result = await func(*args, **kwargs)
+                store(key, result)
+                return result
+
+            return await singleflight(inflight, key, fetch)
+
+        def cache_peek(*args: Any, **kwargs: Any) -> dict[str, Any] | None:
+            """只读缓存，不回源（供批量调用方先过滤已缓存的键）"""
+            return None if MOCK_MODE else lookup(make_key(args, kwargs))
+
+        def cache_put(result: dict[str, Any], *args: Any, **kwargs: Any) -> None:
+            """写入批量调用得到的单项结果（与回源结果同样按 ttl / error_ttl 缓存）"""
+            if not MOCK_MODE:
+                store(make_key(args, kwargs), result)
+
+        wrapper.cache_clear = cache.clear  # type: ignore[attr-defined]
+        wrapper.cache_peek = cache_peek  # type: ignore[attr-defined]
+        wrapper.cache_put = cache_put  # type: ignore[attr-defined]
+        return wrapper
+
+    return decorator
@@ -0,0 +1,71 @@
+"""
+Batch loader - 合并并发的单 ID 查询（DataLoader 模式）
+
+同一轮事件循环内发起的 load() 调用会被收集起来，下一轮统一交给 batch_fn 一次处理；
+相同 key 在 loader 生命周期内只查询一次。loader 应按请求创建，不跨请求复用。
+"""
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+import structlog
+
+logger = structlog.get_logger()
+
+BatchFn = Callable[[list[Hashable]], Awaitable[dict[Hashable, Any]]]
+
+
+class BatchLoader:
+    """请求合并器：batch_fn 接收去重后的 key 列表，返回 {key: value}"""
+
+    def __init__(self, batch_fn: BatchFn, name: str = "batch_loader"):
+        self._batch_fn = batch_fn
+        self._name = name
+        # 已发起（或已完成）的查询，按 key 去重
+        self._futures: dict[Hashable, asyncio.Future] = {}
+        # 等待下一次 flush 的 key
+        self._queue: list[Hashable] = []
+        self._flush_scheduled = False
+        # 持有正在执行的 flush 任务，避免被 GC 回收
+        self._tasks: set[asyncio.Task] = set()
+
+    def load(self, key: Hashable) -> asyncio.Future:
+        """登记一个 key，返回其结果的 Future"""
+        future = self._futures.get(key)
+        if future is not None:
+            return future
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._futures[key] = future
+        self._queue.append(key)
+        if not self._flush_scheduled:
+            # call_soon 排在本轮已就绪的其他任务之后，同一批 gather 的 load 都能被收集
+            self._flush_scheduled = True
+            loop.call_soon(self._dispatch)
+        return future
+
+    def _dispatch(self):
+        keys = self._queue
+        self._queue = []
+        self._flush_scheduled = False
+        task = asyncio.ensure_future(self._flush(keys))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, keys: list[Hashable]):
+        logger.debug(f"{self._name}.flush", batch_size=len(keys))
+        try:
+            results = await self._batch_fn(keys)
+        except Exception as e:
+            for key in keys:
+                future = self._futures.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for key in keys:
+            future = self._futures[key]
+            if not future.done():
+                future.set_result(results.get(key))
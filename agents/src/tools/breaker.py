@@ -0,0 +1,55 @@
+"""
+Circuit breaker - 下游工具故障时快速失败
+
+连续失败达到阈值后进入打开状态，冷却期内的调用直接返回失败响应，不再等待超时；
+冷却期结束后放行请求试探，成功即恢复，失败则重新计时。
+"""
+
+import time
+
+import structlog
+
+logger = structlog.get_logger()
+
+
+class CircuitBreaker:
+    """按下游服务划分的熔断器（进程内，单事件循环使用，无需加锁）"""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_after: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self._failures = 0
+        self._opened_at: float | None = None
+
+    @property
+    def is_open(self) -> bool:
+        """是否处于冷却期（冷却期结束后返回 False，放行试探请求）"""
+        if self._opened_at is None:
+            return False
+        return time.monotonic() - self._opened_at < self.reset_after
+
+    def record(self, ok: bool) -> None:
+        """记录一次调用结果"""
+        if ok:
+            if self._opened_at is not None:
+                logger.info("circuit_breaker.closed", breaker=self.name)
+            self._failures = 0
+            self._opened_at = None
+            return
+
+        self._failures += 1
+        if self._failures >= self.failure_threshold:
+            if self._opened_at is None or not self.is_open:
+                logger.warning("circuit_breaker.opened", breaker=self.name, failures=self._failures)
+            self._opened_at = time.monotonic()
+
+    def open_response(self) -> dict:
+        """熔断时返回的标准失败响应"""
+        return {
+            "ok": False,
+            "error": {
+                "code": "CIRCUIT_OPEN",
+                "message": f"{self.name} temporarily unavailable (circuit open)",
+            },
+        }
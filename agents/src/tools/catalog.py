@@ -3,9 +3,90 @@ Catalog tools - 商品搜索与检索
 Enhanced with KG support and bilingual search
 """
 
+import asyncio
+import copy
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
 from typing import Any
 
-from .base import MOCK_MODE, call_tool, mock_response
+from .base import (
+    MOCK_MODE,
+    async_ttl_cache,
+    cache_get,
+    cache_set,
+    cached_call_tool,
+    call_tool,
+    mock_response,
+)
+from .batch import BatchLoader
+
+# Redis 缓存 TTL（秒）：商家风险等级变化较快，类目树几乎不变
+OFFER_CARD_CACHE_TTL = 300
+BRAND_CACHE_TTL = 3600
+MERCHANT_CACHE_TTL = 60
+CATEGORY_TREE_CACHE_TTL = 6 * 3600
+KG_RELATIONS_CACHE_TTL = 600
+# Tool Gateway get_kg_relations 单次最多返回的关系数
+KG_RELATIONS_LIMIT = 100
+# Tool Gateway get_offer_cards_batch 单次最多接受的 offer_id 数
+OFFER_CARD_BATCH_LIMIT = 50
+
+# Mock AROC 中与 offer_id 无关的部分（导入时构建一次，调用方只读）
+_AROC_MOCK_TEMPLATE: dict[str, Any] = {
+    "aroc_version": "0.2",
+    "merchant_id": "m_001",
+    "brand": {
+        "name": "TestBrand",
+        "normalized_id": "brand_test",
+        "confidence": "high",
+    },
+    "merchant": {
+        "id": "m_001",
+        "name": "Test Store",
+        "rating": 4.5,
+        "verified": True,
+        "risk_level": "normal",
+    },
+    "category": {
+        "cat_id": "c_electronics",
+        "path": ["Electronics", "Gadgets"],
+        "full_path": "Electronics > Gadgets",
+    },
+    "attributes": [
+        {
+            "attr_id": "color",
+            "name": {"en": "Color", "zh": "颜色"},
+            "value": {"type": "enum", "normalized": "Black"},
+            "confidence": 0.95,
+        },
+    ],
+    "policies": {
+        "return_policy_id": "rp_standard",
+        "warranty_policy_id": "wp_1year",
+        "policy_summary": {"en": "30-day return", "zh": "30天退货"},
+    },
+    "risk_profile": {
+        "fragile": False,
+        "sizing_uncertainty": "low",
+        "counterfeit_risk": "low",
+        "after_sale_complexity": "low",
+    },
+    "version": {
+        "hash": "mock_hash_123",
+        "source": "mock",
+    },
+}
+_MOCK_VARIANT_AXES = [{"axis": "color", "values": ["Black", "White"]}]
+_MOCK_SKU_TEMPLATE: dict[str, Any] = {
+    "options": {"color": "Black"},
+    "packaging": {"weight_g": 200, "dim_mm": [100, 80, 30]},
+    "risk_tags": [],
+    "compliance_tags": [],
+}
+
+# 当前请求绑定的商品卡片 loader（见 offer_card_batching）
+_offer_card_loader: ContextVar[BatchLoader | None] = ContextVar("offer_card_loader", default=None)
 
 
 async def search_offers(
@@ -40,32 +121,35 @@ async def search_offers(
         标准响应 Envelope，data 包含 offer_ids 和 scores
     """
     if MOCK_MODE:
-        # Mock 数据
-        mock_offers = [
-            f"of_{i:06d}" for i in range(1, min(limit + 1, 51))
-        ]
+        # Mock 数据：预分配两列，一次循环同时填充 ID 和分数
+        count = max(0, min(limit, 50))
+        mock_offers = [""] * count
+        mock_scores = [0.0] * count
+        for i in range(count):
+            mock_offers[i] = f"of_{i + 1:06d}"
+            mock_scores[i] = 0.95 - i * 0.01
         return mock_response({
             "offer_ids": mock_offers,
-            "scores": [0.95 - i * 0.01 for i in range(len(mock_offers))],
+            "scores": mock_scores,
             "total_count": 100,
             "has_more": True,
         })
 
     # 构建 filters，只包含非 None 的值
+    price_range = {
+        k: v for k, v in (("min", price_min), ("max", price_max)) if v is not None
+    } or None
     filters: dict[str, Any] = {
-        "destination_country": destination_country,
-        "must_in_stock": must_in_stock,
+        k: v
+        for k, v in (
+            ("destination_country", destination_country),
+            ("must_in_stock", must_in_stock),
+            ("category_id", category_id),
+            ("brand", brand),
+            ("price_range", price_range),
+        )
+        if v is not None
     }
-    if category_id is not None:
-        filters["category_id"] = category_id
-    if brand is not None:
-        filters["brand"] = brand
-    if price_min is not None or price_max is not None:
-        filters["price_range"] = {}
-        if price_min is not None:
-            filters["price_range"]["min"] = price_min
-        if price_max is not None:
-            filters["price_range"]["max"] = price_max
 
     # 构建参数，支持双语搜索
     params: dict[str, Any] = {
@@ -100,80 +184,162 @@ async def get_offer_card(
 
     Args:
         offer_id: 商品 ID
-        include_kg_relations: 是否包含 KG 关系数据
+        include_kg_relations: 是否包含 KG 关系数据（False 时 Tool Gateway 跳过 KG 关系查询）
 
     Returns:
         标准响应 Envelope，data 包含完整 AROC（含 KG 关系）
     """
-    if MOCK_MODE:
-        # Mock AROC 数据
-        return mock_response({
-            "aroc_version": "0.2",
-            "offer_id": offer_id,
-            "spu_id": f"spu_{offer_id[3:]}",
-            "merchant_id": "m_001",
-            "titles": [
-                {"locale": "en", "lang": "en", "text": f"Test Product {offer_id}"},
-                {"locale": "zh", "lang": "zh", "text": f"测试商品 {offer_id}"},
-            ],
-            "brand": {
-                "name": "TestBrand",
-                "normalized_id": "brand_test",
-                "confidence": "high",
-            },
-            "merchant": {
-                "id": "m_001",
-                "name": "Test Store",
-                "rating": 4.5,
-                "verified": True,
-                "risk_level": "normal",
-            },
-            "category": {
-                "cat_id": "c_electronics",
-                "path": ["Electronics", "Gadgets"],
-                "full_path": "Electronics > Gadgets",
-            },
-            "attributes": [
-                {
-                    "attr_id": "color",
-                    "name": {"en": "Color", "zh": "颜色"},
-                    "value": {"type": "enum", "normalized": "Black"},
-                    "confidence": 0.95,
-                },
-            ],
-            "variants": {
-                "axes": [{"axis": "color", "values": ["Black", "White"]}],
-                "skus": [
-                    {
-                        "sku_id": f"sku_{offer_id[3:]}_001",
-                        "options": {"color": "Black"},
-                        "packaging": {"weight_g": 200, "dim_mm": [100, 80, 30]},
-                        "risk_tags": [],
-                        "compliance_tags": [],
-                    },
-                ],
-            },
-            "policies": {
-                "return_policy_id": "rp_standard",
-                "warranty_policy_id": "wp_1year",
-                "policy_summary": {"en": "30-day return", "zh": "30天退货"},
-            },
-            "risk_profile": {
-                "fragile": False,
-                "sizing_uncertainty": "low",
-                "counterfeit_risk": "low",
-                "after_sale_complexity": "low",
-            },
-            "version": {
-                "hash": "mock_hash_123",
-                "source": "mock",
-            },
-            "kg_relations": [] if not include_kg_relations else [
-                {"type": "IN_CATEGORY", "from": {"type": "offer", "id": offer_id}, "to": {"type": "category", "id": "c_electronics"}},
-            ],
-        })
+    loader = _offer_card_loader.get()
+    if loader is not None:
+        return await loader.load((offer_id, include_kg_relations, user_id))
+    return await _fetch_offer_card(offer_id, include_kg_relations, user_id)
+
+
+@contextmanager
+def offer_card_batching(max_concurrency: int = 10) -> Iterator[BatchLoader]:
+    """
+    在当前上下文内合并 get_offer_card 调用
+
+    用法：在 with 块内用 asyncio.gather 并发调用 get_offer_card，
+    同一轮事件循环的请求会去重，未命中缓存的部分合并为一次 get_offer_cards_batch 请求；
+    批量请求失败或个别卡片查询失败时逐个回源（最多 max_concurrency 个并发请求）。
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch_one(offer_id: str, include_kg_relations: bool, user_id: str | None) -> dict[str, Any]:
+        async with semaphore:
+            return await _fetch_offer_card(offer_id, include_kg_relations, user_id)
+
+    async def fetch_group(
+        offer_ids: list[str],
+        include_kg_relations: bool,
+        user_id: str | None,
+    ) -> dict[str, dict[str, Any]]:
+        if MOCK_MODE or len(offer_ids) == 1:
+            cards = await asyncio.gather(*(fetch_one(oid, include_kg_relations, user_id) for oid in offer_ids))
+            return dict(zip(offer_ids, cards, strict=True))
+
+        cached = await asyncio.gather(*(
+            cache_get(_offer_card_cache_key(oid, include_kg_relations)) for oid in offer_ids
+        ))
+        results = {oid: card for oid, card in zip(offer_ids, cached, strict=True) if card is not None}
+        misses = [oid for oid in offer_ids if oid not in results]
+
+        retry: list[str] = []
+        for start in range(0, len(misses), OFFER_CARD_BATCH_LIMIT):
+            chunk = misses[start:start + OFFER_CARD_BATCH_LIMIT]
+            if len(chunk) == 1:
+                retry.extend(chunk)
+                continue
+            batch = await get_offer_cards_batch(chunk, include_kg_relations, user_id)
+            if not batch.get("ok"):
+                # 旧版 Tool Gateway 没有批量接口，整批退回逐个查询
+                retry.extend(chunk)
+                continue
+            data = batch.get("data") or {}
+            cards = data.get("cards") or {}
+            not_found = set(data.get("not_found") or ())
+            for oid in chunk:
+                card = cards.get(oid)
+                if card is not None:
+                    result = {**batch, "data": card}
+                    await cache_set(_offer_card_cache_key(oid, include_kg_relations), result, OFFER_CARD_CACHE_TTL)
+                    results[oid] = result
+                elif oid in not_found:
+                    results[oid] = {
+                        "ok": False,
+                        "error": {"code": "NOT_FOUND", "message": f"Offer {oid} not found"},
+                    }
+                else:
+                    retry.append(oid)
+
+        singles = await asyncio.gather(*(fetch_one(oid, include_kg_relations, user_id) for oid in retry))
+        results.update(zip(retry, singles, strict=True))
+        return results
+
+    async def batch_fn(keys: list[tuple]) -> dict[tuple, dict[str, Any]]:
+        # 按 (include_kg_relations, user_id) 分组，每组一次批量请求
+        groups: dict[tuple[bool, str | None], list[str]] = {}
+        for offer_id, include_kg_relations, user_id in keys:
+            groups.setdefault((include_kg_relations, user_id), []).append(offer_id)
+
+        grouped = await asyncio.gather(*(
+            fetch_group(offer_ids, *group) for group, offer_ids in groups.items()
+        ))
+        return {
+            (offer_id, *group): card
+            for group, cards in zip(groups, grouped, strict=True)
+            for offer_id, card in cards.items()
+        }
+
+    loader = BatchLoader(batch_fn, name="offer_card_loader")
+    token = _offer_card_loader.set(loader)
+    try:
+        yield loader
+    finally:
+        _offer_card_loader.reset(token)
+
+
+def _offer_card_cache_key(offer_id: str, include_kg_relations: bool) -> str:
+    """单个商品卡片的 Redis 缓存键（单个查询与批量查询共用）"""
+    return f"aroc:{offer_id}:{int(include_kg_relations)}"
+
+
+async def get_offer_cards_batch(
+    offer_ids: list[str],
+    include_kg_relations: bool = True,
+    user_id: str | None = None,
+) -> dict[str, Any]:
+    """
+    catalog.get_offer_cards_batch - 一次获取多个 AROC
+
+    Args:
+        offer_ids: 商品 ID 列表（最多 OFFER_CARD_BATCH_LIMIT 个）
+        include_kg_relations: 是否包含 KG 关系数据
 
+    Returns:
+        标准响应 Envelope，data 包含 cards（offer_id -> AROC）、not_found、failed
+    """
     return await call_tool(
+        mcp_server="core",
+        tool_name="catalog.get_offer_cards_batch",
+        params={
+            "offer_ids": offer_ids,
+            "include_kg_relations": include_kg_relations,
+        },
+        user_id=user_id,
+    )
+
+
+async def _fetch_offer_card(
+    offer_id: str,
+    include_kg_relations: bool = True,
+    user_id: str | None = None,
+) -> dict[str, Any]:
+    """单个商品卡片查询（Mock / Redis 缓存 / Tool Gateway）"""
+    if MOCK_MODE:
+        # Mock AROC 数据：静态部分共享模板，只生成与 offer_id 相关的字段
+        suffix = offer_id.removeprefix("of_")
+        # 深复制模板：调用方可能修改嵌套字段，各卡片之间不能共享可变结构
+        data = copy.deepcopy(_AROC_MOCK_TEMPLATE)
+        data["offer_id"] = offer_id
+        data["spu_id"] = "spu_" + suffix
+        data["titles"] = [
+            {"locale": "en", "lang": "en", "text": "Test Product " + offer_id},
+            {"locale": "zh", "lang": "zh", "text": "测试商品 " + offer_id},
+        ]
+        data["variants"] = {
+            "axes": copy.deepcopy(_MOCK_VARIANT_AXES),
+            "skus": [{**copy.deepcopy(_MOCK_SKU_TEMPLATE), "sku_id": "sku_" + suffix + "_001"}],
+        }
+        data["kg_relations"] = [] if not include_kg_relations else [
+            {"type": "IN_CATEGORY", "from": {"type": "offer", "id": offer_id}, "to": {"type": "category", "id": "c_electronics"}},
+        ]
+        return mock_response(data)
+
+    return await cached_call_tool(
+        cache_key=_offer_card_cache_key(offer_id, include_kg_relations),
+        ttl_seconds=OFFER_CARD_CACHE_TTL,
         mcp_server="core",
         tool_name="catalog.get_offer_card",
         params={
@@ -206,7 +372,9 @@ async def get_brand(
             "offer_count": 100,
         })
 
-    return await call_tool(
+    return await cached_call_tool(
+        cache_key=f"brand:{brand_id}",
+        ttl_seconds=BRAND_CACHE_TTL,
         mcp_server="core",
         tool_name="catalog.get_brand",
         params={"brand_id": brand_id},
@@ -237,7 +405,9 @@ async def get_merchant(
             "risk_level": "normal",
         })
 
-    return await call_tool(
+    return await cached_call_tool(
+        cache_key=f"merchant:{merchant_id}",
+        ttl_seconds=MERCHANT_CACHE_TTL,
         mcp_server="core",
         tool_name="catalog.get_merchant",
         params={"merchant_id": merchant_id},
@@ -245,6 +415,7 @@ async def get_merchant(
     )
 
 
+@async_ttl_cache(maxsize=256, ttl=300)
 async def get_category_tree(
     parent_id: str | None = None,
     depth: int = 2,
@@ -270,7 +441,9 @@ async def get_category_tree(
             "total_count": 2,
         })
 
-    return await call_tool(
+    return await cached_call_tool(
+        cache_key=f"category_tree:{parent_id}:{depth}",
+        ttl_seconds=CATEGORY_TREE_CACHE_TTL,
         mcp_server="core",
         tool_name="catalog.get_category_tree",
         params={
@@ -299,6 +472,9 @@ async def get_kg_relations(
 
     Returns:
         标准响应 Envelope，data 包含 KG 关系列表
+
+    按 (entity_type, entity_id, direction) 缓存实体的完整邻接表，relation_types 在客户端过滤；
+    完整邻接表被截断（达到 KG_RELATIONS_LIMIT）时，带过滤条件的查询仍交给 Tool Gateway。
     """
     if MOCK_MODE:
         return mock_response({
@@ -310,15 +486,38 @@ async def get_kg_relations(
             "total_count": 1,
         })
 
-    return await call_tool(
+    adjacency = await cached_call_tool(
+        cache_key=f"kg:{entity_type}:{entity_id}:{direction}",
+        ttl_seconds=KG_RELATIONS_CACHE_TTL,
         mcp_server="core",
         tool_name="catalog.get_kg_relations",
         params={
             "entity_type": entity_type,
             "entity_id": entity_id,
-            "relation_types": relation_types,
+            "relation_types": None,
             "direction": direction,
         },
         user_id=user_id,
     )
+    if not relation_types or not adjacency.get("ok"):
+        return adjacency
+
+    data = adjacency.get("data") or {}
+    relations = data.get("relations") or []
+    if len(relations) >= KG_RELATIONS_LIMIT:
+        return await call_tool(
+            mcp_server="core",
+            tool_name="catalog.get_kg_relations",
+            params={
+                "entity_type": entity_type,
+                "entity_id": entity_id,
+                "relation_types": relation_types,
+                "direction": direction,
+            },
+            user_id=user_id,
+        )
+
+    wanted = set(relation_types)
+    filtered = [r for r in relations if r.get("type") in wanted]
+    return {**adjacency, "data": {**data, "relations": filtered, "total_count": len(filtered)}}
 
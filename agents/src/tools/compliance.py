@@ -3,9 +3,33 @@ Compliance tools - 合规检查
 Enhanced with risk_tag_definitions and shipping_lanes
 """
 
+import copy
+from datetime import datetime
 from typing import Any
 
-from .base import MOCK_MODE, call_tool, mock_response
+import structlog
+
+from .base import (
+    MOCK_MODE,
+    async_ttl_cache,
+    cached_call_tool,
+    call_tool,
+    hash_response,
+    mock_response,
+)
+
+try:
+    import ahocorasick
+except ImportError:  # 可选依赖：pip install ".[risk]"
+    ahocorasick = None
+
+logger = structlog.get_logger()
+
+# check_item 结果缓存 TTL（秒）；键中包含规则版本，规则发布后自动失效
+CHECK_ITEM_CACHE_TTL = 3600
+
+# 规则版本查询失败时的缓存 TTL（秒）：期间合规检查直接回源，不再每次重试版本查询
+RULESET_VERSION_ERROR_TTL = 30
 
 
 async def check_compliance(
@@ -14,6 +38,7 @@ async def check_compliance(
     shipping_option_id: str | None = None,
     origin_country: str = "CN",
     user_id: str | None = None,
+    ruleset_version: str | None = None,
 ) -> dict[str, Any]:
     """
     compliance.check_item - 检查商品合规性（基于风险标签和物流线路）
@@ -23,6 +48,7 @@ async def check_compliance(
         destination_country: 目的国
         shipping_option_id: 物流选项（可选）
         origin_country: 发货国（默认 CN）
+        ruleset_version: 调用方已解析的规则版本（可选，传入时不再查询；空字符串表示取不到版本，不缓存）
 
     Returns:
         标准响应 Envelope，data 包含合规结果、可用线路、风险标签
@@ -42,19 +68,39 @@ async def check_compliance(
             "ruleset_version": "cr_2025_01_02",
         })
 
-    return await call_tool(
+    params = {
+        "sku_id": sku_id,
+        "destination_country": destination_country,
+        "shipping_option_id": shipping_option_id,
+        "origin_country": origin_country,
+    }
+
+    # 允许与拒绝结果同样稳定，都按 (规则版本, SKU, 目的国, 物流选项, 发货国) 缓存
+    # 规则版本来自进程内缓存（查询失败也会短暂缓存），不会为每次检查多一次 RPC
+    if ruleset_version is None:
+        ruleset_version = await resolve_ruleset_version()
+    if not ruleset_version:
+        return await call_tool(
+            mcp_server="core",
+            tool_name="compliance.check_item",
+            params=params,
+            user_id=user_id,
+        )
+
+    return await cached_call_tool(
+        cache_key=(
+            f"compliance:{ruleset_version}:{sku_id}:{destination_country}:"
+            f"{shipping_option_id}:{origin_country}"
+        ),
+        ttl_seconds=CHECK_ITEM_CACHE_TTL,
         mcp_server="core",
         tool_name="compliance.check_item",
-        params={
-            "sku_id": sku_id,
-            "destination_country": destination_country,
-            "shipping_option_id": shipping_option_id,
-            "origin_country": origin_country,
-        },
+        params=params,
         user_id=user_id,
     )
 
 
+@async_ttl_cache(maxsize=256, ttl=300)
 async def get_compliance_rules(
     destination_country: str,
     category_id: str | None = None,
@@ -101,6 +147,7 @@ async def get_compliance_rules(
     )
 
 
+@async_ttl_cache(maxsize=256, ttl=300, error_ttl=RULESET_VERSION_ERROR_TTL)
 async def get_policy_ruleset_version(
     user_id: str | None = None,
 ) -> dict[str, Any]:
@@ -111,11 +158,7 @@ async def get_policy_ruleset_version(
         标准响应 Envelope，data 包含规则版本号和支持的功能
     """
     if MOCK_MODE:
-        return mock_response({
-            "version": "cr_2025_01_02",
-            "valid_from": "2025-01-02T00:00:00Z",
-            "features": ["risk_tag_definitions", "shipping_lanes", "kg_relations"],
-        })
+        return copy.deepcopy(_MOCK_RULESET_VERSION)
 
     return await call_tool(
         mcp_server="core",
@@ -125,6 +168,15 @@ async def get_policy_ruleset_version(
     )
 
 
+async def resolve_ruleset_version() -> str | None:
+    """返回当前规则版本号；查询失败时返回 None"""
+    version_result = await get_policy_ruleset_version()
+    if not version_result.get("ok"):
+        return None
+    return version_result.get("data", {}).get("version")
+
+
+@async_ttl_cache(maxsize=256, ttl=300)
 async def get_risk_tags(
     severity: str | None = None,
     user_id: str | None = None,
@@ -139,25 +191,10 @@ async def get_risk_tags(
         标准响应 Envelope，data 包含风险标签列表
     """
     if MOCK_MODE:
-        return mock_response({
-            "risk_tags": [
-                {
-                    "id": "battery_included",
-                    "name": "Battery Included",
-                    "severity": "warning",
-                    "affects_shipping": True,
-                    "affects_customs": True,
-                },
-                {
-                    "id": "liquid",
-                    "name": "Liquid Content",
-                    "severity": "warning",
-                    "affects_shipping": True,
-                    "affects_customs": True,
-                },
-            ],
-            "total_count": 2,
-        })
+        if severity is None:
+            return copy.deepcopy(_MOCK_RISK_TAGS_ALL)
+        tags = [copy.deepcopy(tag) for tag in _MOCK_RISK_TAGS if tag["severity"] == severity]
+        return mock_response({"risk_tags": tags, "total_count": len(tags)})
 
     return await call_tool(
         mcp_server="core",
@@ -202,6 +239,11 @@ async def analyze_product_risks(
             },
         })
 
+    # 本地预筛：没有任何风险关键词出现时，服务端结果必然为空，跳过 RPC
+    matched_tags = await pre_filter_risks(f"{title or ''} {description}")
+    if matched_tags == []:
+        return _prefilter_response(_no_risks_detected())
+
     return await call_tool(
         mcp_server="core",
         tool_name="compliance.analyze_product_risks",
@@ -213,6 +255,104 @@ async def analyze_product_risks(
     )
 
 
+class RiskKeywordMatcher:
+    """
+    风险关键词匹配器
+
+    安装 pyahocorasick 时构建 Aho-Corasick 自动机，一次扫描文本即可匹配全部关键词；
+    否则逐个关键词做子串判断。匹配规则与服务端 analyze_product_risks 一致（小写子串）。
+    """
+
+    def __init__(self, risk_tags: list[dict[str, Any]]):
+        # 关键词 -> 风险标签 ID 列表（同一关键词可能属于多个标签）
+        self._keyword_tags: dict[str, list[str]] = {}
+        for tag in risk_tags:
+            for keyword in tag.get("detection_keywords") or []:
+                if keyword:
+                    self._keyword_tags.setdefault(keyword.lower(), []).append(tag["id"])
+
+        self._automaton = None
+        if ahocorasick is not None and self._keyword_tags:
+            automaton = ahocorasick.Automaton()
+            for keyword, tag_ids in self._keyword_tags.items():
+                automaton.add_word(keyword, tag_ids)
+            automaton.make_automaton()
+            self._automaton = automaton
+
+    def match(self, text: str) -> list[str]:
+        """返回文本命中的风险标签 ID（去重）"""
+        text = text.lower()
+        if self._automaton is not None:
+            hits = (tag_ids for _, tag_ids in self._automaton.iter(text))
+        else:
+            hits = (tag_ids for keyword, tag_ids in self._keyword_tags.items() if keyword in text)
+        return list(dict.fromkeys(tag_id for tag_ids in hits for tag_id in tag_ids))
+
+
+def _no_risks_detected() -> dict[str, Any]:
+    """预筛无命中时的 data（与服务端无命中时的结果一致，每次新建）"""
+    return {
+        "detected_risks": [],
+        "has_critical": False,
+        "has_warnings": False,
+        "risk_summary": {
+            "critical_count": 0,
+            "warning_count": 0,
+            "info_count": 0,
+        },
+    }
+
+
+def _prefilter_response(data: dict[str, Any]) -> dict[str, Any]:
+    """
+    本地预筛得到的响应 Envelope
+
+    形状与 call_tool 返回的服务端响应一致；没有经过服务端，因此不带 snapshot_id，
+    evidence.source 标明来自本地预筛。
+    """
+    return {
+        "ok": True,
+        "data": data,
+        "warnings": [],
+        "evidence": {
+            "source": "local_prefilter",
+            "hash": hash_response(data),
+            "ts": datetime.utcnow().isoformat(),
+        },
+    }
+
+
+# 按规则版本缓存的匹配器：(ruleset_version, matcher)
+_risk_matcher: tuple[str, RiskKeywordMatcher] | None = None
+
+
+async def pre_filter_risks(text: str) -> list[str] | None:
+    """
+    用风险标签关键词本地预筛文本
+
+    Returns:
+        命中的风险标签 ID 列表；无法获取规则版本或标签定义时返回 None（调用方应回退到 RPC）
+    """
+    global _risk_matcher
+    if MOCK_MODE:
+        return None
+
+    ruleset_version = await resolve_ruleset_version()
+    if not ruleset_version:
+        return None
+
+    if _risk_matcher is None or _risk_matcher[0] != ruleset_version:
+        tags_result = await get_risk_tags()
+        if not tags_result.get("ok"):
+            return None
+        risk_tags = tags_result.get("data", {}).get("risk_tags", [])
+        # 规则版本变化时整体替换旧匹配器
+        _risk_matcher = (ruleset_version, RiskKeywordMatcher(risk_tags))
+        logger.info("compliance.risk_matcher_built", ruleset_version=ruleset_version, tags=len(risk_tags))
+
+    return _risk_matcher[1].match(text)
+
+
 async def get_shipping_lanes(
     origin_country: str = "CN",
     dest_country: str | None = None,
@@ -264,3 +404,35 @@ async def get_shipping_lanes(
         user_id=user_id,
     )
 
+
+# ============================================================
+# 静态 Mock 响应（导入时构建一次；返回深复制，调用方修改不会影响后续调用）
+# ============================================================
+
+_MOCK_RISK_TAGS = [
+    {
+        "id": "battery_included",
+        "name": "Battery Included",
+        "severity": "warning",
+        "affects_shipping": True,
+        "affects_customs": True,
+    },
+    {
+        "id": "liquid",
+        "name": "Liquid Content",
+        "severity": "warning",
+        "affects_shipping": True,
+        "affects_customs": True,
+    },
+]
+
+_MOCK_RULESET_VERSION = mock_response({
+    "version": "cr_2025_01_02",
+    "valid_from": "2025-01-02T00:00:00Z",
+    "features": ["risk_tag_definitions", "shipping_lanes", "kg_relations"],
+})
+
+_MOCK_RISK_TAGS_ALL = mock_response({
+    "risk_tags": _MOCK_RISK_TAGS,
+    "total_count": len(_MOCK_RISK_TAGS),
+})
@@ -2,10 +2,15 @@
 Knowledge tools - RAG 检索
 """
 
+import asyncio
 from typing import Any
 
+import structlog
+
 from .base import MOCK_MODE, call_tool, mock_response
 
+logger = structlog.get_logger()
+
 
 async def search_knowledge(
     query: str,
@@ -163,40 +168,44 @@ async def search_with_context(
         "total_chunks": 0,
     }
 
-    # 搜索产品信息
-    product_result = await search_knowledge(
-        query=query,
-        source_types=["product_description", "specification", "qa"],
-        language=language,
-        limit=5,
-        user_id=user_id,
-    )
-    if product_result.get("ok"):
-        results["product_chunks"] = product_result.get("data", {}).get("chunks", [])
-
-    # 搜索合规信息
+    # 三类搜索互不依赖，并发发起（总耗时约为一次往返）
+    searches = {
+        # 产品信息
+        "product_chunks": search_knowledge(
+            query=query,
+            source_types=["product_description", "specification", "qa"],
+            language=language,
+            limit=5,
+            user_id=user_id,
+        ),
+    }
     if include_compliance:
-        compliance_result = await search_knowledge(
+        # 合规信息
+        searches["compliance_chunks"] = search_knowledge(
             query=f"{query} compliance certification",
             source_types=["compliance", "policy"],
             language=language,
             limit=3,
             user_id=user_id,
         )
-        if compliance_result.get("ok"):
-            results["compliance_chunks"] = compliance_result.get("data", {}).get("chunks", [])
-
-    # 搜索物流信息
     if include_shipping:
-        shipping_result = await search_knowledge(
+        # 物流信息
+        searches["shipping_chunks"] = search_knowledge(
             query=f"{query} shipping delivery",
             source_types=["shipping", "policy"],
             language=language,
             limit=3,
             user_id=user_id,
         )
-        if shipping_result.get("ok"):
-            results["shipping_chunks"] = shipping_result.get("data", {}).get("chunks", [])
+
+    # return_exceptions=True：单个搜索失败不会取消其他搜索
+    responses = await asyncio.gather(*searches.values(), return_exceptions=True)
+    for key, result in zip(searches, responses, strict=True):
+        if isinstance(result, BaseException):
+            logger.warning("search_with_context.search_failed", source=key, error=str(result))
+            continue
+        if result.get("ok"):
+            results[key] = result.get("data", {}).get("chunks", [])
 
     # 计算总数
     results["total_chunks"] = (
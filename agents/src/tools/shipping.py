@@ -2,10 +2,37 @@
 Shipping tools - 物流与地址
 """
 
+import copy
 from typing import Any
 
 from .base import MOCK_MODE, call_tool, mock_response
 
+# Mock 物流选项（整单与逐项报价共用的模板，每次返回深复制）
+_MOCK_SHIPPING_OPTIONS = [
+    {
+        "shipping_option_id": "ship_standard",
+        "carrier": "Standard Shipping",
+        "service_level": "standard",
+        "price": 5.99,
+        "currency": "USD",
+        "eta_min_days": 7,
+        "eta_max_days": 14,
+        "tracking_supported": True,
+        "constraints": [],
+    },
+    {
+        "shipping_option_id": "ship_express",
+        "carrier": "Express Shipping",
+        "service_level": "express",
+        "price": 15.99,
+        "currency": "USD",
+        "eta_min_days": 3,
+        "eta_max_days": 5,
+        "tracking_supported": True,
+        "constraints": [],
+    },
+]
+
 
 async def validate_address(
     country: str,
@@ -52,6 +79,7 @@ async def quote_shipping_options(
     items: list[dict],
     destination_country: str = "US",
     destination_postal_code: str | None = None,
+    per_item: bool = False,
     user_id: str | None = None,
 ) -> dict[str, Any]:
     """
@@ -61,52 +89,41 @@ async def quote_shipping_options(
         items: 商品列表 [{"sku_id": "...", "qty": 1}]
         destination_country: 目的国
         destination_postal_code: 目的地邮编
+        per_item: 额外按商品分别报价（data.item_quotes 与 items 顺序一致），用于合并多个候选的报价
 
     Returns:
         标准响应 Envelope，data 包含物流选项
     """
     if MOCK_MODE:
-        return mock_response(
-            {
-                "options": [
-                    {
-                        "shipping_option_id": "ship_standard",
-                        "carrier": "Standard Shipping",
-                        "service_level": "standard",
-                        "price": 5.99,
-                        "currency": "USD",
-                        "eta_min_days": 7,
-                        "eta_max_days": 14,
-                        "tracking_supported": True,
-                        "constraints": [],
-                    },
-                    {
-                        "shipping_option_id": "ship_express",
-                        "carrier": "Express Shipping",
-                        "service_level": "express",
-                        "price": 15.99,
-                        "currency": "USD",
-                        "eta_min_days": 3,
-                        "eta_max_days": 5,
-                        "tracking_supported": True,
-                        "constraints": [],
-                    },
-                ],
-                "quote_expire_at": "2024-12-24T18:00:00Z",
-            },
-            ttl_seconds=300,  # 物流报价有效期 5 分钟
-        )
+        data = {
+            "options": copy.deepcopy(_MOCK_SHIPPING_OPTIONS),
+            "quote_expire_at": "2024-12-24T18:00:00Z",
+        }
+        if per_item:
+            data["item_quotes"] = [
+                {
+                    "sku_id": item.get("sku_id"),
+                    "qty": item.get("qty", 1),
+                    "options": copy.deepcopy(_MOCK_SHIPPING_OPTIONS),
+                }
+                for item in items
+            ]
+        return mock_response(data, ttl_seconds=300)  # 物流报价有效期 5 分钟
+
+    params: dict[str, Any] = {
+        "items": items,
+        "destination": {
+            "country": destination_country,
+            "postal_code": destination_postal_code,
+        },
+    }
+    if per_item:
+        params["per_item"] = True
 
     return await call_tool(
         mcp_server="core",
         tool_name="shipping.quote_options",
-        params={
-            "items": items,
-            "destination": {
-                "country": destination_country,
-                "postal_code": destination_postal_code,
-            },
-        },
+        params=params,
         user_id=user_id,
     )
 
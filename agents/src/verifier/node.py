@@ -4,37 +4,194 @@ Verifier Agent Node implementation.
 对候选商品进行实时核验。
 """
 
-from datetime import UTC
-
+import asyncio
+import itertools
+import uuid
+from collections.abc import Awaitable, Callable, Coroutine, Hashable, Sequence
+from datetime import UTC, datetime
+from typing import Any
+
+import orjson
 import structlog
 
 from ..config import get_settings
-from ..graph.state import AgentState
+from ..graph.state import STEP_VERIFIER_COMPLETE, AgentState
 from ..llm.client import call_llm_and_parse
-from ..llm.prompts import VERIFIER_PROMPT
+from ..llm.prompts import MAX_TOKENS, VERIFIER_PROMPT
 from ..llm.schemas import VerificationResult
-from ..tools.compliance import check_compliance
+from ..tools.base import async_ttl_cache
+from ..tools.batch import BatchLoader
+from ..tools.breaker import CircuitBreaker
+from ..tools.compliance import check_compliance, resolve_ruleset_version
 from ..tools.pricing import get_realtime_quote
 from ..tools.shipping import quote_shipping_options
 
 logger = structlog.get_logger()
 
+# 跨请求的进程内缓存 TTL（秒）：运费报价变化较快，合规结论按规则版本缓存，发布新规则即失效
+COMPLIANCE_CACHE_TTL = 600
+SHIPPING_CACHE_TTL = 60
+
+# 防御性取值的只读默认值（避免每次 `or {}` / `or []` 分配新对象，不得修改）
+_EMPTY_DICT: dict = {}
+_EMPTY_TUPLE: tuple = ()
+
+# 各下游服务的熔断器：服务故障时候选不再逐个等待超时
+_PRICING_BREAKER = CircuitBreaker("pricing")
+_COMPLIANCE_BREAKER = CircuitBreaker("compliance")
+_SHIPPING_BREAKER = CircuitBreaker("shipping")
+
+# tool_id 只需在 SSE 推送中唯一：进程级随机前缀 + 自增计数，避免每次调用 os.urandom
+_RUN_NONCE = uuid.uuid4().hex[:8]
+_TOOL_COUNTER = itertools.count()
+
+# 下游工具调用的并发闸门，按事件循环懒创建（Semaphore 不能跨事件循环使用）
+_verify_semaphore: tuple[asyncio.AbstractEventLoop, asyncio.Semaphore] | None = None
+
+
+def _get_verify_semaphore() -> asyncio.Semaphore:
+    """返回当前事件循环上的核验并发闸门"""
+    global _verify_semaphore
+    loop = asyncio.get_running_loop()
+    if _verify_semaphore is None or _verify_semaphore[0] is not loop:
+        _verify_semaphore = (loop, asyncio.Semaphore(get_settings().verifier_concurrency))
+    return _verify_semaphore[1]
+
+
+async def _limited(call: Awaitable[dict[str, Any]]) -> dict[str, Any]:
+    """在并发闸门内执行一次工具调用，避免扇出过大触发下游限流"""
+    async with _get_verify_semaphore():
+        return await call
+
+
+async def _guarded(
+    breaker: CircuitBreaker,
+    call: Coroutine[Any, Any, dict[str, Any]],
+) -> dict[str, Any]:
+    """经熔断器执行工具调用：打开时直接返回失败响应，否则记录本次结果"""
+    if breaker.is_open:
+        call.close()
+        return breaker.open_response()
+    try:
+        result = await call
+    except Exception:
+        breaker.record(False)
+        raise
+    breaker.record(bool(result.get("ok")))
+    return result
+
+
+async def _cached_check_compliance(sku_id: str, destination_country: str) -> dict[str, Any]:
+    """
+    按 (规则版本, SKU, 目的国) 缓存的合规检查
+
+    规则版本只在这里解析一次（本身有进程内缓存），再传给 check_compliance；取不到版本时不缓存，直接回源。
+    """
+    ruleset_version = await resolve_ruleset_version()
+    if not ruleset_version:
+        return await _guarded(
+            _COMPLIANCE_BREAKER,
+            check_compliance(sku_id=sku_id, destination_country=destination_country, ruleset_version=""),
+        )
+    return await _versioned_check_compliance(ruleset_version, sku_id, destination_country)
+
+
+@async_ttl_cache(maxsize=1024, ttl=COMPLIANCE_CACHE_TTL)
+async def _versioned_check_compliance(
+    ruleset_version: str,
+    sku_id: str,
+    destination_country: str,
+) -> dict[str, Any]:
+    """按规则版本缓存（只缓存成功响应，并发未命中合并为一次调用）"""
+    return await _guarded(
+        _COMPLIANCE_BREAKER,
+        check_compliance(
+            sku_id=sku_id,
+            destination_country=destination_country,
+            ruleset_version=ruleset_version,
+        ),
+    )
+
+
+@async_ttl_cache(maxsize=1024, ttl=SHIPPING_CACHE_TTL)
+async def _cached_quote_shipping(sku_id: str, quantity: int, destination_country: str) -> dict[str, Any]:
+    """按 (SKU, 数量, 目的国) 缓存的单品运费报价"""
+    return await _guarded(_SHIPPING_BREAKER, quote_shipping_options(
+        items=[{"sku_id": sku_id, "qty": quantity}],
+        destination_country=destination_country,
+    ))
+
+
+def _shipping_batch_loader(destination_country: str) -> BatchLoader:
+    """
+    合并同一目的国的运费报价：一批 (SKU, 数量) 只发一次 per_item 报价请求
+
+    已在进程缓存中的键直接复用；Tool Gateway 未返回 item_quotes（旧版本）时退回逐个报价。
+    """
+    async def batch_fn(keys: list[tuple[str, int]]) -> dict[tuple[str, int], dict[str, Any]]:
+        results: dict[tuple[str, int], dict[str, Any]] = {}
+        misses: list[tuple[str, int]] = []
+        for key in keys:
+            cached = _cached_quote_shipping.cache_peek(*key, destination_country)
+            if cached is not None:
+                results[key] = cached
+            else:
+                misses.append(key)
+
+        if len(misses) > 1:
+            batch = await _limited(_guarded(_SHIPPING_BREAKER, quote_shipping_options(
+                items=[{"sku_id": sku_id, "qty": qty} for sku_id, qty in misses],
+                destination_country=destination_country,
+                per_item=True,
+            )))
+            if not batch.get("ok"):
+                return {**results, **dict.fromkeys(misses, batch)}
+
+            item_quotes = (batch.get("data") or _EMPTY_DICT).get("item_quotes")
+            if item_quotes is not None and len(item_quotes) == len(misses):
+                for key, quote in zip(misses, item_quotes, strict=True):
+                    result = {**batch, "data": quote}
+                    _cached_quote_shipping.cache_put(result, *key, destination_country)
+                    results[key] = result
+                return results
+
+        singles = await asyncio.gather(*(
+            _limited(_cached_quote_shipping(sku_id, qty, destination_country))
+            for sku_id, qty in misses
+        ))
+        results.update(zip(misses, singles, strict=True))
+        return results
+
+    return BatchLoader(batch_fn, name="shipping_quote_loader")
+
+
+def _shared_call(
+    tasks: dict[Hashable, asyncio.Task],
+    key: Hashable,
+    factory: Callable[[], Awaitable[dict[str, Any]]],
+) -> asyncio.Task:
+    """本次核验内相同 key 的调用只发起一次，重复的候选复用同一个 Task"""
+    task = tasks.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_limited(factory()))
+        tasks[key] = task
+    return task
+
 
 async def verifier_node(state: AgentState) -> AgentState:
     """
     Verifier Agent 节点
 
-    对候选进行实时核验
+    对候选进行实时核验。只返回本节点写入的字段，由 LangGraph 合并进状态。
     """
     logger.info("verifier_node.start")
 
     try:
         mission = state.get("mission")
-        candidates = state.get("candidates", [])
+        candidates = state.get("candidates") or _EMPTY_TUPLE
 
         if not mission:
             return {
-                **state,
                 "error": "No mission found",
                 "error_code": "INVALID_ARGUMENT",
                 "current_step": "verifier",
@@ -42,7 +199,6 @@ async def verifier_node(state: AgentState) -> AgentState:
 
         if not candidates:
             return {
-                **state,
                 "error": "No candidates to verify",
                 "error_code": "INVALID_ARGUMENT",
                 "current_step": "verifier",
@@ -53,270 +209,61 @@ async def verifier_node(state: AgentState) -> AgentState:
 
         verified_candidates = []
         rejected_candidates = []
-        tool_calls = state.get("tool_calls", [])
-
-        # 对每个候选进行核验（增加到 15 个以便生成多个方案）
-        for candidate in candidates[:15]:
-            offer_id = candidate.get("offer_id")
-            sku_id = None
-
-            # 获取默认 SKU（防御性处理：variants 可能为 None）
-            variants = candidate.get("variants") or {}
-            skus = variants.get("skus") or []
-            if skus and isinstance(skus[0], dict):
-                sku_id = skus[0].get("sku_id")
-
-            logger.info("verifier_node.checking", offer_id=offer_id, sku_id=sku_id)
-
-            verification_result = {
-                "offer_id": offer_id,
-                "sku_id": sku_id,
-                "candidate": candidate,
-                "checks": {},
-                "passed": True,
-                "warnings": [],
-                "rejection_reason": None,
-            }
-
-            # 1. 价格核验
-            quantity = mission.get("quantity", 1)
-            try:
-                price_result = await get_realtime_quote(
-                    sku_id=sku_id or offer_id,
-                    quantity=quantity,
-                    destination_country=destination_country,
-                )
-
-                pricing_request = {
-                    "offer_id": offer_id,
-                    "sku_id": sku_id,
-                    "quantity": quantity,
-                    "destination_country": destination_country,
-                }
-
-                if price_result.get("ok"):
-                    price_data = price_result.get("data", {})
-                    total_price = price_data.get("total_price", 0)
-                    unit_price = price_data.get("unit_price")
-                    stock_info = price_data.get("stock", {})
-                    stock_available = stock_info.get("quantity_available") if isinstance(stock_info, dict) else stock_info
-                    
-                    verification_result["checks"]["pricing"] = {
-                        "passed": True,
-                        "unit_price": unit_price,
-                        "total_price": total_price,
-                        "stock": stock_available,
-                    }
-
-                    # 检查是否超预算（防御性处理：budget_amount 可能为 None）
-                    if budget_amount is not None and total_price > budget_amount:
-                        verification_result["passed"] = False
-                        verification_result["rejection_reason"] = f"Price ${total_price} exceeds budget ${budget_amount}"
-
-                    tool_calls.append(_build_verifier_tool_call(
-                        tool_name="pricing.get_realtime_quote",
-                        request=pricing_request,
-                        response_summary={
-                            "ok": True,
-                            "total_price": total_price,
-                            "unit_price": unit_price,
-                            "currency": price_data.get("currency", "USD"),
-                            "stock_available": stock_available,
-                        },
-                    ))
-                else:
-                    verification_result["checks"]["pricing"] = {"passed": False, "error": "Quote failed"}
-                    verification_result["warnings"].append("Could not get real-time price")
-                    # 失败路径也记录 tool_call
-                    tool_calls.append(_build_verifier_tool_call(
-                        tool_name="pricing.get_realtime_quote",
-                        request=pricing_request,
-                        response_summary={
-                            "ok": False,
-                            "error": price_result.get("error", {}).get("message", "Quote failed"),
-                        },
-                    ))
-
-            except Exception as e:
-                logger.warning("verifier_node.price_check_failed", offer_id=offer_id, error=str(e))
-                verification_result["checks"]["pricing"] = {"passed": False, "error": str(e)}
-                # 异常路径也记录 tool_call
-                tool_calls.append(_build_verifier_tool_call(
-                    tool_name="pricing.get_realtime_quote",
-                    request={
-                        "offer_id": offer_id,
-                        "sku_id": sku_id,
-                        "quantity": quantity,
-                        "destination_country": destination_country,
-                    },
-                    response_summary={
-                        "ok": False,
-                        "error": str(e),
-                    },
-                ))
-
-            # 2. 合规检查
-            compliance_request = {
-                "offer_id": offer_id,
-                "sku_id": sku_id,
-                "destination_country": destination_country,
-            }
-            try:
-                compliance_result = await check_compliance(
-                    sku_id=sku_id or offer_id,
-                    destination_country=destination_country,
-                )
-
-                if compliance_result.get("ok"):
-                    compliance_data = compliance_result.get("data", {})
-                    is_allowed = compliance_data.get("allowed", True)
-                    issues = compliance_data.get("issues", [])
-                    warnings_list = compliance_data.get("warnings", [])
-                    ruleset_version = compliance_data.get("ruleset_version", "")
-                    
-                    verification_result["checks"]["compliance"] = {
-                        "passed": is_allowed,
-                        "issues": issues,
-                        "required_docs": compliance_data.get("required_docs", []),
-                        "warnings": warnings_list,
-                    }
-
-                    if not is_allowed:
-                        verification_result["passed"] = False
-                        reason = issues[0].get("message_en") if issues else "Compliance blocked"
-                        verification_result["rejection_reason"] = reason
-
-                    # 添加警告
-                    for warning in warnings_list:
-                        verification_result["warnings"].append(warning)
-
-                    tool_calls.append(_build_verifier_tool_call(
-                        tool_name="compliance.check_item",
-                        request=compliance_request,
-                        response_summary={
-                            "ok": True,
-                            "allowed": is_allowed,
-                            "ruleset_version": ruleset_version,
-                            "issues_count": len(issues),
-                            "warnings_count": len(warnings_list),
-                        },
-                    ))
-                else:
-                    verification_result["checks"]["compliance"] = {"passed": True, "error": "Check failed"}
-                    verification_result["warnings"].append("Compliance check unavailable")
-                    # 失败路径也记录 tool_call
-                    tool_calls.append(_build_verifier_tool_call(
-                        tool_name="compliance.check_item",
-                        request=compliance_request,
-                        response_summary={
-                            "ok": False,
-                            "error": compliance_result.get("error", {}).get("message", "Check failed"),
-                        },
-                    ))
-
-            except Exception as e:
-                logger.warning("verifier_node.compliance_check_failed", offer_id=offer_id, error=str(e))
-                verification_result["checks"]["compliance"] = {"passed": True, "error": str(e)}
-                verification_result["warnings"].append("Compliance check unavailable")
-                # 异常路径也记录 tool_call
-                tool_calls.append(_build_verifier_tool_call(
-                    tool_name="compliance.check_item",
-                    request=compliance_request,
-                    response_summary={
-                        "ok": False,
-                        "error": str(e),
-                    },
-                ))
-
-            # 3. 运输检查
-            shipping_request = {
-                "offer_id": offer_id,
-                "sku_id": sku_id,
-                "quantity": quantity,
-                "destination_country": destination_country,
-            }
-            try:
-                shipping_result = await quote_shipping_options(
-                    items=[{"sku_id": sku_id or offer_id, "qty": quantity}],
-                    destination_country=destination_country,
-                )
-
-                if shipping_result.get("ok"):
-                    shipping_data = shipping_result.get("data", {})
-                    options = shipping_data.get("options", [])
-                    options_count = len(options)
-                    fastest_days = min((o.get("eta_min_days", 99) for o in options), default=99) if options else 99
-                    cheapest_price = min((o.get("price", 999) for o in options), default=999) if options else 999
-                    
-                    verification_result["checks"]["shipping"] = {
-                        "passed": options_count > 0,
-                        "options_count": options_count,
-                        "fastest_days": fastest_days,
-                        "cheapest_price": cheapest_price,
-                    }
-
-                    # 检查是否能在期限内送达
-                    arrival_max = mission.get("arrival_days_max")
-                    if arrival_max and fastest_days > arrival_max:
-                        verification_result["warnings"].append(
-                            f"Fastest shipping ({fastest_days} days) exceeds deadline ({arrival_max} days)"
-                        )
-
-                    tool_calls.append(_build_verifier_tool_call(
-                        tool_name="shipping.quote_options",
-                        request=shipping_request,
-                        response_summary={
-                            "ok": True,
-                            "options_count": options_count,
-                            "fastest_days": fastest_days,
-                            "cheapest_price": cheapest_price,
-                        },
-                    ))
-                else:
-                    verification_result["checks"]["shipping"] = {"passed": True, "error": "Quote failed"}
-                    # 失败路径也记录 tool_call
-                    tool_calls.append(_build_verifier_tool_call(
-                        tool_name="shipping.quote_options",
-                        request=shipping_request,
-                        response_summary={
-                            "ok": False,
-                            "error": shipping_result.get("error", {}).get("message", "Quote failed"),
-                        },
-                    ))
-
-            except Exception as e:
-                logger.warning("verifier_node.shipping_check_failed", offer_id=offer_id, error=str(e))
-                verification_result["checks"]["shipping"] = {"passed": True, "error": str(e)}
-                # 异常路径也记录 tool_call
-                tool_calls.append(_build_verifier_tool_call(
-                    tool_name="shipping.quote_options",
-                    request=shipping_request,
-                    response_summary={
-                        "ok": False,
-                        "error": str(e),
-                    },
-                ))
+        # 只收集本节点新增的 tool_call，不修改上游 state 中的列表
+        new_tool_calls: list[dict] = []
+        quantity = mission.get("quantity", 1)
 
+        settings = get_settings()
+        verify_all_checks = settings.verify_all_checks_for_audit
+
+        # 合规结果只取决于 (SKU, 目的国)，同一 SKU 的多个候选共享一次调用
+        shared_tasks: dict[Hashable, asyncio.Task] = {}
+        # 运费报价按 (SKU, 数量) 去重，并把同一轮就绪的候选合并为一次批量报价
+        shipping_loader = _shipping_batch_loader(destination_country)
+
+        # 对每个候选进行核验（增加到 15 个以便生成多个方案），候选之间并发执行
+        results = await asyncio.gather(*(
+            _verify_one(
+                candidate,
+                mission=mission,
+                destination_country=destination_country,
+                budget_amount=budget_amount,
+                quantity=quantity,
+                shared_tasks=shared_tasks,
+                shipping_loader=shipping_loader,
+                verify_all_checks=verify_all_checks,
+            )
+            for candidate in candidates[:15]
+        ))
+
+        # 按候选顺序汇总，tool_calls 顺序与串行执行时一致
+        for verification_result, candidate_tool_calls in results:
+            new_tool_calls.extend(candidate_tool_calls)
             # 分类结果
             if verification_result["passed"]:
                 verified_candidates.append(verification_result)
             else:
                 rejected_candidates.append(verification_result)
 
-        # 使用 LLM 进行综合排序和推荐（如果有 API Key）
-        settings = get_settings()
-        if settings.openai_api_key and verified_candidates:
+        # 使用 LLM 进行综合排序和推荐（如果有 API Key，且候选数足够值得排序）
+        llm_ranked = False
+        if (
+            settings.openai_api_key
+            and len(verified_candidates) >= settings.verifier_llm_min_candidates
+        ):
             try:
-                llm_result = await _llm_rank_candidates(mission, verified_candidates)
+                llm_result = await _llm_rank_candidates(
+                    mission, verified_candidates, settings.verifier_llm_topk,
+                )
                 if llm_result:
-                    verified_candidates = llm_result.get("ranked_candidates", verified_candidates)
+                    verified_candidates = llm_result["ranked_candidates"]
+                    llm_ranked = True
             except Exception as e:
                 logger.warning("verifier_node.llm_ranking_failed", error=str(e))
 
-        # 按价格排序作为后备
-        verified_candidates.sort(
-            key=lambda x: x.get("checks", {}).get("pricing", {}).get("total_price", float("inf"))
-        )
+        # LLM 未给出排名时按价格排序作为后备
+        if not llm_ranked:
+            verified_candidates.sort(key=_price_sort_key)
 
         logger.info(
             "verifier_node.complete",
@@ -325,40 +272,336 @@ async def verifier_node(state: AgentState) -> AgentState:
         )
 
         return {
-            **state,
             "verified_candidates": verified_candidates,
             "rejected_candidates": rejected_candidates,
-            "tool_calls": tool_calls,
-            "current_step": "verifier_complete",
+            "tool_calls": new_tool_calls,
+            "current_step": STEP_VERIFIER_COMPLETE,
             "error": None,
         }
 
     except Exception as e:
         logger.error("verifier_node.error", error=str(e))
         return {
-            **state,
             "error": str(e),
             "error_code": "INTERNAL_ERROR",
             "current_step": "verifier",
         }
 
 
-async def _llm_rank_candidates(mission: dict, candidates: list) -> dict | None:
-    """使用 LLM 对候选进行综合排序"""
+async def _verify_one(
+    candidate: dict,
+    *,
+    mission: dict,
+    destination_country: str,
+    budget_amount: float | None,
+    quantity: int,
+    shared_tasks: dict[Hashable, asyncio.Task],
+    shipping_loader: BatchLoader,
+    verify_all_checks: bool = False,
+) -> tuple[dict, list[dict]]:
+    """
+    核验单个候选：价格、合规、运输
+
+    合规调用登记在 shared_tasks 中，运费报价经 shipping_loader 合并，均由本次 verifier_node 的所有候选共享。
+    verify_all_checks 为 False 时，价格核验未通过（超预算）即返回，不再做合规 / 运输检查。
+
+    Returns:
+        (verification_result, 本候选产生的 tool_calls)
+    """
+    tool_calls: list[dict] = []
+    # 同一候选的几条 tool_call 记录共用一个时间戳
+    called_at = _now_iso()
+
+    offer_id = candidate.get("offer_id")
+    sku_id = None
+
+    # 获取默认 SKU（防御性处理：variants 可能为 None）
+    variants = candidate.get("variants") or _EMPTY_DICT
+    skus = variants.get("skus") or _EMPTY_TUPLE
+    if skus and isinstance(skus[0], dict):
+        sku_id = skus[0].get("sku_id")
+
+    logger.info("verifier_node.checking", offer_id=offer_id, sku_id=sku_id)
+
+    verification_result = {
+        "offer_id": offer_id,
+        "sku_id": sku_id,
+        "candidate": candidate,
+        "checks": {},
+        "passed": True,
+        "warnings": [],
+        "rejection_reason": None,
+    }
+
+    def downstream_checks() -> list[asyncio.Future]:
+        return [
+            _shared_call(
+                shared_tasks,
+                ("compliance", sku_id or offer_id, destination_country),
+                lambda: _cached_check_compliance(sku_id or offer_id, destination_country),
+            ),
+            shipping_loader.load((sku_id or offer_id, quantity)),
+        ]
+
+    # 受全局并发闸门和熔断器限制；异常在各自的处理分支中记录
+    # 审计模式下三项并发发出；否则先核验价格，超预算时不再发起合规 / 运输调用
+    price_call = _limited(_guarded(_PRICING_BREAKER, get_realtime_quote(
+        sku_id=sku_id or offer_id,
+        quantity=quantity,
+        destination_country=destination_country,
+    )))
+    if verify_all_checks:
+        price_result, compliance_result, shipping_result = await asyncio.gather(
+            price_call, *downstream_checks(), return_exceptions=True,
+        )
+    else:
+        (price_result,) = await asyncio.gather(price_call, return_exceptions=True)
+
+    # 1. 价格核验
+    try:
+        if isinstance(price_result, BaseException):
+            raise price_result
+
+        pricing_request = {
+            "offer_id": offer_id,
+            "sku_id": sku_id,
+            "quantity": quantity,
+            "destination_country": destination_country,
+        }
+
+        if price_result.get("ok"):
+            price_data = price_result.get("data", _EMPTY_DICT)
+            total_price = price_data.get("total_price", 0)
+            unit_price = price_data.get("unit_price")
+            stock_info = price_data.get("stock", _EMPTY_DICT)
+            stock_available = stock_info.get("quantity_available") if isinstance(stock_info, dict) else stock_info
+            
+            verification_result["checks"]["pricing"] = {
+                "passed": True,
+                "unit_price": unit_price,
+                "total_price": total_price,
+                "stock": stock_available,
+            }
+
+            # 检查是否超预算（防御性处理：budget_amount 可能为 None）
+            if budget_amount is not None and total_price > budget_amount:
+                verification_result["passed"] = False
+                verification_result["rejection_reason"] = f"Price ${total_price} exceeds budget ${budget_amount}"
+
+            tool_calls.append(_build_verifier_tool_call(
+                tool_name="pricing.get_realtime_quote",
+                request=pricing_request,
+                response_summary={
+                    "ok": True,
+                    "total_price": total_price,
+                    "unit_price": unit_price,
+                    "currency": price_data.get("currency", "USD"),
+                    "stock_available": stock_available,
+                },
+                called_at=called_at,
+            ))
+        else:
+            verification_result["checks"]["pricing"] = {"passed": False, "error": "Quote failed"}
+            verification_result["warnings"].append("Could not get real-time price")
+            # 失败路径也记录 tool_call
+            tool_calls.append(_build_verifier_tool_call(
+                tool_name="pricing.get_realtime_quote",
+                request=pricing_request,
+                response_summary={
+                    "ok": False,
+                    "error": price_result.get("error", _EMPTY_DICT).get("message", "Quote failed"),
+                },
+                called_at=called_at,
+            ))
+
+    except Exception as e:
+        logger.warning("verifier_node.price_check_failed", offer_id=offer_id, error=str(e))
+        verification_result["checks"]["pricing"] = {"passed": False, "error": str(e)}
+        # 异常路径也记录 tool_call
+        tool_calls.append(_build_verifier_tool_call(
+            tool_name="pricing.get_realtime_quote",
+            request={
+                "offer_id": offer_id,
+                "sku_id": sku_id,
+                "quantity": quantity,
+                "destination_country": destination_country,
+            },
+            response_summary={
+                "ok": False,
+                "error": str(e),
+            },
+            called_at=called_at,
+        ))
+
+    if not verify_all_checks:
+        if not verification_result["passed"]:
+            return verification_result, tool_calls
+        compliance_result, shipping_result = await asyncio.gather(
+            *downstream_checks(), return_exceptions=True,
+        )
+
+    # 2. 合规检查
+    compliance_request = {
+        "offer_id": offer_id,
+        "sku_id": sku_id,
+        "destination_country": destination_country,
+    }
+    try:
+        if isinstance(compliance_result, BaseException):
+            raise compliance_result
+
+        if compliance_result.get("ok"):
+            compliance_data = compliance_result.get("data", _EMPTY_DICT)
+            is_allowed = compliance_data.get("allowed", True)
+            issues = compliance_data.get("issues", [])
+            warnings_list = compliance_data.get("warnings", [])
+            ruleset_version = compliance_data.get("ruleset_version", "")
+            
+            verification_result["checks"]["compliance"] = {
+                "passed": is_allowed,
+                "issues": issues,
+                "required_docs": compliance_data.get("required_docs", []),
+                "warnings": warnings_list,
+            }
+
+            if not is_allowed:
+                verification_result["passed"] = False
+                reason = issues[0].get("message_en") if issues else "Compliance blocked"
+                verification_result["rejection_reason"] = reason
+
+            # 添加警告
+            for warning in warnings_list:
+                verification_result["warnings"].append(warning)
+
+            tool_calls.append(_build_verifier_tool_call(
+                tool_name="compliance.check_item",
+                request=compliance_request,
+                response_summary={
+                    "ok": True,
+                    "allowed": is_allowed,
+                    "ruleset_version": ruleset_version,
+                    "issues_count": len(issues),
+                    "warnings_count": len(warnings_list),
+                },
+                called_at=called_at,
+            ))
+        else:
+            verification_result["checks"]["compliance"] = {"passed": True, "error": "Check failed"}
+            verification_result["warnings"].append("Compliance check unavailable")
+            # 失败路径也记录 tool_call
+            tool_calls.append(_build_verifier_tool_call(
+                tool_name="compliance.check_item",
+                request=compliance_request,
+                response_summary={
+                    "ok": False,
+                    "error": compliance_result.get("error", _EMPTY_DICT).get("message", "Check failed"),
+                },
+                called_at=called_at,
+            ))
+
+    except Exception as e:
+        logger.warning("verifier_node.compliance_check_failed", offer_id=offer_id, error=str(e))
+        verification_result["checks"]["compliance"] = {"passed": True, "error": str(e)}
+        verification_result["warnings"].append("Compliance check unavailable")
+        # 异常路径也记录 tool_call
+        tool_calls.append(_build_verifier_tool_call(
+            tool_name="compliance.check_item",
+            request=compliance_request,
+            response_summary={
+                "ok": False,
+                "error": str(e),
+            },
+            called_at=called_at,
+        ))
+
+    # 3. 运输检查
+    shipping_request = {
+        "offer_id": offer_id,
+        "sku_id": sku_id,
+        "quantity": quantity,
+        "destination_country": destination_country,
+    }
+    try:
+        if isinstance(shipping_result, BaseException):
+            raise shipping_result
+
+        if shipping_result.get("ok"):
+            shipping_data = shipping_result.get("data", _EMPTY_DICT)
+            options = shipping_data.get("options", _EMPTY_TUPLE)
+            options_count = len(options)
+            fastest_days, cheapest_price = _fastest_and_cheapest(options)
+            
+            verification_result["checks"]["shipping"] = {
+                "passed": options_count > 0,
+                "options_count": options_count,
+                "fastest_days": fastest_days,
+                "cheapest_price": cheapest_price,
+            }
+
+            # 检查是否能在期限内送达
+            arrival_max = mission.get("arrival_days_max")
+            if arrival_max and fastest_days > arrival_max:
+                verification_result["warnings"].append(
+                    f"Fastest shipping ({fastest_days} days) exceeds deadline ({arrival_max} days)"
+                )
+
+            tool_calls.append(_build_verifier_tool_call(
+                tool_name="shipping.quote_options",
+                request=shipping_request,
+                response_summary={
+                    "ok": True,
+                    "options_count": options_count,
+                    "fastest_days": fastest_days,
+                    "cheapest_price": cheapest_price,
+                },
+                called_at=called_at,
+            ))
+        else:
+            verification_result["checks"]["shipping"] = {"passed": True, "error": "Quote failed"}
+            # 失败路径也记录 tool_call
+            tool_calls.append(_build_verifier_tool_call(
+                tool_name="shipping.quote_options",
+                request=shipping_request,
+                response_summary={
+                    "ok": False,
+                    "error": shipping_result.get("error", _EMPTY_DICT).get("message", "Quote failed"),
+                },
+                called_at=called_at,
+            ))
+
+    except Exception as e:
+        logger.warning("verifier_node.shipping_check_failed", offer_id=offer_id, error=str(e))
+        verification_result["checks"]["shipping"] = {"passed": True, "error": str(e)}
+        # 异常路径也记录 tool_call
+        tool_calls.append(_build_verifier_tool_call(
+            tool_name="shipping.quote_options",
+            request=shipping_request,
+            response_summary={
+                "ok": False,
+                "error": str(e),
+            },
+            called_at=called_at,
+        ))
+
+    return verification_result, tool_calls
+
+
+async def _llm_rank_candidates(mission: dict, candidates: list, top_k: int = 5) -> dict | None:
+    """使用 LLM 对候选进行综合排序（只把价格最低的 top_k 个候选放进 prompt）"""
     try:
         # 简化候选信息
         simplified_candidates = []
-        for c in candidates:
+        for c in sorted(candidates, key=_price_sort_key)[:top_k]:
             # 防御性处理：titles 可能为 None 或空数组
-            candidate_data = c.get("candidate") or {}
-            titles = candidate_data.get("titles") or []
+            candidate_data = c.get("candidate") or _EMPTY_DICT
+            titles = candidate_data.get("titles") or _EMPTY_TUPLE
             title_text = ""
             if titles and isinstance(titles[0], dict):
                 title_text = titles[0].get("text", "")
             
-            checks = c.get("checks") or {}
-            pricing = checks.get("pricing") or {}
-            shipping = checks.get("shipping") or {}
+            checks = c.get("checks") or _EMPTY_DICT
+            pricing = checks.get("pricing") or _EMPTY_DICT
+            shipping = checks.get("shipping") or _EMPTY_DICT
             
             simplified_candidates.append({
                 "offer_id": c.get("offer_id"),
@@ -370,7 +613,10 @@ async def _llm_rank_candidates(mission: dict, candidates: list) -> dict | None:
 
         messages = [
             {"role": "system", "content": VERIFIER_PROMPT},
-            {"role": "user", "content": f"Mission: {mission}\n\nCandidates: {simplified_candidates}"},
+            # 紧凑且确定的 JSON：输入 token 更少，相同输入也能命中 LLM 响应缓存
+            {"role": "user", "content": orjson.dumps(
+                {"mission": mission, "candidates": simplified_candidates}, default=str,
+            ).decode()},
         ]
 
         result = await call_llm_and_parse(
@@ -378,33 +624,69 @@ async def _llm_rank_candidates(mission: dict, candidates: list) -> dict | None:
             output_schema=VerificationResult,
             model_type="planner",
             temperature=0.0,
+            max_tokens=MAX_TOKENS["verifier"],
         )
 
-        if result:
-            return {"ranked_candidates": candidates, "llm_recommendation": result}
-        return None
+        if not result or not result.rankings:
+            return None
+
+        # LLM 排过名的候选按名次在前，其余候选按价格排在后面
+        ranks = {r.offer_id: r.rank for r in result.rankings}
+        ranked_candidates = sorted(
+            candidates,
+            key=lambda c: (ranks.get(c.get("offer_id"), _INF), _price_sort_key(c)),
+        )
+        return {"ranked_candidates": ranked_candidates, "llm_recommendation": result}
 
     except Exception as e:
         logger.warning("_llm_rank_candidates.failed", error=str(e))
         return None
 
 
+_INF = float("inf")
+
+
+def _fastest_and_cheapest(options: Sequence[dict]) -> tuple[Any, Any]:
+    """一次遍历求最短时效和最低运费（无选项时为 99 天 / 999）"""
+    it = iter(options)
+    first = next(it, None)
+    if first is None:
+        return 99, 999
+    fastest_days = first.get("eta_min_days", 99)
+    cheapest_price = first.get("price", 999)
+    for o in it:
+        days = o.get("eta_min_days", 99)
+        price = o.get("price", 999)
+        if days < fastest_days:
+            fastest_days = days
+        if price < cheapest_price:
+            cheapest_price = price
+    return fastest_days, cheapest_price
+
+
+def _price_sort_key(verification_result: dict) -> float:
+    """按核验得到的总价排序，缺失价格的候选排在最后"""
+    pricing = verification_result["checks"].get("pricing")
+    if pricing is None:
+        return _INF
+    return pricing.get("total_price", _INF)
+
+
 def _now_iso() -> str:
     """返回当前时间的 ISO 格式"""
-    from datetime import datetime
     return datetime.now(UTC).isoformat()
 
 
 def _generate_tool_id() -> str:
     """生成唯一的工具调用 ID"""
-    import uuid
-    return f"tc_{uuid.uuid4().hex[:12]}"
+    return f"tc_{_RUN_NONCE}{next(_TOOL_COUNTER):08x}"
 
 
 def _build_verifier_tool_call(
     tool_name: str,
     request: dict,
     response_summary: dict,
+    called_at: str | None = None,
 ) -> dict:
     """
     构建 Verifier 工具调用记录（统一结构）
@@ -416,5 +698,5 @@ def _build_verifier_tool_call(
         "tool_name": tool_name,
         "request": request,
         "response_summary": response_summary,
-        "called_at": _now_iso(),
+        "called_at": called_at or _now_iso(),
     }
@@ -0,0 +1,22 @@
+"""
+测试公共配置
+"""
+
+import os
+
+import pytest
+
+# tools.base 在导入时读取 MOCK_TOOLS，必须在测试模块导入 src 之前设置
+os.environ["MOCK_TOOLS"] = "true"
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    """异步测试统一跑在 asyncio 上；session 作用域让所有测试共用一个事件循环"""
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def _mock_env(monkeypatch):
+    """每个测试内 MOCK_TOOLS 固定为 true，测试中的修改在结束后自动还原"""
+    monkeypatch.setenv("MOCK_TOOLS", "true")
@@ -4,25 +4,204 @@ Agent 流程集成测试
 测试完整的购物代理流程：Intent → Candidate → Verify → Plan → Execute
 """
 
-import os
+import asyncio
+import copy
+from collections.abc import Mapping
+from dataclasses import dataclass
+from operator import attrgetter
+from types import MappingProxyType
+from typing import Any
 
 import pytest
-from langchain_core.messages import HumanMessage
-
-# 设置测试环境使用 mock
-os.environ["MOCK_TOOLS"] = "true"
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.candidate.node import _local_relevance, candidate_node
+from src.compliance.node import _validate_compliance_input, compliance_node
+from src.config import get_settings
+from src.execution.execution_node import execution_node
+from src.execution.payment_node import payment_node
+from src.execution.plan_node import plan_node
+from src.execution.score import rank_by_weighted_score
+from src.graph.state import (
+    STEP_CANDIDATE_COMPLETE,
+    STEP_COMPLIANCE_COMPLETE,
+    STEP_INTENT_COMPLETE,
+    STEP_PAYMENT_READY,
+    STEP_PLAN_COMPLETE,
+)
+from src.intent import intent_node
+from src.intent.node import detect_language_fast
+from src.llm import client
+from src.llm.schemas import (
+    CandidateRelevanceResult,
+    ComplianceAnalysis,
+    ComplianceIssue,
+    DeliveryEstimate,
+    MissionParseResult,
+    ObjectiveWeights,
+    PaymentResult,
+    PlanItem,
+    PurchasePlan,
+    TotalBreakdown,
+)
+from src.orchestrator.session import Session, SessionManager
+from src.tools import base, catalog, compliance, shipping
+from src.tools import breaker as breaker_module
+from src.tools.base import mock_response
+from src.tools.batch import BatchLoader
+from src.tools.breaker import CircuitBreaker
+from src.tools.knowledge import search_knowledge, search_with_context
+from src.verifier import node
+
+pytestmark = pytest.mark.anyio
+
+# 测试只读取消息内容，共用同一个实例
+_FIXED_QUERY_MSG = HumanMessage(
+    content="I need a wireless charger for iPhone, budget $50, shipping to Germany"
+)
+
+
+def _clone_state(template: Mapping[str, Any], **overrides: Any) -> dict[str, Any]:
+    """从只读模板复制一份可修改的状态（顶层列表单独复制，节点追加时不会污染模板）"""
+    state = {k: list(v) if isinstance(v, list) else v for k, v in template.items()}
+    state.update(overrides)
+    return state
+
+
+# 节点测试共用的状态骨架，各 fixture 只写差异部分
+_BASE_STATE = MappingProxyType({
+    "mission": MappingProxyType({
+        "destination_country": "US",
+        "budget_amount": 100.0,
+        "quantity": 1,
+    }),
+    "tool_calls": [],
+})
+
+
+def _state(mission: Mapping[str, Any] | None = None, **overrides: Any) -> dict[str, Any]:
+    """基于 _BASE_STATE 构建节点输入，mission 按字段合并"""
+    return _clone_state(
+        _BASE_STATE,
+        mission={**_BASE_STATE["mission"], **(mission or {})},
+        **overrides,
+    )
+
+
+@pytest.fixture
+def plan_state():
+    """Plan 节点输入：一个已通过校验的候选"""
+    return _state(
+        mission={"objective_weights": {"price": 0.4, "speed": 0.3, "risk": 0.3}},
+        verified_candidates=[
+            {
+                "offer_id": "of_001",
+                "sku_id": "sku_001",
+                "candidate": {
+                    "titles": [{"lang": "en", "text": "Test Product"}],
+                },
+                "checks": {
+                    "pricing": {"passed": True, "unit_price": 29.99, "total_price": 29.99},
+                    "shipping": {"passed": True, "fastest_days": 5, "cheapest_price": 9.99},
+                    "compliance": {"passed": True, "issues": []},
+                },
+                "warnings": [],
+                "passed": True,
+            },
+        ],
+        current_step="verifier_complete",
+        token_used=0,
+    )
+
+
+@pytest.fixture
+def execution_state():
+    """Execution 节点输入：一个待下单的方案"""
+    return _state(
+        plans=[
+            {
+                "plan_name": "Budget Saver",
+                "plan_type": "cheapest",
+                "items": [
+                    {
+                        "offer_id": "of_001",
+                        "sku_id": "sku_001",
+                        "quantity": 1,
+                        "unit_price": 29.99,
+                        "subtotal": 29.99,
+                    },
+                ],
+                "shipping_option_id": "ship_standard",
+                "shipping_option_name": "Standard Shipping",
+                "total": {
+                    "subtotal": 29.99,
+                    "shipping_cost": 9.99,
+                    "tax_estimate": 3.20,
+                    "total_landed_cost": 43.18,
+                },
+                "delivery": {"min_days": 5, "max_days": 12},
+                "risks": [],
+                "confidence": 0.8,
+                "confirmation_items": ["Tax estimate acknowledgment"],
+            },
+        ],
+        recommended_plan="Budget Saver",
+        current_step="plan_complete",
+    )
+
+
+@pytest.fixture
+def compliance_state():
+    """Compliance 节点输入：带电池风险标签的候选"""
+    return _state(
+        mission={"destination_country": "DE"},
+        candidates=[
+            {
+                "offer_id": "of_001",
+                "variants": {"skus": [{"sku_id": "sku_001"}]},
+                "risk_tags": ["battery_included"],
+                "certifications": [],
+                "category": {"id": "cat_electronics"},
+            },
+        ],
+        current_step="candidate_complete",
+    )
+
+
+@pytest.fixture
+def payment_state():
+    """Payment 节点输入：确认项已全部勾选"""
+    return {
+        "draft_order_id": "do_test123",
+        "execution_result": {
+            "confirmation_items": ["tax_estimate_ack"],
+            "payable_amount": 99.99,
+        },
+        "user_confirmation": {
+            "tax_estimate_ack": True,
+        },
+        "tool_calls": [],
+    }
+
+
+@pytest.fixture(scope="module")
+def baseline_session():
+    """只读基准会话（模块内只构建一次，需要修改时先 deepcopy）"""
+    return Session(
+        session_id="sess_test",
+        user_id="user_001",
+        token_budget=1000,
+    )
 
 
 class TestAgentFlow:
     """测试 Agent 流程"""
 
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def initial_state(self):
-        """创建初始状态"""
-        return {
-            "messages": [
-                HumanMessage(content="I need a wireless charger for iPhone, budget $50, shipping to Germany"),
-            ],
+        """初始状态模板（模块内只构建一次，测试中用 _clone_state 复制）"""
+        return MappingProxyType({
+            "messages": [_FIXED_QUERY_MSG],
             "mission": None,
             "candidates": [],
             "verified_candidates": [],
@@ -30,12 +209,12 @@ class TestAgentFlow:
             "current_step": "start",
             "token_used": 0,
             "error": None,
-        }
+        })
 
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def chinese_single_item_state(self):
-        """创建中文单品请求的初始状态"""
-        return {
+        """中文单品请求的初始状态模板"""
+        return MappingProxyType({
             "messages": [
                 HumanMessage(content="我要一个黑色夹克，送到新加坡，500 美元以内"),
             ],
@@ -46,39 +225,33 @@ class TestAgentFlow:
             "current_step": "start",
             "token_used": 0,
             "error": None,
-        }
+        })
 
-    @pytest.mark.asyncio
-    async def test_intent_node_mock(self, initial_state):
+    async def test_intent_node_mock(self, initial_state, monkeypatch):
         """测试 Intent 节点（mock 模式）"""
         # 确保没有 API key 使用 mock
-        os.environ.pop("OPENAI_API_KEY", None)
-
-        from src.intent import intent_node
+        monkeypatch.delenv("OPENAI_API_KEY", raising=False)
 
-        result = await intent_node(initial_state)
+        result = await intent_node(_clone_state(initial_state))
 
         assert result["error"] is None
         assert result["mission"] is not None
-        assert result["current_step"] == "intent_complete"
+        assert result["current_step"] == STEP_INTENT_COMPLETE
 
         mission = result["mission"]
         assert mission["destination_country"] == "DE"  # Germany
         assert mission["budget_amount"] == 50.0
 
-    @pytest.mark.asyncio
-    async def test_intent_node_chinese_single_item(self, chinese_single_item_state):
+    async def test_intent_node_chinese_single_item(self, chinese_single_item_state, monkeypatch):
         """测试 Intent 节点处理中文单品请求"""
         # 确保没有 API key 使用 mock
-        os.environ.pop("OPENAI_API_KEY", None)
-
-        from src.intent import intent_node
+        monkeypatch.delenv("OPENAI_API_KEY", raising=False)
 
-        result = await intent_node(chinese_single_item_state)
+        result = await intent_node(_clone_state(chinese_single_item_state))
 
         assert result["error"] is None
         assert result["mission"] is not None
-        assert result["current_step"] == "intent_complete"
+        assert result["current_step"] == STEP_INTENT_COMPLETE
 
         mission = result["mission"]
         # 验证国家检测：新加坡 -> SG
@@ -91,13 +264,10 @@ class TestAgentFlow:
         # 验证语言检测
         assert mission["detected_language"] == "zh"
 
-    @pytest.mark.asyncio
     async def test_candidate_node_mock(self, initial_state):
         """测试 Candidate 节点（mock 模式）"""
-        from src.candidate.node import candidate_node
-
         # 设置 mission
-        initial_state["mission"] = {
+        state = _clone_state(initial_state, mission={
             "search_query": "wireless charger iPhone",
             "destination_country": "DE",
             "budget_amount": 50.0,
@@ -107,189 +277,271 @@ class TestAgentFlow:
             ],
             "soft_preferences": [],
             "objective_weights": {"price": 0.4, "speed": 0.3, "risk": 0.3},
-        }
+        })
 
-        result = await candidate_node(initial_state)
+        result = await candidate_node(state)
 
-        assert result["error"] is None or result.get("candidates") is not None
-        assert result["current_step"] in ["candidate_complete", "candidate"]
+        assert result["error"] is None
+        assert result["current_step"] == STEP_CANDIDATE_COMPLETE
 
-    @pytest.mark.asyncio
-    async def test_plan_node_mock(self):
-        """测试 Plan 节点"""
-        from src.execution.plan_node import plan_node
+        offer_ids = [c["offer_id"] for c in result["candidates"]]
+        assert offer_ids
+        assert len(set(offer_ids)) == len(offer_ids)
 
-        state = {
-            "mission": {
-                "destination_country": "US",
-                "budget_amount": 100.0,
-                "quantity": 1,
-                "objective_weights": {"price": 0.4, "speed": 0.3, "risk": 0.3},
-            },
-            "verified_candidates": [
-                {
-                    "offer_id": "of_001",
-                    "sku_id": "sku_001",
-                    "candidate": {
-                        "titles": [{"lang": "en", "text": "Test Product"}],
-                    },
-                    "checks": {
-                        "pricing": {"passed": True, "unit_price": 29.99, "total_price": 29.99},
-                        "shipping": {"passed": True, "fastest_days": 5, "cheapest_price": 9.99},
-                        "compliance": {"passed": True, "issues": []},
-                    },
-                    "warnings": [],
-                    "passed": True,
-                },
-            ],
-            "current_step": "verifier_complete",
-            "token_used": 0,
-        }
-
-        result = await plan_node(state)
+    async def test_plan_node_mock(self, plan_state):
+        """测试 Plan 节点"""
+        result = await plan_node(plan_state)
 
         assert result["error"] is None
         assert len(result["plans"]) > 0
-        assert result["current_step"] == "plan_complete"
+        assert result["current_step"] == STEP_PLAN_COMPLETE
 
         plan = result["plans"][0]
         assert "plan_name" in plan
         assert "items" in plan
         assert "total" in plan
 
-    @pytest.mark.asyncio
-    async def test_execution_node_mock(self):
+    async def test_execution_node_mock(self, execution_state):
         """测试 Execution 节点（mock 模式）"""
-        from src.execution.execution_node import execution_node
-
-        state = {
-            "mission": {
-                "destination_country": "US",
-                "budget_amount": 100.0,
-                "quantity": 1,
-            },
-            "plans": [
-                {
-                    "plan_name": "Budget Saver",
-                    "plan_type": "cheapest",
-                    "items": [
-                        {
-                            "offer_id": "of_001",
-                            "sku_id": "sku_001",
-                            "quantity": 1,
-                            "unit_price": 29.99,
-                            "subtotal": 29.99,
-                        },
-                    ],
-                    "shipping_option_id": "ship_standard",
-                    "shipping_option_name": "Standard Shipping",
-                    "total": {
-                        "subtotal": 29.99,
-                        "shipping_cost": 9.99,
-                        "tax_estimate": 3.20,
-                        "total_landed_cost": 43.18,
-                    },
-                    "delivery": {"min_days": 5, "max_days": 12},
-                    "risks": [],
-                    "confidence": 0.8,
-                    "confirmation_items": ["Tax estimate acknowledgment"],
-                },
-            ],
-            "recommended_plan": "Budget Saver",
-            "current_step": "plan_complete",
-            "tool_calls": [],
-        }
-
-        result = await execution_node(state)
+        result = await execution_node(execution_state)
 
         # 由于使用 mock，可能会失败
         # 但测试结构是正确的
         assert "current_step" in result
         assert "error" in result
 
+    async def test_independent_nodes_run_concurrently(
+        self, plan_state, execution_state, compliance_state, payment_state
+    ):
+        """互不依赖的节点在同一事件循环上并发执行，结果与单独运行一致"""
+        plan, execution, compliance, payment = await asyncio.gather(
+            plan_node(plan_state),
+            execution_node(execution_state),
+            compliance_node(compliance_state),
+            payment_node(payment_state),
+        )
+
+        assert plan["current_step"] == STEP_PLAN_COMPLETE
+        assert "current_step" in execution
+        assert compliance["current_step"] == STEP_COMPLIANCE_COMPLETE
+        assert payment["current_step"] in [STEP_PAYMENT_READY, "payment"]
+
 
 class TestComplianceNode:
     """测试 Compliance Agent 节点"""
 
-    @pytest.mark.asyncio
-    async def test_compliance_node_basic(self):
+    async def test_compliance_node_basic(self, compliance_state):
         """测试 Compliance 节点基本功能"""
-        from src.compliance.node import compliance_node
+        result = await compliance_node(compliance_state)
+
+        assert result["current_step"] == STEP_COMPLIANCE_COMPLETE
+        assert "compliance_results" in result or "blocked_candidates" in result
+        assert "compliance_summary" in result
+
+    def test_compliance_node_no_candidates(self):
+        """测试 Compliance 节点无候选时的处理"""
+        result = _validate_compliance_input(_state(candidates=[]))
+
+        assert result["error"] is not None
+        assert result["error_code"] == "INVALID_ARGUMENT"
+        assert _validate_compliance_input(_state(candidates=[{"offer_id": "of_001"}])) is None
+
+    async def test_mock_responses_are_not_shared(self):
+        """Mock 响应每次新建，调用方修改嵌套字段不影响后续调用"""
+        first = await compliance.get_risk_tags()
+        first["data"]["risk_tags"][0]["severity"] = "critical"
+        version = await compliance.get_policy_ruleset_version()
+        version["data"]["features"].append("annotated")
+        quote = await shipping.quote_shipping_options(items=[{"sku_id": "sku_001", "qty": 1}], per_item=True)
+        quote["data"]["item_quotes"][0]["options"][0]["price"] = 0
+
+        assert (await compliance.get_risk_tags())["data"]["risk_tags"][0]["severity"] == "warning"
+        assert "annotated" not in (await compliance.get_policy_ruleset_version())["data"]["features"]
+        fresh = await shipping.quote_shipping_options(items=[{"sku_id": "sku_001", "qty": 1}])
+        assert fresh["data"]["options"][0]["price"] == 5.99
+
+    async def test_risk_prefilter_skips_rpc_without_keywords(self, monkeypatch):
+        """预筛无命中时不发 analyze_product_risks，返回不带 snapshot_id 的本地响应"""
+        monkeypatch.setattr(base, "MOCK_MODE", False)
+        monkeypatch.setattr(compliance, "MOCK_MODE", False)
+        monkeypatch.setattr(compliance, "_risk_matcher", None)
+        rpc_calls = []
+
+        async def fake_call_tool(mcp_server, tool_name, params, user_id=None, **kwargs):
+            rpc_calls.append(tool_name)
+            if tool_name == "compliance.policy_ruleset_version":
+                return mock_response({"version": "cr_prefilter_test"})
+            if tool_name == "compliance.get_risk_tags":
+                return mock_response({"risk_tags": [{"id": "battery_included", "detection_keywords": ["battery"]}]})
+            return mock_response({"detected_risks": [{"tag_id": "battery_included"}]})
+
+        monkeypatch.setattr(compliance, "call_tool", fake_call_tool)
+        compliance.get_policy_ruleset_version.cache_clear()
+        compliance.get_risk_tags.cache_clear()
+
+        clean = await compliance.analyze_product_risks("Cotton t-shirt", title="Plain tee")
+        risky = await compliance.analyze_product_risks("Comes with a spare battery")
+        compliance.get_policy_ruleset_version.cache_clear()
+        compliance.get_risk_tags.cache_clear()
+
+        assert clean["data"]["detected_risks"] == []
+        assert "snapshot_id" not in clean["evidence"]
+        assert risky["data"]["detected_risks"] == [{"tag_id": "battery_included"}]
+        assert rpc_calls == [
+            "compliance.policy_ruleset_version",
+            "compliance.get_risk_tags",
+            "compliance.analyze_product_risks",
+        ]
+
+
+class TestVerifierNode:
+    """测试 Verifier Agent 节点"""
+
+    async def test_duplicate_sku_shares_compliance_call(self, monkeypatch):
+        """同一 SKU 的多个候选只发起一次合规检查，结果按候选顺序返回"""
+        compliance_calls = []
+
+        async def fake_check_compliance(sku_id, destination_country, **kwargs):
+            compliance_calls.append((sku_id, destination_country))
+            return mock_response({"allowed": True, "ruleset_version": "test"})
+
+        monkeypatch.setattr(node, "check_compliance", fake_check_compliance)
 
         state = {
-            "mission": {
-                "destination_country": "DE",
-                "budget_amount": 100.0,
-                "quantity": 1,
-            },
+            "mission": {"destination_country": "US", "budget_amount": 1000.0, "quantity": 1},
             "candidates": [
-                {
-                    "offer_id": "of_001",
-                    "variants": {"skus": [{"sku_id": "sku_001"}]},
-                    "risk_tags": ["battery_included"],
-                    "certifications": [],
-                    "category": {"id": "cat_electronics"},
-                },
+                {"offer_id": f"of_00{i}", "variants": {"skus": [{"sku_id": "sku_shared"}]}}
+                for i in range(3)
             ],
             "tool_calls": [],
-            "current_step": "candidate_complete",
         }
 
-        result = await compliance_node(state)
+        result = await node.verifier_node(state)
 
-        assert result["current_step"] == "compliance_complete"
-        assert "compliance_results" in result or "blocked_candidates" in result
-        assert "compliance_summary" in result
+        assert compliance_calls == [("sku_shared", "US")]
+        checked = result["verified_candidates"] + result["rejected_candidates"]
+        assert sorted(c["offer_id"] for c in checked) == ["of_000", "of_001", "of_002"]
+        assert len(result["tool_calls"]) == 9
 
-    @pytest.mark.asyncio
-    async def test_compliance_node_no_candidates(self):
-        """测试 Compliance 节点无候选时的处理"""
-        from src.compliance.node import compliance_node
+    async def test_shipping_quotes_batched_per_destination(self, monkeypatch):
+        """不同 SKU 的运费报价合并为一次 per_item 请求"""
+        shipping_calls = []
+
+        async def fake_quote_shipping_options(items, destination_country="US", per_item=False, **kwargs):
+            shipping_calls.append(([item["sku_id"] for item in items], per_item))
+            return await shipping.quote_shipping_options(
+                items=items, destination_country=destination_country, per_item=per_item,
+            )
+
+        monkeypatch.setattr(node, "quote_shipping_options", fake_quote_shipping_options)
 
         state = {
-            "mission": {"destination_country": "US"},
-            "candidates": [],
+            "mission": {"destination_country": "US", "budget_amount": 1000.0, "quantity": 1},
+            "candidates": [
+                {"offer_id": f"of_00{i}", "variants": {"skus": [{"sku_id": f"sku_00{i}"}]}}
+                for i in range(3)
+            ],
             "tool_calls": [],
         }
 
-        result = await compliance_node(state)
+        result = await node.verifier_node(state)
 
-        assert result["error"] is not None
-        assert result["error_code"] == "INVALID_ARGUMENT"
+        assert shipping_calls == [(["sku_000", "sku_001", "sku_002"], True)]
+        checked = result["verified_candidates"] + result["rejected_candidates"]
+        assert all(c["checks"]["shipping"]["options_count"] == 2 for c in checked)
 
+    async def test_compliance_cache_keyed_by_ruleset_version(self, monkeypatch):
+        """规则版本变化后合规结论重新回源，不复用旧版本的结果"""
+        monkeypatch.setattr(base, "MOCK_MODE", False)
+        version = ["cr_v1"]
+        compliance_calls = []
 
-class TestPaymentNode:
-    """测试 Payment Agent 节点"""
+        async def fake_resolve_ruleset_version():
+            return version[0]
 
-    @pytest.mark.asyncio
-    async def test_payment_node_basic(self):
-        """测试 Payment 节点基本功能"""
-        from src.execution.payment_node import payment_node
+        async def fake_check_compliance(sku_id, destination_country, **kwargs):
+            compliance_calls.append(version[0])
+            return mock_response({"allowed": True, "ruleset_version": version[0]})
+
+        monkeypatch.setattr(node, "resolve_ruleset_version", fake_resolve_ruleset_version)
+        monkeypatch.setattr(node, "check_compliance", fake_check_compliance)
+
+        await node._cached_check_compliance("sku_version_test", "US")
+        await node._cached_check_compliance("sku_version_test", "US")
+        version[0] = "cr_v2"
+        await node._cached_check_compliance("sku_version_test", "US")
+
+        assert compliance_calls == ["cr_v1", "cr_v2"]
+
+    async def test_compliance_resolves_ruleset_version_once(self, monkeypatch):
+        """每个 SKU 只发一次 check_item，规则版本在进程内只查询一次"""
+        monkeypatch.setattr(base, "MOCK_MODE", False)
+        monkeypatch.setattr(compliance, "MOCK_MODE", False)
+        rpc_calls = []
+
+        async def fake_call_tool(mcp_server, tool_name, params, user_id=None, **kwargs):
+            rpc_calls.append(tool_name)
+            if tool_name == "compliance.policy_ruleset_version":
+                return mock_response({"version": "cr_rpc_test"})
+            return mock_response({"allowed": True})
+
+        monkeypatch.setattr(base, "call_tool", fake_call_tool)
+        monkeypatch.setattr(compliance, "call_tool", fake_call_tool)
+        compliance.get_policy_ruleset_version.cache_clear()
+
+        await node._cached_check_compliance("sku_rpc_001", "US")
+        await node._cached_check_compliance("sku_rpc_002", "US")
+        compliance.get_policy_ruleset_version.cache_clear()
+
+        assert rpc_calls == [
+            "compliance.policy_ruleset_version",
+            "compliance.check_item",
+            "compliance.check_item",
+        ]
+
+    async def test_over_budget_skips_downstream_checks(self, monkeypatch):
+        """超预算的候选直接拒绝，不再发起合规检查"""
+        compliance_calls = []
+
+        async def fake_get_realtime_quote(sku_id, quantity, destination_country, **kwargs):
+            return mock_response({"unit_price": 50.0, "total_price": 50.0 * quantity})
+
+        async def fake_check_compliance(sku_id, destination_country, **kwargs):
+            compliance_calls.append(sku_id)
+            raise AssertionError("compliance should not be checked")
+
+        monkeypatch.setattr(node, "get_realtime_quote", fake_get_realtime_quote)
+        monkeypatch.setattr(node, "check_compliance", fake_check_compliance)
 
         state = {
-            "draft_order_id": "do_test123",
-            "execution_result": {
-                "confirmation_items": ["tax_estimate_ack"],
-                "payable_amount": 99.99,
-            },
-            "user_confirmation": {
-                "tax_estimate_ack": True,
-            },
+            "mission": {"destination_country": "US", "budget_amount": 10.0, "quantity": 1},
+            "candidates": [{"offer_id": "of_001", "variants": {"skus": [{"sku_id": "sku_001"}]}}],
             "tool_calls": [],
         }
 
-        result = await payment_node(state)
+        result = await node.verifier_node(state)
+
+        assert compliance_calls == []
+        assert result["verified_candidates"] == []
+        rejected = result["rejected_candidates"][0]
+        assert "exceeds budget" in rejected["rejection_reason"]
+        assert "compliance" not in rejected["checks"]
+
 
-        assert result["current_step"] in ["payment_ready", "payment"]
-        if result["current_step"] == "payment_ready":
+class TestPaymentNode:
+    """测试 Payment Agent 节点"""
+
+    async def test_payment_node_basic(self, payment_state):
+        """测试 Payment 节点基本功能"""
+        result = await payment_node(payment_state)
+
+        assert result["current_step"] in [STEP_PAYMENT_READY, "payment"]
+        if result["current_step"] == STEP_PAYMENT_READY:
             assert "payment_ready" in result
             assert result["payment_ready"]["ready"] is True
 
-    @pytest.mark.asyncio
     async def test_payment_node_missing_confirmation(self):
         """测试 Payment 节点缺少确认时的处理"""
-        from src.execution.payment_node import payment_node
-
         state = {
             "draft_order_id": "do_test123",
             "execution_result": {
@@ -314,8 +566,6 @@ class TestSessionManager:
 
     def test_session_creation(self):
         """测试创建会话"""
-        from src.orchestrator.session import SessionManager
-
         manager = SessionManager()
         session = manager.create_session(user_id="user_001")
 
@@ -323,15 +573,9 @@ class TestSessionManager:
         assert session.user_id == "user_001"
         assert session.token_remaining > 0
 
-    def test_session_token_budget(self):
+    def test_session_token_budget(self, baseline_session):
         """测试 Token 预算控制"""
-        from src.orchestrator.session import Session
-
-        session = Session(
-            session_id="sess_test",
-            user_id="user_001",
-            token_budget=1000,
-        )
+        session = copy.deepcopy(baseline_session)
 
         assert session.can_afford_tokens(500) is True
         assert session.can_afford_tokens(1500) is False
@@ -340,30 +584,68 @@ class TestSessionManager:
         assert session.token_remaining == 200
         assert session.can_afford_tokens(300) is False
 
-    def test_session_serialization(self):
-        """测试会话序列化"""
-        from src.orchestrator.session import Session
+    def test_expired_session_cleanup(self):
+        """只清理已过期的会话，touch 后的旧索引条目被忽略"""
+        manager = SessionManager()
+        stale = manager.create_session(user_id="user_001", session_id="sess_stale")
+        active = manager.create_session(user_id="user_002", session_id="sess_active")
 
-        session = Session(
-            session_id="sess_test",
-            user_id="user_001",
-        )
+        stale.timeout_minutes = 0
+        stale.touch()
+        active.touch()
+        manager._cleanup_expired_sessions()
+
+        assert manager.get_session("sess_stale") is None
+        assert manager.get_session("sess_active") is active
 
-        data = session.to_dict()
+    async def test_failed_turn_leaves_state_untouched(self, baseline_session):
+        """Graph 执行失败时不留下孤立的用户消息和上下文"""
+        session = copy.deepcopy(baseline_session)
+        session.state = {"messages": [HumanMessage(content="hi")], "selected_plan": None}
+
+        class FailingGraph:
+            async def ainvoke(self, state, config):
+                raise RuntimeError("boom")
+
+        session._graph = FailingGraph()
+        result = await session.process_message("buy it", context={"selected_plan": "Budget Saver"})
+
+        assert result["success"] is False
+        assert [m.content for m in session.state["messages"]] == ["hi"]
+        assert session.state["selected_plan"] is None
+
+    def test_session_serialization(self, baseline_session):
+        """测试会话序列化"""
+        data = baseline_session.to_dict()
         restored = Session.from_dict(data)
 
-        assert restored.session_id == session.session_id
-        assert restored.user_id == session.user_id
+        assert restored.session_id == baseline_session.session_id
+        assert restored.user_id == baseline_session.user_id
+
+    def test_session_state_roundtrip(self, baseline_session):
+        """测试带消息和 Pydantic 对象的状态序列化"""
+        session = copy.deepcopy(baseline_session)
+        session.state = {
+            "messages": [HumanMessage(content="hi"), AIMessage(content="hello")],
+            "mission": {"destination_country": "US"},
+            "objective_weights": ObjectiveWeights(price=0.5, speed=0.3, risk=0.2),
+            "current_step": "waiting_user",
+        }
+
+        restored = Session.from_json(session.to_json())
+
+        assert [m.content for m in restored.state["messages"]] == ["hi", "hello"]
+        assert isinstance(restored.state["messages"][1], AIMessage)
+        assert restored.state["mission"] == {"destination_country": "US"}
+        assert restored.state["objective_weights"]["price"] == 0.5
+        assert restored.current_step == "waiting_user"
 
 
 class TestRAGIntegration:
     """测试 RAG 集成"""
 
-    @pytest.mark.asyncio
     async def test_knowledge_search(self):
         """测试知识库搜索"""
-        from src.tools.knowledge import search_knowledge
-
         result = await search_knowledge(
             query="wireless charger",
             limit=5,
@@ -372,11 +654,8 @@ class TestRAGIntegration:
         assert result["ok"] is True
         assert "chunks" in result["data"]
 
-    @pytest.mark.asyncio
     async def test_search_with_context(self):
         """测试带上下文的综合搜索"""
-        from src.tools.knowledge import search_with_context
-
         result = await search_with_context(
             query="iPhone charger",
             include_compliance=True,
@@ -389,98 +668,446 @@ class TestRAGIntegration:
         assert "shipping_chunks" in result["data"]
 
 
-class TestLLMSchemas:
-    """测试 LLM 输出 Schema"""
-
-    def test_mission_parse_result(self):
-        """测试 Mission 解析结果 schema"""
-        from src.llm.schemas import MissionParseResult, ObjectiveWeights
-
-        result = MissionParseResult(
-            destination_country="US",
-            budget_amount=100.0,
-            budget_currency="USD",
-            quantity=1,
-            search_query="test product",
-            objective_weights=ObjectiveWeights(price=0.4, speed=0.3, risk=0.3),
-        )
-
-        assert result.destination_country == "US"
-        assert result.budget_amount == 100.0
-        assert result.objective_weights.price == 0.4
-
-    def test_purchase_plan(self):
-        """测试购买方案 schema"""
-        from src.llm.schemas import (
-            DeliveryEstimate,
-            PlanItem,
-            PurchasePlan,
-            TotalBreakdown,
-        )
-
-        plan = PurchasePlan(
-            plan_name="Test Plan",
-            plan_type="cheapest",
-            items=[
-                PlanItem(
-                    offer_id="of_001",
-                    sku_id="sku_001",
-                    quantity=1,
-                    unit_price=29.99,
-                    subtotal=29.99,
-                )
-            ],
-            shipping_option_id="ship_001",
-            shipping_option_name="Standard",
-            total=TotalBreakdown(
+@dataclass(frozen=True)
+class _SchemaCase:
+    """一个 schema 构造用例：构造参数 + 期望的属性值（支持 a.b 形式的嵌套属性）"""
+
+    cls: type
+    kwargs: dict[str, Any]
+    expected: dict[str, Any]
+
+
+_PLAN_ITEM = PlanItem(
+    offer_id="of_001",
+    sku_id="sku_001",
+    quantity=1,
+    unit_price=29.99,
+    subtotal=29.99,
+)
+
+_COMPLIANCE_ISSUE = ComplianceIssue(
+    issue_type="certification_required",
+    severity="warning",
+    message="CE marking required for EU",
+)
+
+_SCHEMA_CASES = {
+    "mission": _SchemaCase(
+        cls=MissionParseResult,
+        kwargs={
+            "destination_country": "US",
+            "budget_amount": 100.0,
+            "budget_currency": "USD",
+            "quantity": 1,
+            "search_query": "test product",
+            "objective_weights": ObjectiveWeights(price=0.4, speed=0.3, risk=0.3),
+        },
+        expected={
+            "destination_country": "US",
+            "budget_amount": 100.0,
+            "objective_weights.price": 0.4,
+        },
+    ),
+    "plan": _SchemaCase(
+        cls=PurchasePlan,
+        kwargs={
+            "plan_name": "Test Plan",
+            "plan_type": "cheapest",
+            "items": [_PLAN_ITEM],
+            "shipping_option_id": "ship_001",
+            "shipping_option_name": "Standard",
+            "total": TotalBreakdown(
                 subtotal=29.99,
                 shipping_cost=9.99,
                 tax_estimate=3.20,
                 total_landed_cost=43.18,
             ),
-            delivery=DeliveryEstimate(min_days=5, max_days=10),
-            confidence=0.8,
-        )
+            "delivery": DeliveryEstimate(min_days=5, max_days=10),
+            "confidence": 0.8,
+        },
+        expected={
+            "plan_name": "Test Plan",
+            "items": [_PLAN_ITEM],
+            "total.total_landed_cost": 43.18,
+        },
+    ),
+    "compliance": _SchemaCase(
+        cls=ComplianceAnalysis,
+        kwargs={
+            "summary": "Product has battery restrictions",
+            "risk_level": "medium",
+            "key_issues": [_COMPLIANCE_ISSUE],
+            "required_actions": ["Obtain CE certification"],
+            "can_proceed": True,
+        },
+        expected={
+            "risk_level": "medium",
+            "key_issues": [_COMPLIANCE_ISSUE],
+            "can_proceed": True,
+        },
+    ),
+    "payment": _SchemaCase(
+        cls=PaymentResult,
+        kwargs={
+            "success": True,
+            "payment_id": "pay_123",
+            "order_id": "ord_456",
+            "status": "succeeded",
+            "amount_charged": 99.99,
+            "currency": "USD",
+        },
+        expected={
+            "success": True,
+            "order_id": "ord_456",
+        },
+    ),
+}
 
-        assert plan.plan_name == "Test Plan"
-        assert len(plan.items) == 1
-        assert plan.total.total_landed_cost == 43.18
-
-    def test_compliance_analysis(self):
-        """测试 Compliance 分析结果 schema"""
-        from src.llm.schemas import ComplianceAnalysis, ComplianceIssue
-
-        analysis = ComplianceAnalysis(
-            summary="Product has battery restrictions",
-            risk_level="medium",
-            key_issues=[
-                ComplianceIssue(
-                    issue_type="certification_required",
-                    severity="warning",
-                    message="CE marking required for EU",
-                )
-            ],
-            required_actions=["Obtain CE certification"],
-            can_proceed=True,
-        )
 
-        assert analysis.risk_level == "medium"
-        assert len(analysis.key_issues) == 1
-        assert analysis.can_proceed is True
-
-    def test_payment_result(self):
-        """测试 Payment 结果 schema"""
-        from src.llm.schemas import PaymentResult
-
-        result = PaymentResult(
-            success=True,
-            payment_id="pay_123",
-            order_id="ord_456",
-            status="succeeded",
-            amount_charged=99.99,
-            currency="USD",
-        )
+class TestLLMSchemas:
+    """测试 LLM 输出 Schema"""
+
+    @pytest.mark.parametrize("case", _SCHEMA_CASES.values(), ids=_SCHEMA_CASES.keys())
+    def test_schema_construct(self, case):
+        """按用例构造 schema 并校验字段"""
+        obj = case.cls(**case.kwargs)
+
+        for attr, expected in case.expected.items():
+            assert attrgetter(attr)(obj) == expected, attr
+
+    def test_unknown_enum_values_fall_back(self):
+        """LLM 返回枚举外的意图或操作符时回退为默认值，不影响整次解析"""
+        result = MissionParseResult.model_validate({
+            "primary_intent": "Compare",
+            "sub_tasks": [{"task_id": "task_1", "description": "x", "intent_type": "browse"}],
+            "hard_constraints": [{"type": "price", "value": "50", "operator": "lte"}],
+        })
+
+        assert result.primary_intent == "compare"
+        assert result.sub_tasks[0].intent_type == "search"
+        assert result.hard_constraints[0].operator == "eq"
+
+
+class TestLanguageDetection:
+    """测试本地快速语言检测"""
+
+    def test_detect_script_languages(self):
+        """非拉丁文字按 Unicode 区段识别"""
+        assert detect_language_fast("我要一个黑色夹克，送到新加坡，500 美元以内") == "zh"
+        assert detect_language_fast("黒いジャケットが欲しいです") == "ja"
+        assert detect_language_fast("검은색 재킷") == "ko"
+
+    def test_detect_latin_languages(self):
+        """拉丁字母文本按停用词识别"""
+        assert detect_language_fast("I need a wireless charger for iPhone, under $50") == "en"
+        assert detect_language_fast("Quiero una chaqueta negra para mi madre") == "es"
+
+    def test_uncertain_falls_back(self):
+        """过短或混合文字返回 None，交给 LLM 预处理"""
+        assert detect_language_fast("iPhone") is None
+        assert detect_language_fast("iPhone 充电器 wireless charger") is None
+        assert detect_language_fast("") is None
+
+
+class TestCandidateRelevance:
+    """测试候选相关性本地判定"""
+
+    def test_local_relevance_decisions(self):
+        """高相似度通过，明确的其他品类拒绝，其余交给 LLM"""
+        relevant, _ = _local_relevance(["sneakers", "trainers"], "nike mens running trainer white")
+        assert relevant is True
+
+        relevant, _ = _local_relevance(["charger"], "iphone 15 leather wallet case")
+        assert relevant is False
+
+        assert _local_relevance(["charger"], "iphone 15 leather case") is None
+        assert _local_relevance(["jacket"], "黑色夹克") is None
+
+
+class TestWeightedScore:
+    """测试候选综合评分"""
+
+    def test_rank_by_weighted_score(self):
+        """价格权重为主时便宜的排前，缺失 checks 按默认值处理"""
+        candidates = [
+            {"offer_id": "of_a", "checks": {"pricing": {"total_price": 400}, "shipping": {"fastest_days": 5}}},
+            {"offer_id": "of_b", "checks": {"pricing": {"total_price": 50}, "shipping": {"fastest_days": 20}}},
+            {"offer_id": "of_c", "checks": None, "warnings": None},
+        ]
+
+        ranked = rank_by_weighted_score(candidates, {"price": 1.0, "speed": 0.0, "risk": 0.0})
+        assert [c["offer_id"] for c in ranked] == ["of_b", "of_c", "of_a"]
+
+        ranked = rank_by_weighted_score(candidates, {"price": 0.0, "speed": 1.0, "risk": 0.0})
+        assert ranked[0]["offer_id"] == "of_a"
+
+
+class TestLLMResponseCache:
+    """测试 LLM 响应缓存"""
+
+    async def test_repeat_input_skips_llm(self, monkeypatch):
+        """相同输入第二次直接命中缓存，不再调用 LLM"""
+        calls = []
+
+        class FakeResponse:
+            content = '{"is_relevant": true, "reason": "same type"}'
+            usage_metadata = {"total_tokens": 42}
+
+        class FakeLLM:
+            async def ainvoke(self, messages):
+                calls.append(messages)
+                return FakeResponse()
+
+        monkeypatch.setattr(client, "get_llm", lambda **kwargs: FakeLLM())
+        client.clear_llm_cache()
+
+        messages = [{"role": "user", "content": "black jacket under $500"}]
+        first = await client.call_llm_and_parse(messages, CandidateRelevanceResult)
+        second = await client.call_llm_and_parse(messages, CandidateRelevanceResult)
+
+        assert first == second
+        assert len(calls) == 1
+        assert client.get_llm_cache_stats()["hits"] == 1
+        client.clear_llm_cache()
+
+    async def test_sampled_calls_not_cached(self, monkeypatch):
+        """temperature > 0 的调用每次都请求 LLM，不重放缓存结果"""
+        calls = []
+
+        class FakeResponse:
+            content = '{"is_relevant": true, "reason": "same type"}'
+            usage_metadata = {"total_tokens": 42}
+
+        class FakeLLM:
+            async def ainvoke(self, messages):
+                calls.append(messages)
+                return FakeResponse()
+
+        monkeypatch.setattr(client, "get_llm", lambda **kwargs: FakeLLM())
+        client.clear_llm_cache()
+
+        messages = [{"role": "user", "content": "black jacket under $500"}]
+        await client.call_llm_and_parse(messages, CandidateRelevanceResult, temperature=0.3)
+        await client.call_llm_and_parse(messages, CandidateRelevanceResult, temperature=0.3)
+
+        assert len(calls) == 2
+        assert client.get_llm_cache_stats()["size"] == 0
+
+    async def test_repeat_intent_skips_llm(self, monkeypatch):
+        """相同用户消息再次进入 Intent 节点时，意图解析直接命中缓存"""
+        calls = []
+
+        class FakeResponse:
+            content = '{"destination_country": "DE", "budget_amount": 50, "search_query": "wireless charger"}'
+            usage_metadata = {"total_tokens": 42}
+
+        class FakeLLM:
+            async def ainvoke(self, messages):
+                calls.append(messages)
+                return FakeResponse()
+
+        monkeypatch.setattr(get_settings(), "openai_api_key", "sk-test")
+        monkeypatch.setattr(client, "get_llm", lambda **kwargs: FakeLLM())
+        client.clear_llm_cache()
+
+        messages = [_FIXED_QUERY_MSG]
+        first = await intent_node({"messages": messages, "mission": None})
+        second = await intent_node({"messages": messages, "mission": None})
+
+        assert first["mission"] == second["mission"]
+        assert first["mission"]["destination_country"] == "DE"
+        assert len(calls) == 1
+        client.clear_llm_cache()
+
+
+class TestToolTTLCache:
+    """测试工具调用的进程内 TTL 缓存"""
+
+    async def test_repeat_lookup_hits_cache(self, monkeypatch):
+        """相同参数（忽略 user_id）只回源一次，失败响应不缓存"""
+        monkeypatch.setattr(base, "MOCK_MODE", False)
+        calls = []
+
+        @base.async_ttl_cache(maxsize=2, ttl=60)
+        async def lookup(country: str, user_id: str | None = None) -> dict:
+            calls.append(country)
+            return {"ok": country != "XX", "data": {"country": country}}
+
+        await lookup("US")
+        await lookup(country="US", user_id="user_002")
+        await lookup("XX")
+        await lookup("XX")
+
+        assert calls == ["US", "XX", "XX"]
+
+    async def test_failed_lookup_cached_for_error_ttl(self, monkeypatch):
+        """设置 error_ttl 时失败响应短暂缓存，过期后重新回源"""
+        monkeypatch.setattr(base, "MOCK_MODE", False)
+        now = [1000.0]
+        monkeypatch.setattr(base.time, "monotonic", lambda: now[0])
+        calls = []
+
+        @base.async_ttl_cache(ttl=300, error_ttl=30)
+        async def lookup() -> dict:
+            calls.append(now[0])
+            return {"ok": False, "error": {"code": "UPSTREAM_ERROR"}}
+
+        await lookup()
+        await lookup()
+        now[0] += 31
+        await lookup()
+
+        assert calls == [1000.0, 1031.0]
+
+    async def test_concurrent_misses_share_one_call(self, monkeypatch):
+        """缓存未命中时，相同参数的并发调用只回源一次"""
+        monkeypatch.setattr(base, "MOCK_MODE", False)
+        calls = []
+
+        @base.async_ttl_cache(ttl=60)
+        async def lookup(country: str) -> dict:
+            calls.append(country)
+            await asyncio.sleep(0)
+            return {"ok": True, "data": {"country": country}}
 
-        assert result.success is True
-        assert result.order_id == "ord_456"
+        results = await asyncio.gather(*(lookup("US") for _ in range(5)))
 
+        assert calls == ["US"]
+        assert all(r is results[0] for r in results)
+
+    async def test_cancelled_follower_does_not_cancel_shared_call(self):
+        """合并请求中一个等待方被取消，首个调用方和其他等待方照常拿到结果"""
+        release = asyncio.Event()
+        inflight = {}
+
+        async def fetch() -> dict:
+            await release.wait()
+            return {"ok": True}
+
+        leader = asyncio.create_task(base.singleflight(inflight, "k", fetch))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(base.singleflight(inflight, "k", fetch)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        followers[0].cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await leader == {"ok": True}
+        assert await followers[1] == {"ok": True}
+        assert followers[0].cancelled()
+        assert inflight == {}
+
+    def test_nested_arguments_are_hashable(self):
+        """嵌套的 list / dict 参数也能生成缓存键"""
+        key = base._freeze({"items": [{"sku_id": "sku_001", "qty": 1}]})
+
+        assert hash(key) == hash(base._freeze({"items": [{"qty": 1, "sku_id": "sku_001"}]}))
+
+
+class TestCircuitBreaker:
+    """测试下游工具熔断器"""
+
+    def test_opens_after_consecutive_failures(self, monkeypatch):
+        """连续失败达到阈值后打开，冷却期结束放行试探，成功后关闭"""
+        now = [1000.0]
+        monkeypatch.setattr(breaker_module.time, "monotonic", lambda: now[0])
+
+        breaker = CircuitBreaker("pricing", failure_threshold=2, reset_after=30)
+        breaker.record(False)
+        assert not breaker.is_open
+        breaker.record(False)
+        assert breaker.is_open
+        assert breaker.open_response()["error"]["code"] == "CIRCUIT_OPEN"
+
+        now[0] += 31
+        assert not breaker.is_open
+        breaker.record(True)
+        breaker.record(False)
+        assert not breaker.is_open
+
+
+class TestBatchLoader:
+    """测试请求合并 loader"""
+
+    async def test_concurrent_loads_coalesce(self):
+        """同一轮的并发 load 去重后合并为一次 batch 调用"""
+        batches = []
+
+        async def batch_fn(keys):
+            batches.append(list(keys))
+            return {key: key.upper() for key in keys}
+
+        loader = BatchLoader(batch_fn)
+        results = await asyncio.gather(*(loader.load(k) for k in ["a", "b", "a", "c"]))
+
+        assert results == ["A", "B", "A", "C"]
+        assert batches == [["a", "b", "c"]]
+
+    async def test_offer_cards_fetched_in_one_batch_call(self, monkeypatch):
+        """offer_card_batching 内的并发 get_offer_card 合并为一次 get_offer_cards_batch 请求"""
+        monkeypatch.setattr(catalog, "MOCK_MODE", False)
+        rpc_calls = []
+
+        async def fake_call_tool(mcp_server, tool_name, params, user_id=None, **kwargs):
+            rpc_calls.append((tool_name, params.get("offer_ids")))
+            return mock_response({
+                "cards": {"of_a": {"offer_id": "of_a"}, "of_b": {"offer_id": "of_b"}},
+                "not_found": ["of_c"],
+                "failed": [],
+            })
+
+        async def no_cache(key):
+            return None
+
+        async def skip_cache_set(key, value, ttl_seconds):
+            return None
+
+        monkeypatch.setattr(catalog, "call_tool", fake_call_tool)
+        monkeypatch.setattr(catalog, "cache_get", no_cache)
+        monkeypatch.setattr(catalog, "cache_set", skip_cache_set)
+
+        with catalog.offer_card_batching():
+            cards = await asyncio.gather(*(
+                catalog.get_offer_card(offer_id) for offer_id in ["of_a", "of_b", "of_c"]
+            ))
+
+        assert rpc_calls == [("catalog.get_offer_cards_batch", ["of_a", "of_b", "of_c"])]
+        assert [card["data"]["offer_id"] for card in cards[:2]] == ["of_a", "of_b"]
+        assert cards[2]["error"]["code"] == "NOT_FOUND"
+
+    async def test_offer_cards_fall_back_without_batch_route(self, monkeypatch):
+        """批量接口不可用时逐个调用 get_offer_card"""
+        monkeypatch.setattr(catalog, "MOCK_MODE", False)
+        monkeypatch.setattr(base, "MOCK_MODE", False)
+        rpc_calls = []
+
+        async def fake_call_tool(mcp_server, tool_name, params, user_id=None, **kwargs):
+            rpc_calls.append(tool_name)
+            if tool_name == "catalog.get_offer_cards_batch":
+                return {"ok": False, "error": {"code": "UPSTREAM_ERROR", "message": "HTTP 404"}}
+            return mock_response({"offer_id": params["offer_id"]})
+
+        async def no_cache(key):
+            return None
+
+        async def skip_cache_set(key, value, ttl_seconds):
+            return None
+
+        monkeypatch.setattr(catalog, "call_tool", fake_call_tool)
+        monkeypatch.setattr(base, "call_tool", fake_call_tool)
+        monkeypatch.setattr(catalog, "cache_get", no_cache)
+        monkeypatch.setattr(base, "cache_get", no_cache)
+        monkeypatch.setattr(base, "cache_set", skip_cache_set)
+
+        with catalog.offer_card_batching():
+            cards = await asyncio.gather(*(
+                catalog.get_offer_card(offer_id) for offer_id in ["of_x", "of_y"]
+            ))
+
+        assert rpc_calls == [
+            "catalog.get_offer_cards_batch",
+            "catalog.get_offer_card",
+            "catalog.get_offer_card",
+        ]
+        assert [card["data"]["offer_id"] for card in cards] == ["of_x", "of_y"]
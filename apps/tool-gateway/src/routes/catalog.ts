@@ -4,6 +4,7 @@
  * Implements:
  * - catalog.search_offers: Search products
  * - catalog.get_offer_card: Get product details (AROC)
+ * - catalog.get_offer_cards_batch: Get several AROC cards in one call
  * - catalog.get_availability: Get stock status
  */
 
@@ -13,6 +14,9 @@ import { getXOOBAYClient } from '../services/xoobay.js';
 
 const logger = createLogger('catalog');
 
+// get_offer_cards_batch accepts at most this many offer_ids per call
+const MAX_OFFER_CARD_BATCH = 50;
+
 // Short-lived in-memory cache for XOOBAY goods_url lookups.
 const GOODS_URL_TTL_MS = 10 * 60 * 1000;
 const goodsUrlCache = new Map<string, { url: string; expiresAt: number }>();
@@ -243,8 +247,9 @@ export async function catalogRoutes(app: FastifyInstance): Promise<void> {
    * Get product details (AROC - AI-Ready Offer Card)
    */
   app.post('/get_offer_card', async (request: FastifyRequest, reply: FastifyReply) => {
-    const body = request.body as { params?: { offer_id?: string } };
+    const body = request.body as { params?: { offer_id?: string; include_kg_relations?: boolean } };
     const offerId = body.params?.offer_id;
+    const includeKgRelations = body.params?.include_kg_relations ?? true;
 
     if (!offerId) {
       return reply.status(400).send(
@@ -255,345 +260,14 @@ export async function catalogRoutes(app: FastifyInstance): Promise<void> {
     logger.info({ offer_id: offerId }, 'Getting offer card');
 
     try {
-      let offer: OfferRow | null = null;
-      let fetchedFromXoobay = false;
-
-      // For XOOBAY products (id starts with "xoobay_"), always fetch from XOOBAY API
-      if (offerId.startsWith('xoobay_')) {
-        logger.info({ offer_id: offerId }, 'Fetching XOOBAY product from API');
-        try {
-          const xoobayId = offerId.replace('xoobay_', '');
-          logger.info({ xoobay_id: xoobayId }, 'Calling XOOBAY getProductInfo');
-          const xoobayClient = getXOOBAYClient();
-          const xoobayProduct = await xoobayClient.getProductInfo(xoobayId);
-          logger.info({ product_name: xoobayProduct.name }, 'XOOBAY product fetched successfully');
-          fetchedFromXoobay = true;
-
-          // Convert to database format
-          // Fix price parsing: ensure correct conversion to number
-          let basePrice = 0
-          if (xoobayProduct.price) {
-            const priceStr = String(xoobayProduct.price).replace(/[^\d.-]/g, '') // Remove currency symbols etc
-            const priceNum = parseFloat(priceStr)
-            basePrice = isNaN(priceNum) ? 0 : Math.round(priceNum * 100) / 100 // Keep 2 decimal places
-          }
-          
-          // Prefer real goods_url from search cache; fall back to slug-based URL.
-          const cachedGoodsUrl = getCachedGoodsUrl(offerId);
-          const productSlug = xoobayProduct.name
-            .toLowerCase()
-            .normalize('NFKD')
-            .replace(/['"]/g, '')
-            .replace(/&/g, ' and ')
-            .replace(/[^a-z0-9]+/g, '-')
-            .replace(/-+/g, '-')
-            .replace(/^-|-$/g, '')
-            .slice(0, 180);
-          const fallbackUrl = productSlug ? `https://www.xoobay.com/products/${productSlug}` : undefined;
-          const productUrl = cachedGoodsUrl ?? fallbackUrl;
-          
-          offer = {
-            id: offerId,
-            spu_id: `spu_${xoobayProduct.id}`,
-            merchant_id: `merchant_${xoobayProduct.store_id}`,
-            category_id: 'cat_other', // Default category
-            title_en: xoobayProduct.name,
-            title_zh: xoobayProduct.name,
-            brand_name: xoobayProduct.brand_name || 'XOOBAY',
-            brand_id: `brand_${(xoobayProduct.brand_name || 'xoobay').toLowerCase().replace(/\s+/g, '_')}`,
-            base_price: basePrice,
-            currency: 'USD',
-            attributes: {
-              description: xoobayProduct.description,
-              short_description: xoobayProduct.short_description,
-              image_url: xoobayProduct.image_url,
-              gallery_images: xoobayProduct.gallery_images,
-              category: xoobayProduct.category,
-              store_name: xoobayProduct.store_name,
-              source: 'xoobay',
-              product_url: productUrl,  // Add product URL for frontend
-            },
-            weight_g: 0,
-            dimensions_mm: { l: 0, w: 0, h: 0 },
-            risk_tags: [],
-            certifications: [],
-            return_policy: {},
-            warranty_months: 0,
-            rating: 0,
-            reviews_count: 0,
-            // Enhanced fields (defaults for XOOBAY products)
-            version_hash: null,
-            update_source: 'xoobay_api',
-            risk_profile: {},
-            brand_id_ref: null,
-            merchant_id_ref: null,
-          } as OfferRow;
-
-          logger.info({ offer_id: offerId }, 'Fetched from XOOBAY API');
-        } catch (error) {
-          logger.error({ 
-            error: error instanceof Error ? error.message : String(error),
-            stack: error instanceof Error ? error.stack : undefined,
-            offer_id: offerId 
-          }, 'Failed to fetch from XOOBAY API');
-        }
-      } else {
-        // Non-XOOBAY products: query from database
-        offer = await queryOne<OfferRow>(
-          `SELECT * FROM agent.offers WHERE id = $1`,
-          [offerId]
-        );
-      }
+      const aroc = await buildOfferCard(offerId, includeKgRelations);
 
-      if (!offer) {
+      if (!aroc) {
         return reply.status(404).send(
           createErrorResponse('NOT_FOUND', `Offer ${offerId} not found`)
         );
       }
 
-      if (fetchedFromXoobay) {
-        try {
-          await query(
-            `INSERT INTO agent.categories (id, name_en, name_zh, level)
-             VALUES ($1, $2, $3, $4)
-             ON CONFLICT (id) DO NOTHING`,
-            ['cat_other', 'Other', '其他', 0]
-          );
-
-          const basePrice = typeof offer.base_price === 'number'
-            ? offer.base_price
-            : parseFloat(String(offer.base_price || 0));
-
-          await query(
-            `INSERT INTO agent.offers (
-              id, spu_id, merchant_id, category_id,
-              title_en, title_zh, brand_name, brand_id,
-              base_price, currency, attributes,
-              weight_g, dimensions_mm, risk_tags, certifications,
-              return_policy, warranty_months, rating, reviews_count
-            ) VALUES (
-              $1, $2, $3, $4,
-              $5, $6, $7, $8,
-              $9, $10, $11,
-              $12, $13, $14, $15,
-              $16, $17, $18, $19
-            )
-            ON CONFLICT (id) DO UPDATE SET
-              title_en = EXCLUDED.title_en,
-              title_zh = EXCLUDED.title_zh,
-              brand_name = EXCLUDED.brand_name,
-              brand_id = EXCLUDED.brand_id,
-              base_price = EXCLUDED.base_price,
-              currency = EXCLUDED.currency,
-              attributes = EXCLUDED.attributes,
-              updated_at = NOW()`,
-            [
-              offer.id,
-              offer.spu_id,
-              offer.merchant_id,
-              offer.category_id,
-              offer.title_en,
-              offer.title_zh,
-              offer.brand_name,
-              offer.brand_id,
-              basePrice,
-              offer.currency,
-              offer.attributes ?? {},
-              offer.weight_g ?? 0,
-              offer.dimensions_mm ?? {},
-              offer.risk_tags ?? [],
-              offer.certifications ?? [],
-              offer.return_policy ?? {},
-              offer.warranty_months ?? 0,
-              offer.rating ?? 0,
-              offer.reviews_count ?? 0,
-            ]
-          );
-
-          const xoobayId = offer.id.replace('xoobay_', '');
-          await query(
-            `INSERT INTO agent.skus (id, offer_id, options, price, currency, stock)
-             VALUES ($1, $2, $3, $4, $5, $6)
-             ON CONFLICT (id) DO UPDATE SET
-               price = EXCLUDED.price,
-               currency = EXCLUDED.currency,
-               stock = EXCLUDED.stock,
-               updated_at = NOW()`,
-            [
-              `sku_${xoobayId}`,
-              offer.id,
-              JSON.stringify({}),
-              basePrice,
-              offer.currency,
-              100,
-            ]
-          );
-        } catch (error) {
-          logger.warn({ error, offer_id: offer.id }, 'Failed to persist XOOBAY offer in database');
-        }
-      }
-
-      // Query SKU variants
-      let skus = await query<SkuRow>(
-        `SELECT * FROM agent.skus WHERE offer_id = $1`,
-        [offerId]
-      );
-
-      // If product from XOOBAY API has no SKU, create default SKU
-      if (skus.length === 0 && offerId.startsWith('xoobay_')) {
-        const xoobayId = offerId.replace('xoobay_', '');
-        skus = [{
-          id: `sku_${xoobayId}`,
-          offer_id: offerId,
-          options: {},
-          price: offer.base_price,
-          currency: offer.currency,
-          stock: 100, // Default stock
-        }];
-      }
-
-      // Query category with enhanced fields
-      const category = await queryOne<CategoryRow>(
-        `SELECT id, name_en, name_zh, path, full_path_en, product_count, level, parent_id 
-         FROM agent.categories WHERE id = $1`,
-        [offer.category_id]
-      );
-
-      // Get brand details from KG if available
-      let brandInfo: BrandRow | null = null;
-      if (offer.brand_id_ref) {
-        brandInfo = await queryOne<BrandRow>(
-          `SELECT id, name, normalized_name, logo_url, country_of_origin, confidence 
-           FROM agent.brands WHERE id = $1`,
-          [offer.brand_id_ref]
-        );
-      }
-
-      // Get merchant details from KG if available  
-      let merchantInfo: MerchantRow | null = null;
-      if (offer.merchant_id_ref) {
-        merchantInfo = await queryOne<MerchantRow>(
-          `SELECT id, name, store_url, rating, total_products, country, verified, risk_level 
-           FROM agent.merchants WHERE id = $1`,
-          [offer.merchant_id_ref]
-        );
-      }
-
-      // Get KG relations
-      const kgRelations = await query<KgRelationRow>(
-        `SELECT id, from_type, from_id, relation_type, to_type, to_id, confidence, metadata
-         FROM agent.kg_relations 
-         WHERE (from_type = 'offer' AND from_id = $1) 
-            OR (to_type = 'offer' AND to_id = $1)
-         LIMIT 20`,
-        [offerId]
-      );
-
-      // Build AROC v0.2 response
-      const aroc = {
-        aroc_version: '0.2',
-        offer_id: offer.id,
-        spu_id: offer.spu_id,
-        merchant_id: offer.merchant_id,
-        category: {
-          cat_id: offer.category_id,
-          name: category?.name_en,
-          name_zh: category?.name_zh,
-          path: category?.path ?? [],
-          full_path: category?.full_path_en,
-          level: category?.level,
-          product_count: category?.product_count,
-        },
-        titles: [
-          { locale: 'en', lang: 'en', text: offer.title_en },
-          { locale: 'zh', lang: 'zh', text: offer.title_zh },
-        ],
-        brand: {
-          name: offer.brand_name,
-          normalized_id: offer.brand_id,
-          confidence: brandInfo?.confidence ?? 'medium',
-          logo_url: brandInfo?.logo_url,
-          country_of_origin: brandInfo?.country_of_origin,
-        },
-        merchant: merchantInfo ? {
-          id: merchantInfo.id,
-          name: merchantInfo.name,
-          store_url: merchantInfo.store_url,
-          rating: parseFloat(String(merchantInfo.rating)),
-          verified: merchantInfo.verified,
-          risk_level: merchantInfo.risk_level,
-        } : null,
-        price: {
-          amount: typeof offer.base_price === 'number' ? Math.round(offer.base_price * 100) / 100 : parseFloat(String(offer.base_price || 0)),
-          currency: offer.currency,
-        },
-        // Ensure attributes is an object with expected fields for frontend
-        attributes: (() => {
-          const attrs = offer.attributes as Record<string, unknown> | null | undefined;
-          if (attrs && typeof attrs === 'object' && !Array.isArray(attrs)) {
-            return {
-              image_url: attrs.image_url as string | undefined,
-              gallery_images: attrs.gallery_images as string[] | undefined,
-              description: attrs.description as string | undefined,
-              short_description: attrs.short_description as string | undefined,
-              store_name: attrs.store_name as string | undefined,
-              source: (attrs.source as string) || (offer.id?.startsWith('xoobay_') ? 'xoobay' : 'database'),
-              product_url: attrs.product_url as string | undefined,
-            };
-          }
-          return {
-            source: offer.id?.startsWith('xoobay_') ? 'xoobay' : 'database',
-          };
-        })(),
-        // Add product_url at top level for easier frontend access
-        product_url: (() => {
-          const attrs = offer.attributes as Record<string, unknown> | null | undefined;
-          if (attrs && typeof attrs === 'object' && !Array.isArray(attrs)) {
-            return attrs.product_url as string | undefined;
-          }
-          return undefined;
-        })(),
-        variants: {
-          axes: extractVariantAxes(skus),
-          skus: skus.map(sku => ({
-            sku_id: sku.id,
-            options: sku.options,
-            price: parseFloat(String(sku.price)),
-            stock: sku.stock,
-            risk_tags: offer.risk_tags ?? [],
-          })),
-        },
-        policies: {
-          return_policy: offer.return_policy,
-          warranty_months: offer.warranty_months,
-        },
-        risk_tags: offer.risk_tags ?? [],
-        risk_profile: offer.risk_profile ?? {
-          fragile: false,
-          sizing_uncertainty: 'low',
-          has_battery: offer.risk_tags?.includes('battery_included') ?? false,
-          has_liquid: offer.risk_tags?.includes('liquid') ?? false,
-        },
-        weight_g: offer.weight_g,
-        dimensions_mm: offer.dimensions_mm,
-        certifications: offer.certifications ?? [],
-        rating: parseFloat(String(offer.rating)),
-        reviews_count: offer.reviews_count,
-        // Version tracking for AROC
-        version: {
-          hash: offer.version_hash,
-          source: offer.update_source,
-        },
-        // KG relationships
-        kg_relations: kgRelations.map(r => ({
-          id: r.id,
-          type: r.relation_type,
-          from: { type: r.from_type, id: r.from_id },
-          to: { type: r.to_type, id: r.to_id },
-          confidence: parseFloat(String(r.confidence)),
-        })),
-      };
-
       return reply.send(
         createSuccessResponse(aroc, {
           ttl_seconds: 300, // Cache AROC for 5 minutes
@@ -607,6 +281,64 @@ export async function catalogRoutes(app: FastifyInstance): Promise<void> {
     }
   });
 
+  /**
+   * catalog.get_offer_cards_batch
+   *
+   * Get AROC cards for several offers in one call (e.g. the candidate agent's top-N)
+   *
+   * Output:
+   * - cards: offer_id -> AROC
+   * - not_found: offers that do not exist
+   * - failed: offers whose lookup failed (the caller may retry them one by one)
+   */
+  app.post('/get_offer_cards_batch', async (request: FastifyRequest, reply: FastifyReply) => {
+    const body = request.body as { params?: { offer_ids?: string[]; include_kg_relations?: boolean } };
+    const offerIds = [...new Set(body.params?.offer_ids ?? [])];
+    const includeKgRelations = body.params?.include_kg_relations ?? true;
+
+    if (offerIds.length === 0) {
+      return reply.status(400).send(
+        createErrorResponse('INVALID_ARGUMENT', 'offer_ids is required')
+      );
+    }
+    if (offerIds.length > MAX_OFFER_CARD_BATCH) {
+      return reply.status(400).send(
+        createErrorResponse('INVALID_ARGUMENT', `At most ${MAX_OFFER_CARD_BATCH} offer_ids per call`)
+      );
+    }
+
+    logger.info({ offers_count: offerIds.length }, 'Getting offer cards batch');
+
+    const settled = await Promise.allSettled(
+      offerIds.map(offerId => buildOfferCard(offerId, includeKgRelations))
+    );
+
+    const cards: Record<string, Record<string, unknown>> = {};
+    const notFound: string[] = [];
+    const failed: string[] = [];
+    settled.forEach((result, i) => {
+      const offerId = offerIds[i];
+      if (result.status === 'rejected') {
+        logger.error({ error: result.reason, offer_id: offerId }, 'Failed to get offer card in batch');
+        failed.push(offerId);
+      } else if (result.value) {
+        cards[offerId] = result.value;
+      } else {
+        notFound.push(offerId);
+      }
+    });
+
+    return reply.send(
+      createSuccessResponse({
+        cards,
+        not_found: notFound,
+        failed,
+      }, {
+        ttl_seconds: 300, // Same as get_offer_card
+      })
+    );
+  });
+
   /**
    * catalog.get_availability
    * 
@@ -904,6 +636,354 @@ export async function catalogRoutes(app: FastifyInstance): Promise<void> {
   });
 }
 
+/**
+ * Build the AROC v0.2 card for one offer (shared by get_offer_card and get_offer_cards_batch)
+ *
+ * Returns null when the offer does not exist; other failures are thrown to the caller.
+ */
+async function buildOfferCard(offerId: string, includeKgRelations: boolean): Promise<Record<string, unknown> | null> {
+  let offer: OfferRow | null = null;
+  let fetchedFromXoobay = false;
+
+  // For XOOBAY products (id starts with "xoobay_"), always fetch from XOOBAY API
+  if (offerId.startsWith('xoobay_')) {
+    logger.info({ offer_id: offerId }, 'Fetching XOOBAY product from API');
+    try {
+      const xoobayId = offerId.replace('xoobay_', '');
+      logger.info({ xoobay_id: xoobayId }, 'Calling XOOBAY getProductInfo');
+      const xoobayClient = getXOOBAYClient();
+      const xoobayProduct = await xoobayClient.getProductInfo(xoobayId);
+      logger.info({ product_name: xoobayProduct.name }, 'XOOBAY product fetched successfully');
+      fetchedFromXoobay = true;
+
+      // Convert to database format
+      // Fix price parsing: ensure correct conversion to number
+      let basePrice = 0
+      if (xoobayProduct.price) {
+        const priceStr = String(xoobayProduct.price).replace(/[^\d.-]/g, '') // Remove currency symbols etc
+        const priceNum = parseFloat(priceStr)
+        basePrice = isNaN(priceNum) ? 0 : Math.round(priceNum * 100) / 100 // Keep 2 decimal places
+      }
+      
+      // Prefer real goods_url from search cache; fall back to slug-based URL.
+      const cachedGoodsUrl = getCachedGoodsUrl(offerId);
+      const productSlug = xoobayProduct.name
+        .toLowerCase()
+        .normalize('NFKD')
+        .replace(/['"]/g, '')
+        .replace(/&/g, ' and ')
+        .replace(/[^a-z0-9]+/g, '-')
+        .replace(/-+/g, '-')
+        .replace(/^-|-$/g, '')
+        .slice(0, 180);
+      const fallbackUrl = productSlug ? `https://www.xoobay.com/products/${productSlug}` : undefined;
+      const productUrl = cachedGoodsUrl ?? fallbackUrl;
+      
+      offer = {
+        id: offerId,
+        spu_id: `spu_${xoobayProduct.id}`,
+        merchant_id: `merchant_${xoobayProduct.store_id}`,
+        category_id: 'cat_other', // Default category
+        title_en: xoobayProduct.name,
+        title_zh: xoobayProduct.name,
+        brand_name: xoobayProduct.brand_name || 'XOOBAY',
+        brand_id: `brand_${(xoobayProduct.brand_name || 'xoobay').toLowerCase().replace(/\s+/g, '_')}`,
+        base_price: basePrice,
+        currency: 'USD',
+        attributes: {
+          description: xoobayProduct.description,
+          short_description: xoobayProduct.short_description,
+          image_url: xoobayProduct.image_url,
+          gallery_images: xoobayProduct.gallery_images,
+          category: xoobayProduct.category,
+          store_name: xoobayProduct.store_name,
+          source: 'xoobay',
+          product_url: productUrl,  // Add product URL for frontend
+        },
+        weight_g: 0,
+        dimensions_mm: { l: 0, w: 0, h: 0 },
+        risk_tags: [],
+        certifications: [],
+        return_policy: {},
+        warranty_months: 0,
+        rating: 0,
+        reviews_count: 0,
+        // Enhanced fields (defaults for XOOBAY products)
+        version_hash: null,
+        update_source: 'xoobay_api',
+        risk_profile: {},
+        brand_id_ref: null,
+        merchant_id_ref: null,
+      } as OfferRow;
+
+      logger.info({ offer_id: offerId }, 'Fetched from XOOBAY API');
+    } catch (error) {
+      logger.error({ 
+        error: error instanceof Error ? error.message : String(error),
+        stack: error instanceof Error ? error.stack : undefined,
+        offer_id: offerId 
+      }, 'Failed to fetch from XOOBAY API');
+    }
+  } else {
+    // Non-XOOBAY products: query from database
+    offer = await queryOne<OfferRow>(
+      `SELECT * FROM agent.offers WHERE id = $1`,
+      [offerId]
+    );
+  }
+
+  if (!offer) {
+    return null;
+  }
+
+  if (fetchedFromXoobay) {
+    try {
+      await query(
+        `INSERT INTO agent.categories (id, name_en, name_zh, level)
+         VALUES ($1, $2, $3, $4)
+         ON CONFLICT (id) DO NOTHING`,
+        ['cat_other', 'Other', '其他', 0]
+      );
+
+      const basePrice = typeof offer.base_price === 'number'
+        ? offer.base_price
+        : parseFloat(String(offer.base_price || 0));
+
+      await query(
+        `INSERT INTO agent.offers (
+          id, spu_id, merchant_id, category_id,
+          title_en, title_zh, brand_name, brand_id,
+          base_price, currency, attributes,
+          weight_g, dimensions_mm, risk_tags, certifications,
+          return_policy, warranty_months, rating, reviews_count
+        ) VALUES (
+          $1, $2, $3, $4,
+          $5, $6, $7, $8,
+          $9, $10, $11,
+          $12, $13, $14, $15,
+          $16, $17, $18, $19
+        )
+        ON CONFLICT (id) DO UPDATE SET
+          title_en = EXCLUDED.title_en,
+          title_zh = EXCLUDED.title_zh,
+          brand_name = EXCLUDED.brand_name,
+          brand_id = EXCLUDED.brand_id,
+          base_price = EXCLUDED.base_price,
+          currency = EXCLUDED.currency,
+          attributes = EXCLUDED.attributes,
+          updated_at = NOW()`,
+        [
+          offer.id,
+          offer.spu_id,
+          offer.merchant_id,
+          offer.category_id,
+          offer.title_en,
+          offer.title_zh,
+          offer.brand_name,
+          offer.brand_id,
+          basePrice,
+          offer.currency,
+          offer.attributes ?? {},
+          offer.weight_g ?? 0,
+          offer.dimensions_mm ?? {},
+          offer.risk_tags ?? [],
+          offer.certifications ?? [],
+          offer.return_policy ?? {},
+          offer.warranty_months ?? 0,
+          offer.rating ?? 0,
+          offer.reviews_count ?? 0,
+        ]
+      );
+
+      const xoobayId = offer.id.replace('xoobay_', '');
+      await query(
+        `INSERT INTO agent.skus (id, offer_id, options, price, currency, stock)
+         VALUES ($1, $2, $3, $4, $5, $6)
+         ON CONFLICT (id) DO UPDATE SET
+           price = EXCLUDED.price,
+           currency = EXCLUDED.currency,
+           stock = EXCLUDED.stock,
+           updated_at = NOW()`,
+        [
+          `sku_${xoobayId}`,
+          offer.id,
+          JSON.stringify({}),
+          basePrice,
+          offer.currency,
+          100,
+        ]
+      );
+    } catch (error) {
+      logger.warn({ error, offer_id: offer.id }, 'Failed to persist XOOBAY offer in database');
+    }
+  }
+
+  // Query SKU variants
+  let skus = await query<SkuRow>(
+    `SELECT * FROM agent.skus WHERE offer_id = $1`,
+    [offerId]
+  );
+
+  // If product from XOOBAY API has no SKU, create default SKU
+  if (skus.length === 0 && offerId.startsWith('xoobay_')) {
+    const xoobayId = offerId.replace('xoobay_', '');
+    skus = [{
+      id: `sku_${xoobayId}`,
+      offer_id: offerId,
+      options: {},
+      price: offer.base_price,
+      currency: offer.currency,
+      stock: 100, // Default stock
+    }];
+  }
+
+  // Query category with enhanced fields
+  const category = await queryOne<CategoryRow>(
+    `SELECT id, name_en, name_zh, path, full_path_en, product_count, level, parent_id 
+     FROM agent.categories WHERE id = $1`,
+    [offer.category_id]
+  );
+
+  // Get brand details from KG if available
+  let brandInfo: BrandRow | null = null;
+  if (offer.brand_id_ref) {
+    brandInfo = await queryOne<BrandRow>(
+      `SELECT id, name, normalized_name, logo_url, country_of_origin, confidence 
+       FROM agent.brands WHERE id = $1`,
+      [offer.brand_id_ref]
+    );
+  }
+
+  // Get merchant details from KG if available  
+  let merchantInfo: MerchantRow | null = null;
+  if (offer.merchant_id_ref) {
+    merchantInfo = await queryOne<MerchantRow>(
+      `SELECT id, name, store_url, rating, total_products, country, verified, risk_level 
+       FROM agent.merchants WHERE id = $1`,
+      [offer.merchant_id_ref]
+    );
+  }
+
+  // Get KG relations (skipped when the caller passes include_kg_relations=false)
+  const kgRelations = includeKgRelations
+    ? await query<KgRelationRow>(
+        `SELECT id, from_type, from_id, relation_type, to_type, to_id, confidence, metadata
+         FROM agent.kg_relations 
+         WHERE (from_type = 'offer' AND from_id = $1) 
+            OR (to_type = 'offer' AND to_id = $1)
+         LIMIT 20`,
+        [offerId]
+      )
+    : [];
+
+  // Build AROC v0.2 response
+  const aroc = {
+    aroc_version: '0.2',
+    offer_id: offer.id,
+    spu_id: offer.spu_id,
+    merchant_id: offer.merchant_id,
+    category: {
+      cat_id: offer.category_id,
+      name: category?.name_en,
+      name_zh: category?.name_zh,
+      path: category?.path ?? [],
+      full_path: category?.full_path_en,
+      level: category?.level,
+      product_count: category?.product_count,
+    },
+    titles: [
+      { locale: 'en', lang: 'en', text: offer.title_en },
+      { locale: 'zh', lang: 'zh', text: offer.title_zh },
+    ],
+    brand: {
+      name: offer.brand_name,
+      normalized_id: offer.brand_id,
+      confidence: brandInfo?.confidence ?? 'medium',
+      logo_url: brandInfo?.logo_url,
+      country_of_origin: brandInfo?.country_of_origin,
+    },
+    merchant: merchantInfo ? {
+      id: merchantInfo.id,
+      name: merchantInfo.name,
+      store_url: merchantInfo.store_url,
+      rating: parseFloat(String(merchantInfo.rating)),
+      verified: merchantInfo.verified,
+      risk_level: merchantInfo.risk_level,
+    } : null,
+    price: {
+      amount: typeof offer.base_price === 'number' ? Math.round(offer.base_price * 100) / 100 : parseFloat(String(offer.base_price || 0)),
+      currency: offer.currency,
+    },
+    // Ensure attributes is an object with expected fields for frontend
+    attributes: (() => {
+      const attrs = offer.attributes as Record<string, unknown> | null | undefined;
+      if (attrs && typeof attrs === 'object' && !Array.isArray(attrs)) {
+        return {
+          image_url: attrs.image_url as string | undefined,
+          gallery_images: attrs.gallery_images as string[] | undefined,
+          description: attrs.description as string | undefined,
+          short_description: attrs.short_description as string | undefined,
+          store_name: attrs.store_name as string | undefined,
+          source: (attrs.source as string) || (offer.id?.startsWith('xoobay_') ? 'xoobay' : 'database'),
+          product_url: attrs.product_url as string | undefined,
+        };
+      }
+      return {
+        source: offer.id?.startsWith('xoobay_') ? 'xoobay' : 'database',
+      };
+    })(),
+    // Add product_url at top level for easier frontend access
+    product_url: (() => {
+      const attrs = offer.attributes as Record<string, unknown> | null | undefined;
+      if (attrs && typeof attrs === 'object' && !Array.isArray(attrs)) {
+        return attrs.product_url as string | undefined;
+      }
+      return undefined;
+    })(),
+    variants: {
+      axes: extractVariantAxes(skus),
+      skus: skus.map(sku => ({
+        sku_id: sku.id,
+        options: sku.options,
+        price: parseFloat(String(sku.price)),
+        stock: sku.stock,
+        risk_tags: offer.risk_tags ?? [],
+      })),
+    },
+    policies: {
+      return_policy: offer.return_policy,
+      warranty_months: offer.warranty_months,
+    },
+    risk_tags: offer.risk_tags ?? [],
+    risk_profile: offer.risk_profile ?? {
+      fragile: false,
+      sizing_uncertainty: 'low',
+      has_battery: offer.risk_tags?.includes('battery_included') ?? false,
+      has_liquid: offer.risk_tags?.includes('liquid') ?? false,
+    },
+    weight_g: offer.weight_g,
+    dimensions_mm: offer.dimensions_mm,
+    certifications: offer.certifications ?? [],
+    rating: parseFloat(String(offer.rating)),
+    reviews_count: offer.reviews_count,
+    // Version tracking for AROC
+    version: {
+      hash: offer.version_hash,
+      source: offer.update_source,
+    },
+    // KG relationships
+    kg_relations: kgRelations.map(r => ({
+      id: r.id,
+      type: r.relation_type,
+      from: { type: r.from_type, id: r.from_id },
+      to: { type: r.to_type, id: r.to_id },
+      confidence: parseFloat(String(r.confidence)),
+    })),
+  };
+
+  return aroc;
+}
+
 /**
  * Extract variant axes from SKU list
  */
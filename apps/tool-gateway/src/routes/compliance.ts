@@ -4,6 +4,7 @@
  * 实现:
  * - compliance.check_item: 检查商品是否合规
  * - compliance.get_required_certs: 获取所需认证
+ * - compliance.policy_ruleset_version: 获取规则版本
  */
 
 import type { FastifyInstance, FastifyRequest, FastifyReply } from 'fastify';
@@ -374,6 +375,44 @@ export async function complianceRoutes(app: FastifyInstance): Promise<void> {
     }
   });
 
+  /**
+   * compliance.policy_ruleset_version
+   *
+   * 获取当前规则版本（合规规则 + 风险标签定义的内容指纹）
+   *
+   * 规则或标签定义有任何变化时版本号随之变化，Agent 以此作为合规结果缓存键的一部分
+   */
+  app.post('/policy_ruleset_version', async (_request: FastifyRequest, reply: FastifyReply) => {
+    try {
+      const row = await queryOne<{ fingerprint: string; valid_from: Date | null }>(
+        `SELECT
+           md5(
+             COALESCE((SELECT string_agg(r::text, '|' ORDER BY r.id) FROM agent.compliance_rules r), '') ||
+             COALESCE((SELECT string_agg(t::text, '|' ORDER BY t.id) FROM agent.risk_tag_definitions t), '')
+           ) AS fingerprint,
+           GREATEST(
+             (SELECT MAX(created_at) FROM agent.compliance_rules),
+             (SELECT MAX(created_at) FROM agent.risk_tag_definitions)
+           ) AS valid_from`
+      );
+
+      return reply.send(
+        createSuccessResponse({
+          version: `cr_${row?.fingerprint.slice(0, 12) ?? 'unknown'}`,
+          valid_from: row?.valid_from ? new Date(row.valid_from).toISOString() : null,
+          features: ['risk_tag_definitions', 'shipping_lanes', 'kg_relations'],
+        }, {
+          ttl_seconds: 300,
+        })
+      );
+    } catch (error) {
+      logger.error({ error }, 'Failed to get policy ruleset version');
+      return reply.status(500).send(
+        createErrorResponse('INTERNAL_ERROR', 'Failed to get policy ruleset version')
+      );
+    }
+  });
+
   /**
    * compliance.get_risk_tags
    * 
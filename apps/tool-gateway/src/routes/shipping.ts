@@ -91,6 +91,31 @@ interface ShippingLane {
   active: boolean;
 }
 
+interface ItemRestrictions {
+  hasBattery: boolean;
+  hasLiquid: boolean;
+  hasMagnet: boolean;
+  restrictions: string[];
+}
+
+interface ShippingOption {
+  shipping_option_id: string;
+  name: string;
+  carrier: string;
+  service_level: string;
+  price: number;
+  currency: string;
+  eta_min_days: number;
+  eta_max_days: number;
+  tracking_supported: boolean;
+  constraints: string[];
+  is_available: boolean;
+  restrictions?: {
+    max_weight_g: number | null;
+    blocked_risk_tags: string[];
+  };
+}
+
 export async function shippingRoutes(app: FastifyInstance): Promise<void> {
   /**
    * shipping.validate_address
@@ -181,10 +206,12 @@ export async function shippingRoutes(app: FastifyInstance): Promise<void> {
         items?: ShippingItem[];
         destination_country?: string;
         destination_postal_code?: string;
+        per_item?: boolean;
       };
     };
     const params = body.params ?? {};
     const items = params.items ?? [];
+    const perItem = params.per_item === true;
     const destinationCountry = params.destination_country?.toUpperCase() ?? 'US';
 
     logger.info({ 
@@ -202,6 +229,7 @@ export async function shippingRoutes(app: FastifyInstance): Promise<void> {
     try {
       // 计算总重量
       let totalWeightG = 0;
+      const itemWeightsG: number[] = [];
       const skuIds = items.map(item => item.sku_id);
       
       if (skuIds.length > 0) {
@@ -217,14 +245,13 @@ export async function shippingRoutes(app: FastifyInstance): Promise<void> {
         for (const item of items) {
           const offer = offers.find(o => o.id === item.sku_id.split('_').slice(0, 2).join('_'));
           const weight = item.weight_g ?? offer?.weight_g ?? 500; // 默认 500g
+          itemWeightsG.push(weight * item.qty);
           totalWeightG += weight * item.qty;
         }
       } else {
         totalWeightG = 500; // 默认重量
       }
 
-      const totalWeightKg = totalWeightG / 1000;
-
       // 获取国家调整系数
       const adjustment = COUNTRY_ADJUSTMENTS[destinationCountry] ?? { etaAdjust: 3, costMultiplier: 1.5 };
 
@@ -240,81 +267,22 @@ export async function shippingRoutes(app: FastifyInstance): Promise<void> {
         [destinationCountry]
       );
 
-      let options;
-      let source: 'database' | 'fallback';
-
-      if (dbLanes.length > 0) {
-        // Use database lanes
-        source = 'database';
-        options = dbLanes
-          .filter(lane => {
-            // Check weight limit
-            if (lane.max_weight_g && totalWeightG > lane.max_weight_g) return false;
-            // Check blocked risk tags
-            const hasBlockedTag = riskTagsArray.some(tag => 
-              lane.blocked_risk_tags?.includes(tag)
-            );
-            return !hasBlockedTag;
-          })
-          .map(lane => {
-            const baseRate = parseFloat(String(lane.base_rate ?? 10));
-            const price = Math.round((baseRate + totalWeightKg * 2) * 100) / 100;
+      const { options, source } = buildShippingOptions(totalWeightG, restrictedItems, dbLanes, adjustment);
 
+      // per_item=true 时按商品分别报价（同一目的国的线路只查询一次），供多个候选合并为一次调用
+      const itemQuotes = perItem
+        ? await Promise.all(items.map(async (item, i) => {
+            const itemRestrictions = await checkItemRestrictions([item.sku_id]);
+            const itemWeightG = itemWeightsG[i] ?? 500;
             return {
-              shipping_option_id: lane.id,
-              name: lane.name,
-              carrier: lane.carrier ?? 'Various',
-              service_level: lane.service_type ?? 'standard',
-              price,
-              currency: 'USD',
-              eta_min_days: lane.min_days ?? 7,
-              eta_max_days: lane.max_days ?? 14,
-              tracking_supported: true,
-              constraints: [],
-              is_available: true,
-              restrictions: {
-                max_weight_g: lane.max_weight_g,
-                blocked_risk_tags: lane.blocked_risk_tags,
-              },
+              sku_id: item.sku_id,
+              qty: item.qty,
+              total_weight_g: itemWeightG,
+              item_risk_tags: itemRestrictions.restrictions,
+              options: buildShippingOptions(itemWeightG, itemRestrictions, dbLanes, adjustment).options,
             };
-          });
-      } else {
-        // Fallback to hardcoded options
-        source = 'fallback';
-        options = Object.values(SHIPPING_OPTIONS).map(option => {
-          const baseCost = option.base_cost * adjustment.costMultiplier;
-          const weightCost = option.cost_per_kg * totalWeightKg * adjustment.costMultiplier;
-          const totalCost = Math.round((baseCost + weightCost) * 100) / 100;
-
-          const etaMin = option.eta_min_days + adjustment.etaAdjust;
-          const etaMax = option.eta_max_days + adjustment.etaAdjust;
-
-          const constraints: string[] = [];
-          if (restrictedItems.hasBattery && option.service_level === 'express') {
-            constraints.push('Battery items may have additional delays');
-          }
-          if (restrictedItems.hasLiquid) {
-            constraints.push('Liquid items have volume restrictions');
-          }
-
-          return {
-            shipping_option_id: option.id,
-            name: option.name,
-            carrier: option.carrier,
-            service_level: option.service_level,
-            price: totalCost,
-            currency: 'USD',
-            eta_min_days: Math.max(1, etaMin),
-            eta_max_days: Math.max(3, etaMax),
-            tracking_supported: option.tracking_supported,
-            constraints,
-            is_available: true,
-          };
-        });
-      }
-
-      // 按价格排序
-      options.sort((a, b) => a.price - b.price);
+          }))
+        : undefined;
 
       return reply.send(
         createSuccessResponse({
@@ -326,6 +294,7 @@ export async function shippingRoutes(app: FastifyInstance): Promise<void> {
           restrictions: restrictedItems,
           quote_expire_at: new Date(Date.now() + 5 * 60 * 1000).toISOString(),
           source,
+          ...(itemQuotes ? { item_quotes: itemQuotes } : {}),
         }, {
           ttl_seconds: 300,
         })
@@ -397,6 +366,97 @@ export async function shippingRoutes(app: FastifyInstance): Promise<void> {
   });
 }
 
+/**
+ * 按重量和风险标签计算可用运输选项（按价格升序）
+ */
+function buildShippingOptions(
+  totalWeightG: number,
+  restrictedItems: ItemRestrictions,
+  dbLanes: ShippingLane[],
+  adjustment: { etaAdjust: number; costMultiplier: number },
+): { options: ShippingOption[]; source: 'database' | 'fallback' } {
+  const totalWeightKg = totalWeightG / 1000;
+  const riskTagsArray = restrictedItems.restrictions;
+
+  let options: ShippingOption[];
+  let source: 'database' | 'fallback';
+
+  if (dbLanes.length > 0) {
+    // Use database lanes
+    source = 'database';
+    options = dbLanes
+      .filter(lane => {
+        // Check weight limit
+        if (lane.max_weight_g && totalWeightG > lane.max_weight_g) return false;
+        // Check blocked risk tags
+        const hasBlockedTag = riskTagsArray.some(tag => 
+          lane.blocked_risk_tags?.includes(tag)
+        );
+        return !hasBlockedTag;
+      })
+      .map(lane => {
+        const baseRate = parseFloat(String(lane.base_rate ?? 10));
+        const price = Math.round((baseRate + totalWeightKg * 2) * 100) / 100;
+
+        return {
+          shipping_option_id: lane.id,
+          name: lane.name,
+          carrier: lane.carrier ?? 'Various',
+          service_level: lane.service_type ?? 'standard',
+          price,
+          currency: 'USD',
+          eta_min_days: lane.min_days ?? 7,
+          eta_max_days: lane.max_days ?? 14,
+          tracking_supported: true,
+          constraints: [],
+          is_available: true,
+          restrictions: {
+            max_weight_g: lane.max_weight_g,
+            blocked_risk_tags: lane.blocked_risk_tags,
+          },
+        };
+      });
+  } else {
+    // Fallback to hardcoded options
+    source = 'fallback';
+    options = Object.values(SHIPPING_OPTIONS).map(option => {
+      const baseCost = option.base_cost * adjustment.costMultiplier;
+      const weightCost = option.cost_per_kg * totalWeightKg * adjustment.costMultiplier;
+      const totalCost = Math.round((baseCost + weightCost) * 100) / 100;
+
+      const etaMin = option.eta_min_days + adjustment.etaAdjust;
+      const etaMax = option.eta_max_days + adjustment.etaAdjust;
+
+      const constraints: string[] = [];
+      if (restrictedItems.hasBattery && option.service_level === 'express') {
+        constraints.push('Battery items may have additional delays');
+      }
+      if (restrictedItems.hasLiquid) {
+        constraints.push('Liquid items have volume restrictions');
+      }
+
+      return {
+        shipping_option_id: option.id,
+        name: option.name,
+        carrier: option.carrier,
+        service_level: option.service_level,
+        price: totalCost,
+        currency: 'USD',
+        eta_min_days: Math.max(1, etaMin),
+        eta_max_days: Math.max(3, etaMax),
+        tracking_supported: option.tracking_supported,
+        constraints,
+        is_available: true,
+      };
+    });
+  }
+
+  // 按价格排序
+  options.sort((a, b) => a.price - b.price);
+
+  return { options, source };
+}
+
 /**
  * 验证邮编格式
  */
@@ -420,12 +480,7 @@ function validatePostalCode(country: string, postalCode: string): boolean {
 /**
  * 检查商品运输限制
  */
-async function checkItemRestrictions(skuIds: string[]): Promise<{
-  hasBattery: boolean;
-  hasLiquid: boolean;
-  hasMagnet: boolean;
-  restrictions: string[];
-}> {
+async function checkItemRestrictions(skuIds: string[]): Promise<ItemRestrictions> {
   if (skuIds.length === 0) {
     return { hasBattery: false, hasLiquid: false, hasMagnet: false, restrictions: [] };
   }